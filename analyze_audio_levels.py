@@ -1,61 +1,56 @@
-import wave
 import math
 import os
 import glob
-import struct
+import numpy as np
+import audio_io
+import instrumentation
+from measure_levels import measure_files, WORKERS
 
-def calculate_rms_amplitude(frames, width):
-    # Unpack frames based on bit depth
-    # Assuming mono or stereo, samples are interleaved. We just want raw amplitude here.
-    
-    count = len(frames) // width
-    sum_squares = 0
-    
-    if width == 2: # 16-bit
-        fmt = f"<{count}h" # Little-endian signed short
-        samples = struct.unpack(fmt, frames)
-    elif width == 1: # 8-bit unsigned
-        fmt = f"<{count}B"
-        # 8-bit is usually unsigned 0-255, center 128
-        samples = [s - 128 for s in struct.unpack(fmt, frames)]
-    else:
-        # Fallback for 24/32 bit or other - simplistic check
-        return 0
+def calculate_rms_amplitude(frames, width, channels=1, float_format=False):
+    """RMS of raw little-endian PCM frames, per channel, in sample units.
 
-    for s in samples:
-        sum_squares += s * s
-        
-    return math.sqrt(sum_squares / count)
+    Vectorized for 8/16/24/32-bit integer and 32/64-bit float (float_format)
+    data. Returns a float for mono and an array for multichannel input.
+    """
+    format_tag = audio_io.WAVE_FORMAT_IEEE_FLOAT if float_format else audio_io.WAVE_FORMAT_PCM
+    samples = audio_io.decode_pcm(frames, 8 * width, format_tag).reshape(-1, channels)
+    if samples.shape[0] == 0:
+        return 0.0 if channels == 1 else np.zeros(channels)
+
+    rms = np.sqrt(np.einsum('ij,ij->j', samples, samples, dtype=np.float64) / samples.shape[0])
+    return float(rms[0]) if channels == 1 else rms
+
+def calculate_channel_db_fs(file_path):
+    """dBFS of every channel of a WAV file (any supported PCM format)"""
+    info, frames, sum_squares, peak, clipped = audio_io.channel_stats(file_path)
+    max_amp = audio_io.pcm_full_scale(info.bits, info.format_tag)
+    rms = np.sqrt(sum_squares / max(frames, 1))
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(rms / max_amp)
 
 def calculate_db_fs(file_path):
     try:
-        with wave.open(file_path, 'rb') as wav:
-            width = wav.getsampwidth()
-            frames = wav.readframes(wav.getnframes())
+        info, frames, sum_squares, peak, clipped = audio_io.channel_stats(file_path)
+        if frames == 0:
+            return -float('inf')
+
+        # Interleaved channels pooled together, as before
+        rms = math.sqrt(sum_squares.sum() / (frames * info.channels))
+        
+        if rms == 0:
+            return -float('inf')
             
-            rms = calculate_rms_amplitude(frames, width)
+        # Calculate dB relative to full scale
+        # 16-bit max amplitude is 32768, 8-bit max is 128, 24-bit 2^23, float 1.0
+        max_amp = audio_io.pcm_full_scale(info.bits, info.format_tag)
             
-            if rms == 0:
-                return -float('inf')
-                
-            # Calculate dB relative to full scale
-            # 16-bit max amplitude is 32768
-            # 8-bit max is 128
-            if width == 2:
-                max_amp = 32768
-            elif width == 1:
-                max_amp = 128
-            else:
-                max_amp = 2**(8*width - 1)
-                
-            db = 20 * math.log10(rms / max_amp)
-            return db
+        db = 20 * math.log10(rms / max_amp)
+        return db
     except Exception as e:
         print(f"Error reading {file_path}: {e}")
         return None
 
-def analyze_levels():
-    base_dir = "audio_output"
+def analyze_levels(base_dir="audio_output", workers=None):
     babble_path = os.path.join(base_dir, "babble_noise.wav")
     
     # Analyze Babble Noise
@@ -66,16 +61,21 @@ def analyze_levels():
         
     print(f"Babble Noise Level: {babble_db:.2f} dB")
     
-    # Analyze Speech Files
+    # Analyze Speech Files (in parallel, see measure_levels.py)
     speech_files = glob.glob(os.path.join(base_dir, "Form */wav/swir_*.wav"))
     
     print(f"Analyzing {len(speech_files)} speech files...")
     
     valid_speech_dbs = []
     
-    for f in speech_files:
-        db = calculate_db_fs(f)
-        if db is not None and db > -100: 
+    instrumentation.set_total(len(speech_files), "analyze")
+    for row in measure_files(speech_files, workers=workers or WORKERS):
+        instrumentation.advance()
+        if row["error"]:
+            print(f"Error reading {row['path']}: {row['error']}")
+            continue
+        db = row["dbfs"]
+        if db > -100: 
             valid_speech_dbs.append(db)
             
     if not valid_speech_dbs:
@@ -90,6 +90,7 @@ def analyze_levels():
     
     recommended_offset = -diff
     print(f"Recommended Offset: {recommended_offset:.2f} dB")
+    print("(calibrate_snr.py solves per-form and per-sentence offsets against the actual babble windows)")
 
 if __name__ == "__main__":
     analyze_levels()
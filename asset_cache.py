@@ -0,0 +1,119 @@
+import os
+import sys
+import glob
+import json
+import shutil
+import hashlib
+import argparse
+from build_manifest import BuildManifest, file_hash
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+CACHE_FOLDER = ".cache"     # Inside BASE_PATH, one folder per configuration
+META_FILE = "params.json"   # Written last: a folder without it is an unfinished build
+
+class AssetCache:
+    """Content-addressed store of generated assets.
+
+    The key is a hash of the generator name, its parameters (seed included)
+    and the SHA-256 of every source file, so an existing configuration is a
+    file copy instead of a re-synthesis, and any number of configurations can
+    be kept side by side. Outputs are copied, never linked, because the
+    normalizers change the working files in place.
+    """
+
+    def __init__(self, base_path=BASE_PATH, manifest=None):
+        self.base_path = base_path
+        self.folder = os.path.join(base_path, CACHE_FOLDER)
+        # Source hashes come from the manifest, so unchanged files are not re-read
+        self.manifest = manifest or BuildManifest(base_path)
+
+    def source_hash(self, path):
+        entry = self.manifest.lookup(path)
+        return entry["sha256"] if entry is not None else file_hash(path)
+
+    def key(self, kind, params, sources=()):
+        description = {
+            "kind": kind,
+            "params": params,
+            "sources": {os.path.relpath(p, self.base_path): self.source_hash(p) for p in sorted(sources)},
+        }
+        blob = json.dumps(description, sort_keys=True).encode()
+        return hashlib.sha256(blob).hexdigest()[:24], description
+
+    def entry_folder(self, key):
+        return os.path.join(self.folder, key)
+
+    def lookup(self, key, name):
+        """Cached file for `key`, or None if that configuration was never finished"""
+        folder = self.entry_folder(key)
+        if not os.path.exists(os.path.join(folder, META_FILE)):
+            return None
+        path = os.path.join(folder, name)
+        return path if os.path.exists(path) else None
+
+    def fetch(self, kind, params, sources, output_file, build):
+        """Put the asset for this configuration at `output_file`.
+
+        `build(path)` is only called on a cache miss and must write the asset
+        to `path`. Returns True on a hit. A seed of None means the output is
+        not reproducible, so it is built straight to `output_file` uncached.
+        """
+        if params.get("seed", 0) is None:
+            build(output_file)
+            return False
+
+        key, description = self.key(kind, params, sources)
+        name = os.path.basename(output_file)
+        cached = self.lookup(key, name)
+        hit = cached is not None
+
+        if hit:
+            print(f"Cache hit for {kind} ({key}), copying {name}")
+        else:
+            folder = self.entry_folder(key)
+            os.makedirs(folder, exist_ok=True)
+            cached = os.path.join(folder, name)
+            build(cached)
+            # The generator may have recorded its output in the manifest on disk
+            self.manifest = BuildManifest(self.base_path)
+            with open(os.path.join(folder, META_FILE), 'w') as f:
+                json.dump(description, f, indent=1, sort_keys=True)
+
+        shutil.copyfile(cached, output_file)
+        # Levels and applied gain recorded for the cached file hold for the copy
+        self.manifest.copy_entry(cached, output_file)
+        self.manifest.save()
+        return hit
+
+    def entries(self):
+        """(key, description, size in bytes) of every finished configuration"""
+        result = []
+        for meta in sorted(glob.glob(os.path.join(self.folder, "*", META_FILE))):
+            folder = os.path.dirname(meta)
+            with open(meta, 'r') as f:
+                description = json.load(f)
+            size = sum(os.path.getsize(p) for p in glob.glob(os.path.join(folder, "*")))
+            result.append((os.path.basename(folder), description, size))
+        return result
+
+    def remove(self, key):
+        shutil.rmtree(self.entry_folder(key), ignore_errors=True)
+
+def print_entries(cache, out=sys.stdout):
+    for key, description, size in cache.entries():
+        params = ", ".join(f"{k}={v}" for k, v in sorted(description["params"].items()))
+        print(f"{key}  {description['kind']:<8}{size / 1e6:>8.1f} MB  {params} "
+              f"({len(description['sources'])} sources)", file=out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or prune cached generator outputs.")
+    parser.add_argument("--base", default=BASE_PATH)
+    parser.add_argument("--remove", nargs="+", default=[], metavar="KEY")
+    args = parser.parse_args()
+
+    cache = AssetCache(args.base)
+    for key in args.remove:
+        cache.remove(key)
+    print_entries(cache)
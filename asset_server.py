@@ -0,0 +1,368 @@
+"""Local audio asset server: sentence + babble mixes rendered on demand.
+
+Usage: python3 asset_server.py [--port 3002] [--prefetch 3]
+
+    GET /mix/<form>/<id>?snr=5[&k=0][&offset_db=1.5][&gain_db=0][&prefetch=N]
+        Sentence <id> of Form <form> mixed with babble at `snr` dB, using
+        render_snr_ladder's lead-in/tail and gain law. `k` picks the babble
+        segment (0 is the one the ladder pre-renders), `offset_db` overrides
+        BABBLE_OFFSET_DB, `gain_db` scales the whole presentation.
+    GET /audio_output/<path>
+        Any file under the asset folder (the normalized WAVs), as a static server.
+
+Both answer Range requests. Mixes are kept in a size-bounded LRU in memory
+and another on disk; after a mix is served, the next N sentences of the same
+form at the same settings are rendered in the background.
+"""
+import io
+import os
+import re
+import sys
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+import numpy as np
+from scipy.io import wavfile
+import audio_io
+import sample_format
+import render_snr_ladder
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+CACHE_FOLDER = ".mix_cache"          # Inside BASE_PATH
+PORT = 3002                          # The webpack dev server has 3001
+MEMORY_BYTES = 64 << 20              # Rendered mixes kept in RAM
+DISK_BYTES = 512 << 20               # ... and on disk
+PREFETCH = 3                         # Next trials of the form rendered after each request
+
+MIX_PATH = re.compile(r"^/mix/([^/]+)/([^/]+)$")
+STATIC_PREFIX = "/audio_output/"
+
+class LRUCache:
+    """Bytes by key, least recently used dropped first once `max_bytes` is exceeded"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            if len(data) > self.max_bytes:
+                return
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, dropped = self._items.popitem(last=False)
+                self.size -= len(dropped)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+class DiskCache:
+    """One WAV per key in a folder, oldest (by last use) deleted once `max_bytes` is exceeded"""
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        entries = sorted(os.scandir(folder), key=lambda e: e.stat().st_mtime_ns)
+        self._sizes = OrderedDict((e.name[:-len(".wav")], e.stat().st_size)
+                                  for e in entries if e.name.endswith(".wav"))
+        self.size = sum(self._sizes.values())
+
+    def path(self, key):
+        return os.path.join(self.folder, key + ".wav")
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            self._sizes.move_to_end(key)
+        try:
+            with open(self.path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self.path(key))   # mtime is the last use, for the order after a restart
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                self.size -= self._sizes.pop(key, 0)
+            return None
+
+    def put(self, key, data):
+        tmp_path = self.path(key) + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(key))
+        with self._lock:
+            self.size += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            while self.size > self.max_bytes and len(self._sizes) > 1:
+                old, size = self._sizes.popitem(last=False)
+                self.size -= size
+                try:
+                    os.remove(self.path(old))
+                except FileNotFoundError:
+                    pass
+
+def parse_range(header, total):
+    """(start, end) inclusive for a single 'bytes=' range, None for no range; raises ValueError if unsatisfiable"""
+    if not header:
+        return None
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        return None    # Malformed or multi-range: ignored, the whole body is sent
+    first, last = match.groups()
+    if first == "":
+        start, end = max(total - int(last), 0), total - 1   # Suffix: the last N bytes
+    else:
+        start = int(first)
+        end = min(int(last), total - 1) if last else total - 1
+    if start >= total or start > end:
+        raise ValueError(f"bytes */{total}")
+    return start, end
+
+class AssetService:
+    """Renders, caches and slices assets; the HTTP handler is a thin wrapper around handle().
+
+    Also usable in-process (tests, scripts): service.handle("/mix/A/07?snr=5")
+    returns (status, headers, body) without a socket.
+    """
+
+    def __init__(self, base=BASE_PATH, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES, prefetch=PREFETCH):
+        self.base = base
+        self.prefetch = prefetch
+        self.memory = LRUCache(memory_bytes)
+        self.disk = DiskCache(os.path.join(base, CACHE_FOLDER), disk_bytes) if disk_bytes else None
+        self.babble_file = os.path.join(base, "babble_noise.wav")
+        self._babble = None
+        self._babble_stamp = None
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "rendered": 0, "prefetched": 0}
+
+    # --- Rendering ---
+
+    def babble(self):
+        """Memory-mapped babble bed, re-opened when the file changes"""
+        stamp = _stamp(self.babble_file)
+        with self._lock:
+            if stamp != self._babble_stamp:
+                sr, audio = audio_io.read(self.babble_file)
+                self._babble = (sr, audio[:, 0] if audio.ndim > 1 else audio)
+                self._babble_stamp = stamp
+            return self._babble, stamp
+
+    def sentence_file(self, form, sentence_id):
+        return os.path.join(self.base, f"Form {form}", "wav", f"swir_{sentence_id}.wav")
+
+    def mix_key(self, form, sentence_id, snr, k, offset_db, gain_db):
+        """Cache key: request settings plus the state of both source files"""
+        (_, babble_stamp) = self.babble()
+        parts = [form, sentence_id, snr, k, offset_db, gain_db, render_snr_ladder.LEAD_IN,
+                 render_snr_ladder.TAIL, sample_format.DITHER, _stamp(self.sentence_file(form, sentence_id)), babble_stamp]
+        return hashlib.sha256(repr(parts).encode()).hexdigest()[:24]
+
+    def render(self, form, sentence_id, snr, k=0, offset_db=render_snr_ladder.BABBLE_OFFSET_DB, gain_db=0.0):
+        """WAV bytes of one presentation, with the same segment and gain law as the ladder"""
+        sr, speech = audio_io.read(self.sentence_file(form, sentence_id))
+        if speech.ndim > 1:
+            speech = speech[:, 0]
+        (babble_sr, babble), _ = self.babble()
+
+        lead, tail = int(render_snr_ladder.LEAD_IN * sr), int(render_snr_ladder.TAIL * sr)
+        length = lead + len(speech) + tail
+        start = render_snr_ladder.segment_offset(form, sentence_id, int(np.ceil(length * babble_sr / sr)),
+                                                 len(babble), variant=k)
+        segment = render_snr_ladder.babble_segment(babble, babble_sr, sr, start, length)
+        speech_track = np.zeros(length, dtype=np.float32)
+        speech_track[lead:lead + len(speech)] = speech
+        rng = sample_format.dither_rng(render_snr_ladder.trial_name(form, sentence_id, snr, k))
+        mix, _ = render_snr_ladder.mix_trial(speech_track, segment, snr, offset_db, gain_db, rng)
+
+        buffer = io.BytesIO()
+        wavfile.write(buffer, sr, mix)
+        return buffer.getvalue()
+
+    def mix(self, form, sentence_id, snr, k=0, offset_db=render_snr_ladder.BABBLE_OFFSET_DB, gain_db=0.0,
+            prefetched=False):
+        """Cached mix bytes: memory, then disk, then a fresh render"""
+        key = self.mix_key(form, sentence_id, snr, k, offset_db, gain_db)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Two requests for the same mix (e.g. a prefetch racing the real request) render it once
+        with key_lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.stats["memory_hits"] += not prefetched
+                return data
+            data = self.disk.get(key) if self.disk else None
+            if data is not None:
+                self.stats["disk_hits"] += not prefetched
+            else:
+                data = self.render(form, sentence_id, snr, k, offset_db, gain_db)
+                self.stats["prefetched" if prefetched else "rendered"] += 1
+                if self.disk:
+                    self.disk.put(key, data)
+            self.memory.put(key, data)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return data
+
+    def next_sentences(self, form, sentence_id, count):
+        """The `count` sentences after `sentence_id` in the form's presentation order"""
+        ids = [job[1] for job in render_snr_ladder.find_trials(self.base, [form])]
+        if sentence_id not in ids:
+            return []
+        position = ids.index(sentence_id)
+        return ids[position + 1:position + 1 + count]
+
+    def schedule_prefetch(self, form, sentence_id, count, **settings):
+        for next_id in self.next_sentences(form, sentence_id, count):
+            self._prefetcher.submit(self._prefetch_one, form, next_id, settings)
+
+    def _prefetch_one(self, form, sentence_id, settings):
+        try:
+            self.mix(form, sentence_id, prefetched=True, **settings)
+        except Exception as e:
+            print(f"Prefetch of Form {form} {sentence_id} failed: {e}", file=sys.stderr)
+
+    def close(self):
+        self._prefetcher.shutdown(wait=True)
+
+    # --- Requests ---
+
+    def handle(self, target, headers=None):
+        """(status, headers, body) for a GET of `target` (path + query)"""
+        headers = headers or {}
+        parts = urlsplit(target)
+        path = unquote(parts.path)
+        query = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        try:
+            match = MIX_PATH.match(path)
+            if match:
+                body = self._mix_request(match.group(1), match.group(2), query)
+            elif path.startswith(STATIC_PREFIX):
+                body = self._static_request(path[len(STATIC_PREFIX):])
+            else:
+                return _error(404, "Unknown path")
+        except FileNotFoundError as e:
+            return _error(404, str(e))
+        except ValueError as e:
+            return _error(400, str(e))
+
+        content_type = "audio/wav" if path.endswith(".wav") or match else "application/octet-stream"
+        if path.endswith(".json"):
+            content_type = "application/json"
+        return _ranged(body, headers.get("Range"), content_type)
+
+    def _mix_request(self, form, sentence_id, query):
+        if "snr" not in query:
+            raise ValueError("Missing snr parameter")
+        if not os.path.exists(self.sentence_file(form, sentence_id)):
+            raise FileNotFoundError(f"No sentence {sentence_id} in Form {form}")
+        settings = {
+            "snr": float(query["snr"]),
+            "k": int(query.get("k", 0)),
+            "offset_db": float(query.get("offset_db", render_snr_ladder.BABBLE_OFFSET_DB)),
+            "gain_db": float(query.get("gain_db", 0.0)),
+        }
+        body = self.mix(form, sentence_id, **settings)
+        self.schedule_prefetch(form, sentence_id, int(query.get("prefetch", self.prefetch)), **settings)
+        return body
+
+    def _static_request(self, rel_path):
+        root = os.path.realpath(self.base)
+        path = os.path.realpath(os.path.join(root, rel_path))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            raise FileNotFoundError(rel_path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+def _stamp(path):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+def _error(status, message):
+    return status, {"Content-Type": "text/plain"}, message.encode()
+
+def _ranged(body, range_header, content_type):
+    headers = {"Content-Type": content_type, "Accept-Ranges": "bytes"}
+    try:
+        byte_range = parse_range(range_header, len(body))
+    except ValueError as e:
+        headers["Content-Range"] = str(e)
+        return 416, headers, b""
+    if byte_range is None:
+        return 200, headers, body
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+    return 206, headers, body[start:end + 1]
+
+class AssetRequestHandler(BaseHTTPRequestHandler):
+    service = None   # Set by serve()
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        status, headers, body = self.service.handle(self.path, self.headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        # The app's dev server runs on another port
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(service, port=PORT):
+    AssetRequestHandler.service = service
+    server = ThreadingHTTPServer(("127.0.0.1", port), AssetRequestHandler)
+    print(f"Serving {service.base} on http://127.0.0.1:{server.server_address[1]} (Ctrl+C to stop)")
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base", default=BASE_PATH)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--memory-mb", type=float, default=MEMORY_BYTES / (1 << 20))
+    parser.add_argument("--disk-mb", type=float, default=DISK_BYTES / (1 << 20), help="0 turns the disk cache off")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH, help="next trials rendered ahead")
+    args = parser.parse_args()
+
+    service = AssetService(args.base, memory_bytes=int(args.memory_mb * (1 << 20)),
+                           disk_bytes=int(args.disk_mb * (1 << 20)), prefetch=args.prefetch)
+    server = serve(service, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,86 @@
+import io
+import subprocess
+from math import gcd
+import numpy as np
+from scipy import signal
+from scipy.io import wavfile
+
+# Optional in-process MP3 decoder (pip install miniaudio). Without it, MP3
+# input falls back to piping through ffmpeg.
+try:
+    import miniaudio
+except ImportError:
+    miniaudio = None
+
+# --- CONFIGURATION ---
+TARGET_RATE = 44100   # Same as the old `ffmpeg -ar 44100`
+
+def is_wav(audio_bytes):
+    return audio_bytes[:4] == b'RIFF' and audio_bytes[8:12] == b'WAVE'
+
+def to_int16(audio):
+    """Clip and round a float signal in 16-bit units to int16"""
+    return np.clip(np.rint(audio), -32768, 32767).astype(np.int16)
+
+def resample_mono(audio, sample_rate, target_rate=TARGET_RATE):
+    """Downmix to mono and polyphase-resample to target_rate (returns int16)"""
+    if audio.dtype == np.uint8:
+        audio = (audio.astype(np.float32) - 128) * 256
+    elif audio.dtype == np.int32:
+        audio = audio.astype(np.float32) / 65536
+    elif audio.dtype.kind == 'f':
+        audio = audio.astype(np.float32) * 32768
+    else:
+        audio = audio.astype(np.float32)
+
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    if sample_rate != target_rate:
+        g = gcd(int(sample_rate), int(target_rate))
+        audio = signal.resample_poly(audio, target_rate // g, sample_rate // g)
+
+    return to_int16(audio)
+
+def decode_wav(audio_bytes, target_rate=TARGET_RATE):
+    sr, audio = wavfile.read(io.BytesIO(audio_bytes))
+    return resample_mono(audio, sr, target_rate)
+
+def decode_miniaudio(audio_bytes, target_rate=TARGET_RATE):
+    if miniaudio is None:
+        raise RuntimeError("miniaudio is not installed (pip install miniaudio)")
+    decoded = miniaudio.decode(audio_bytes, output_format=miniaudio.SampleFormat.SIGNED16,
+                               nchannels=1, sample_rate=target_rate)
+    return np.frombuffer(decoded.samples, dtype=np.int16).copy()
+
+def decode_ffmpeg(audio_bytes, target_rate=TARGET_RATE):
+    # Raw PCM over pipes: no temp files, so concurrent workers never collide
+    result = subprocess.run(
+        ['ffmpeg', '-i', 'pipe:0', '-f', 's16le', '-acodec', 'pcm_s16le',
+         '-ac', '1', '-ar', str(target_rate), 'pipe:1'],
+        input=audio_bytes,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True
+    )
+    return np.frombuffer(result.stdout, dtype='<i2').astype(np.int16)
+
+DECODERS = {
+    "wav": decode_wav,
+    "miniaudio": decode_miniaudio,
+    "ffmpeg": decode_ffmpeg,
+}
+
+def pick_decoder(audio_bytes):
+    """In-process whenever possible, ffmpeg only as the fallback"""
+    if is_wav(audio_bytes):
+        return "wav"
+    if miniaudio is not None:
+        return "miniaudio"
+    return "ffmpeg"
+
+def decode_to_mono(audio_bytes, backend="auto", target_rate=TARGET_RATE):
+    """Decode TTS output held in memory to a mono int16 array at target_rate"""
+    if backend == "auto":
+        backend = pick_decoder(audio_bytes)
+    return DECODERS[backend](audio_bytes, target_rate)
@@ -0,0 +1,279 @@
+import os
+import struct
+from collections import namedtuple
+import numpy as np
+import sample_format
+import instrumentation
+from scipy.io import wavfile
+
+# --- CONFIGURATION ---
+CHUNK_FRAMES = 1 << 18   # ~6 s of 44.1 kHz mono per chunk (1 MB as float32)
+BATCH_BYTES = 256 << 20  # Float32 samples held in memory per load_ragged batch
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+WavInfo = namedtuple("WavInfo", "sample_rate channels bits format_tag data_offset data_bytes")
+
+# (format, bits) -> on-disk numpy dtype. 24-bit has no numpy equivalent.
+_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): np.dtype('u1'),
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8'),
+}
+
+def read_wav_info(filename):
+    """Parse the RIFF header: format and where the sample data starts"""
+    with open(filename, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise ValueError(f"{filename} is not a RIFF/WAVE file")
+
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{filename} has no data chunk")
+            chunk_id, size = struct.unpack('<4sI', header)
+
+            if chunk_id == b'fmt ':
+                body = f.read(size)
+                tag, channels, rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+                if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                    tag = struct.unpack('<H', body[24:26])[0]
+                fmt = (tag, channels, rate, bits)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"{filename} has data before its fmt chunk")
+                offset = f.tell()
+                # Streaming writers sometimes leave the size unset; trust the file length
+                available = os.path.getsize(filename) - offset
+                tag, channels, rate, bits = fmt
+                return WavInfo(rate, channels, bits, tag, offset, min(size, available))
+            else:
+                f.seek(size, 1)
+
+            if size % 2:
+                f.seek(1, 1)  # Chunks are word aligned
+
+def sample_dtype(info):
+    return _DTYPES.get((info.format_tag, info.bits))
+
+def read(filename, mode='r'):
+    """Open a WAV as a zero-copy memory-mapped array (same return as wavfile.read)"""
+    info = read_wav_info(filename)
+    dtype = sample_dtype(info)
+    if info.format_tag == WAVE_FORMAT_PCM and info.bits == 24 and mode == 'r':
+        # No 3-byte numpy type: decode to left-justified int32 like wavfile.read does
+        raw = open_raw(filename, info)
+        data = (decode_pcm(raw, 24, WAVE_FORMAT_PCM, as_float=False) << 8).reshape(-1, info.channels)
+        return info.sample_rate, data[:, 0] if info.channels == 1 else data
+    if dtype is None:
+        raise ValueError(f"{filename}: {info.bits}-bit format {info.format_tag} cannot be memory-mapped")
+
+    frames = info.data_bytes // (dtype.itemsize * info.channels)
+    shape = (frames,) if info.channels == 1 else (frames, info.channels)
+    if frames == 0:
+        return info.sample_rate, np.zeros(shape, dtype=dtype)
+
+    data = np.memmap(filename, dtype=dtype, mode=mode, offset=info.data_offset, shape=shape)
+    return info.sample_rate, data
+
+def open_raw(filename, info=None):
+    """Memory-map the data chunk as bytes (any format, including 24-bit)"""
+    info = info or read_wav_info(filename)
+    block_align = info.channels * info.bits // 8
+    nbytes = info.data_bytes - info.data_bytes % block_align
+    if nbytes == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(filename, dtype=np.uint8, mode='r', offset=info.data_offset, shape=(nbytes,))
+
+def pcm_full_scale(bits, format_tag):
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        return 1.0
+    return float(2 ** (bits - 1))
+
+def decode_pcm(raw, bits, format_tag, as_float=True):
+    """Vectorized decode of little-endian PCM bytes to samples (interleaved, flat).
+
+    Handles 8/16/24/32-bit integer and 32/64-bit float. Values stay in sample
+    units (8-bit is re-centered on 0); as_float gives float32, else integers.
+    """
+    raw = np.frombuffer(raw, dtype=np.uint8)
+    if bits == 24 and format_tag == WAVE_FORMAT_PCM:
+        # Place the 3 bytes in the top of an int32, then shift back to sign-extend
+        triples = raw[:raw.size - raw.size % 3].reshape(-1, 3)
+        wide = np.zeros((triples.shape[0], 4), dtype=np.uint8)
+        wide[:, 1:] = triples
+        samples = wide.view('<i4').reshape(-1) >> 8
+    else:
+        dtype = _DTYPES.get((format_tag, bits))
+        if dtype is None:
+            raise ValueError(f"Unsupported WAV sample format: {bits}-bit, format {format_tag}")
+        samples = raw[:raw.size - raw.size % dtype.itemsize].view(dtype)
+        if dtype == np.uint8:
+            samples = samples.astype(np.int16) - 128
+
+    if as_float:
+        return samples.astype(np.float32)
+    return samples
+
+@instrumentation.hot
+def channel_stats(filename, chunk_frames=CHUNK_FRAMES):
+    """Per-channel sum of squares, peak and full-scale sample count for any PCM WAV.
+
+    Returns (info, frames, sum_squares[ch], peak[ch], clipped[ch]); levels are
+    in sample units of the file's own format (see pcm_full_scale).
+    """
+    info = read_wav_info(filename)
+    raw = open_raw(filename, info)
+    block_align = info.channels * info.bits // 8
+    frames = raw.size // block_align if block_align else 0
+
+    scale = pcm_full_scale(info.bits, info.format_tag)
+    clip_level = scale - 1 if info.format_tag != WAVE_FORMAT_IEEE_FLOAT else 1.0
+
+    sum_squares = np.zeros(info.channels, dtype=np.float64)
+    peak = np.zeros(info.channels, dtype=np.float64)
+    clipped = np.zeros(info.channels, dtype=np.int64)
+
+    step = chunk_frames * block_align
+    for start in range(0, raw.size, step):
+        block = decode_pcm(raw[start:start + step], info.bits, info.format_tag).reshape(-1, info.channels)
+        sum_squares += np.einsum('ij,ij->j', block, block)
+        magnitude = np.abs(block)
+        peak = np.maximum(peak, magnitude.max(axis=0))
+        clipped += np.count_nonzero(magnitude >= clip_level, axis=0)
+
+    return info, frames, sum_squares, peak, clipped
+
+def write(filename, rate, data):
+    wavfile.write(filename, rate, data)
+
+def work_samples(audio):
+    """Samples as work floats; float64 for 32-bit files, which float32 cannot hold"""
+    return audio.astype(np.float64) if audio.dtype == np.int32 else sample_format.to_work(audio)
+
+def read_work(filename):
+    """(sample_rate, samples as work floats, file dtype)"""
+    sr, audio = read(filename)
+    return sr, work_samples(audio), audio.dtype
+
+def write_work(filename, rate, work, dtype, rng=None):
+    """Export work floats to a WAV of `dtype`: the one quantization (work is modified in place)"""
+    data = sample_format.quantize(work, dtype, rng)
+    write(filename, rate, data)
+    return data
+
+def iter_chunks(data, chunk_frames=CHUNK_FRAMES):
+    """Flat views of consecutive whole-frame blocks (no copies)"""
+    flat = data.reshape(-1)
+    step = chunk_frames * (data.shape[1] if data.ndim > 1 else 1)
+    for start in range(0, flat.size, step):
+        yield flat[start:start + step]
+
+def full_scale(dtype):
+    """Magnitude that corresponds to 0 dBFS for a sample dtype"""
+    dtype = np.dtype(dtype)
+    if dtype == np.uint8:
+        return 128.0
+    if dtype.kind == 'i':
+        return float(2 ** (8 * dtype.itemsize - 1))
+    return 1.0
+
+def level_stats(data, chunk_frames=CHUNK_FRAMES):
+    """(rms, peak) in sample units, computed chunk by chunk in float32"""
+    sum_squares = 0.0
+    peak = 0.0
+    for chunk in iter_chunks(data, chunk_frames):
+        block = chunk.astype(np.float32)
+        if chunk.dtype == np.uint8:
+            block -= 128  # 8-bit WAV is unsigned, centered on 128
+        sum_squares += float(np.dot(block, block))
+        peak = max(peak, float(block.max()), float(-block.min()))
+
+    if data.size == 0:
+        return 0.0, 0.0
+    return float(np.sqrt(sum_squares / data.size)), peak
+
+@instrumentation.hot
+def measure_rms(audio_data):
+    """Calculate Root Mean Square (average energy) of a signal"""
+    return level_stats(audio_data)[0]
+
+def apply_gain(filename, gain, chunk_frames=CHUNK_FRAMES):
+    """Scale a WAV in place through a writable memory map, one chunk at a time.
+
+    Each sample is quantized once (TPDF dither, see sample_format.py). A gain
+    within UNITY_TOLERANCE of 1.0 leaves the file untouched, so normalizing
+    an already normalized file is a no-op. Returns True if the file changed.
+    """
+    if sample_format.is_unity(gain):
+        return False
+    sr, data = read(filename, mode='r+')
+    if data.size == 0:
+        return False
+
+    rng = sample_format.dither_rng(os.path.basename(filename))
+    for chunk in iter_chunks(data, chunk_frames):
+        block = sample_format.to_work(chunk)
+        if data.dtype == np.int32:
+            block = block.astype(np.float64)  # float32 cannot hold 32-bit samples
+        block *= gain
+        chunk[:] = sample_format.quantize(block, data.dtype, rng)
+
+    data.flush()
+    del data
+    os.utime(filename)
+    return True
+
+def store_samples(filename, samples):
+    """Overwrite a WAV's samples in place (same shape and dtype as read() returns)"""
+    sr, data = read(filename, mode='r+')
+    if data.shape != samples.shape or data.dtype != samples.dtype:
+        raise ValueError(f"{filename}: expected {data.dtype}{data.shape}, got {samples.dtype}{samples.shape}")
+    data[:] = samples
+    data.flush()
+    del data
+    os.utime(filename)
+
+def batches(paths, max_bytes=BATCH_BYTES):
+    """Split paths so each batch's float32 buffer stays under max_bytes (file sizes as the estimate)"""
+    batch, size = [], 0
+    for path in paths:
+        nbytes = os.path.getsize(path) * 2
+        if batch and size + nbytes > max_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(path)
+        size += nbytes
+    if batch:
+        yield batch
+
+def load_ragged(paths, wav_io=None):
+    """Concatenate clips into one float32 buffer; clip i is buffer[offsets[i]:offsets[i] + lengths[i]].
+
+    Returns (buffer, offsets, lengths, clips) where clips holds (path, sample_rate,
+    dtype, shape) of every non-empty file read; unreadable files are reported and left out.
+    Samples come from wav_io.read_work (this module's when None), so a build's
+    store hands over the float samples an earlier stage wrote.
+    """
+    read = wav_io.read_work if wav_io is not None else read_work
+    blocks, clips = [], []
+    for path in paths:
+        try:
+            sr, work, dtype = read(path)
+        except Exception as e:
+            print(f"Error on {path}: {e}")
+            continue
+        if work.size == 0:
+            continue
+        blocks.append(work.reshape(-1).astype(sample_format.WORK_DTYPE, copy=False))
+        clips.append((path, sr, dtype, work.shape))
+    lengths = np.array([len(b) for b in blocks], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+    buffer = np.concatenate(blocks) if blocks else np.zeros(0, dtype=sample_format.WORK_DTYPE)
+    return buffer, offsets, lengths, clips
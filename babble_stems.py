@@ -0,0 +1,307 @@
+import os
+import glob
+import json
+import wave
+import zlib
+import argparse
+import numpy as np
+import audio_io
+import sample_format
+import instrumentation
+from create_babble import DURATION_SECONDS, N_VOICES, SEED, plan_babble_schedule, render_babble
+from build_manifest import BuildManifest
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+SOURCE_FOLDERS = [os.path.join(BASE_PATH, "Form C", "wav")]
+OUTPUT_FILE = os.path.join(BASE_PATH, "babble_noise.wav")
+CALIBRATION_FILE = os.path.join(BASE_PATH, "calibration_1khz_neg20db.wav")
+# Per-voice stems and the placement schedule live here between runs
+STEMS_FOLDER = os.path.join(BASE_PATH, "babble_stems")
+STATE_FILE = "schedule.json"
+CHUNK = 1 << 20   # Samples per chunk when summing stems / writing the mix
+
+class BabbleStems:
+    """Persistent babble layers: one float32 stem per talker plus their schedule.
+
+    Adding or removing a talker only renders or deletes that stem. With a seed,
+    every stem is exactly what a fresh build would render, so a bed depends only
+    on its parameters and sources: a new duration or a changed sentence list
+    (names or lengths) re-renders every talker. Without a seed, extending the
+    duration only renders the new tail, and added sentences are used by new
+    placements only.
+    """
+
+    def __init__(self, folder=STEMS_FOLDER):
+        self.folder = folder
+        self.state_path = os.path.join(folder, STATE_FILE)
+        self.state = None
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                self.state = json.load(f)
+
+    def save(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def stem_path(self, voice):
+        return os.path.join(self.folder, f"voice_{voice:02d}.f32")
+
+    def mix_path(self):
+        return os.path.join(self.folder, "mix.f32")
+
+    def open_stem(self, voice, length):
+        """Writable memory map of a stem, zero-extended/truncated to `length`"""
+        path = self.stem_path(voice)
+        with open(path, 'ab') as f:
+            f.truncate(length * 4)
+        return np.memmap(path, dtype=np.float32, mode='r+', shape=(length,))
+
+    def _voice_rng(self, voice, segment):
+        # Independent, reproducible stream per (talker, extension segment)
+        seq = np.random.SeedSequence(self.state["entropy"], spawn_key=(voice, segment))
+        return np.random.default_rng(seq)
+
+    def _reset(self, sample_rate, seed):
+        for path in glob.glob(os.path.join(self.folder, "*.f32")):
+            os.remove(path)
+        entropy = seed if seed is not None else int(np.random.SeedSequence().entropy)
+        self.state = {"version": 1, "sample_rate": int(sample_rate), "total_samples": 0,
+                      "entropy": entropy, "seed": seed, "clips": {}, "layout": None, "voices": {}, "mix": None}
+
+    def _stale_voices(self, fingerprints):
+        """Talkers that use a sentence which has since changed or disappeared"""
+        stale = []
+        for key, voice in self.state["voices"].items():
+            for name, _, _, _ in voice["rows"]:
+                if fingerprints.get(name) != self.state["clips"].get(name):
+                    stale.append(key)
+                    break
+        return stale
+
+    @instrumentation.hot
+    def _render_voice(self, voice, clips, names, total):
+        """Plan and render a brand-new talker"""
+        lengths = [len(clips[name]) for name in names]
+        schedule = plan_babble_schedule(lengths, total, 1, self.state["sample_rate"], self._voice_rng(voice, 0))
+        stem = self.open_stem(voice, total)
+        stem[:] = 0
+        render_babble([clips[name] for name in names], schedule, total, out=stem)
+        stem.flush()
+
+        rows = [[names[c], int(o), int(n), int(g)] for c, o, n, g in
+                zip(schedule["clip"], schedule["offset"], schedule["length"], schedule["gap"])]
+        self.state["voices"][str(voice)] = {"rows": rows, "segments": 1}
+
+    @instrumentation.hot
+    def _resize_voice(self, voice, clips, names, old_total, total):
+        """Crop a talker to a shorter track, or append only the new tail"""
+        entry = self.state["voices"][str(voice)]
+        stem = self.open_stem(voice, total)
+
+        if total < old_total:
+            rows = [row for row in entry["rows"] if row[1] < total]
+            for row in rows:
+                row[2] = min(len(clips[row[0]]), total - row[1])
+            entry["rows"] = rows
+            stem.flush()
+            return
+
+        # 1. Finish the sentence that was cut off at the old end
+        rows = entry["rows"]
+        if rows:
+            name, offset, length, gap = rows[-1]
+            full = min(len(clips[name]), total - offset)
+            if full > length:
+                stem[offset + length:offset + full] += clips[name][length:full]
+                rows[-1][2] = full
+            cursor = offset + len(clips[name]) + gap
+        else:
+            cursor = old_total
+
+        # 2. Schedule and render new sentences from the cursor onwards
+        if cursor < total:
+            lengths = [len(clips[n]) for n in names]
+            rng = self._voice_rng(voice, entry["segments"])
+            schedule = plan_babble_schedule(lengths, total, 1, self.state["sample_rate"], rng,
+                                            start_offsets=[cursor])
+            render_babble([clips[n] for n in names], schedule, total, out=stem)
+            rows.extend([names[c], int(o), int(n), int(g)] for c, o, n, g in
+                        zip(schedule["clip"], schedule["offset"], schedule["length"], schedule["gap"]))
+            entry["segments"] += 1
+        stem.flush()
+
+    def update(self, clips, sample_rate, duration_seconds=DURATION_SECONDS, n_voices=N_VOICES, seed=SEED):
+        """Bring the stems in line with the parameters; returns True if any stem changed"""
+        os.makedirs(self.folder, exist_ok=True)
+        names = sorted(clips)
+        fingerprints = {name: [len(clip), zlib.crc32(clip.tobytes())] for name, clip in clips.items()}
+        total = int(sample_rate * duration_seconds)
+        changed = False
+
+        if self.state is None or self.state["sample_rate"] != sample_rate or self.state["seed"] != seed:
+            self._reset(sample_rate, seed)
+            changed = True
+
+        # Schedules are planned from the sentence lengths and the duration, so seeded stems
+        # made under other ones would differ from a fresh build of the same configuration
+        layout = [[name, len(clips[name])] for name in names]
+        if seed is not None and self.state["voices"] and (
+                self.state.get("layout") != layout or self.state["total_samples"] != total):
+            print(" -> Sentence list or duration changed, re-rendering every voice.")
+            self._reset(sample_rate, seed)
+            changed = True
+        self.state["layout"] = layout
+
+        # Talkers built from sentences that changed must be redone (same lengths, so same schedule)
+        for key in self._stale_voices(fingerprints):
+            print(f" -> Voice {key}: source sentence changed, re-rendering.")
+            del self.state["voices"][key]
+            changed = True
+        self.state["clips"] = fingerprints
+
+        # Remove talkers above n_voices
+        for key in [k for k in self.state["voices"] if int(k) >= n_voices]:
+            print(f" -> Voice {key}: removed.")
+            del self.state["voices"][key]
+            try:
+                os.remove(self.stem_path(int(key)))
+            except FileNotFoundError:
+                pass
+            changed = True
+
+        # Crop or extend the talkers we keep
+        old_total = self.state["total_samples"]
+        if total != old_total and self.state["voices"]:
+            for key in self.state["voices"]:
+                self._resize_voice(int(key), clips, names, old_total, total)
+            print(f" -> Track length {old_total / sample_rate:.1f}s -> {duration_seconds}s "
+                  f"({len(self.state['voices'])} existing voices resized).")
+            changed = True
+        self.state["total_samples"] = total
+
+        # Add missing talkers
+        for voice in range(n_voices):
+            if str(voice) not in self.state["voices"]:
+                print(f" -> Voice {voice}: rendering new layer.")
+                self._render_voice(voice, clips, names, total)
+                changed = True
+
+        if changed:
+            self.state["mix"] = None
+        self.save()
+        return changed
+
+    @instrumentation.hot
+    def mix(self):
+        """Sum the stems into mix.f32 (cached until a stem changes); returns (rms, peak)"""
+        total = self.state["total_samples"]
+        if self.state["mix"] is not None and os.path.exists(self.mix_path()):
+            return self.state["mix"]["rms"], self.state["mix"]["peak"]
+
+        stems = [np.memmap(self.stem_path(int(key)), dtype=np.float32, mode='r', shape=(total,))
+                 for key in sorted(self.state["voices"], key=int)]
+        out = np.memmap(self.mix_path(), dtype=np.float32, mode='w+', shape=(total,))
+        sum_squares, peak = 0.0, 0.0
+        for start in range(0, total, CHUNK):
+            block = np.zeros(min(CHUNK, total - start), dtype=np.float32)
+            for stem in stems:
+                block += stem[start:start + len(block)]
+            out[start:start + len(block)] = block
+            sum_squares += float(np.dot(block, block))
+            peak = max(peak, float(block.max()), float(-block.min()))
+        out.flush()
+
+        rms = float(np.sqrt(sum_squares / total)) if total else 0.0
+        self.state["mix"] = {"rms": rms, "peak": peak, "voices": len(stems)}
+        self.save()
+        return rms, peak
+
+    def write_output(self, output_file, target_rms=None):
+        """Write the int16 babble bed at the target level: one gain over the cached mix"""
+        rms, peak = self.mix()
+        if rms == 0:
+            raise ValueError("Babble mix is silent")
+
+        if target_rms is None:
+            # No calibration yet: preliminary normalization, peak at 90% (-1 dB)
+            gain = 0.9 * 32767 / peak
+        else:
+            # Mix is in float units, the target in 16-bit units
+            gain = target_rms / rms
+            if peak * gain > sample_format.MAX_ALLOWED:
+                gain *= sample_format.MAX_ALLOWED / (peak * gain)
+
+        total = self.state["total_samples"]
+        mix = np.memmap(self.mix_path(), dtype=np.float32, mode='r', shape=(total,))
+        rng = sample_format.dither_rng(os.path.basename(output_file))
+        with wave.open(output_file, 'wb') as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(self.state["sample_rate"])
+            for start in range(0, total, CHUNK):
+                block = mix[start:start + CHUNK].astype(sample_format.WORK_DTYPE)
+                block *= gain
+                out.writeframes(sample_format.quantize(block, '<i2', rng).tobytes())
+
+        self.state["output"] = {"file": output_file, "gain": gain, "target_rms": target_rms}
+        self.save()
+        return gain
+
+def load_clips(source_folders=SOURCE_FOLDERS, wav_io=audio_io):
+    """{file name: float32 clip (-1.0 to 1.0)} for every babble source sentence"""
+    clips = {}
+    sample_rate = None
+    for folder in source_folders:
+        for path in sorted(glob.glob(os.path.join(folder, "swir_*.wav"))):
+            try:
+                sr, audio = wav_io.read(path)
+                sample_rate = sr
+                clips[os.path.basename(path)] = audio.astype(np.float32) / 32768.0
+            except Exception as e:
+                print(f"Skipping bad file {path}: {e}")
+    return sample_rate, clips
+
+def update_babble(source_folders=SOURCE_FOLDERS, output_file=OUTPUT_FILE, stems_folder=STEMS_FOLDER,
+                  calibration_file=CALIBRATION_FILE, duration_seconds=DURATION_SECONDS,
+                  n_voices=N_VOICES, seed=SEED, wav_io=audio_io):
+    print("--- Incremental Babble Builder ---")
+
+    sample_rate, clips = load_clips(source_folders, wav_io)
+    if not clips:
+        print(f"CRITICAL ERROR: No sentence files found in: {source_folders}")
+        return
+
+    stems = BabbleStems(stems_folder)
+    changed = stems.update(clips, sample_rate, duration_seconds, n_voices, seed)
+
+    # Level the bed against the calibration tone directly, so normalize_safe.py
+    # finds it already at the target and skips it
+    target_rms = None
+    manifest = None
+    if os.path.exists(calibration_file):
+        manifest = BuildManifest(os.path.dirname(calibration_file))
+        target_rms = manifest.measure(calibration_file, wav_io)["rms"]
+
+    previous = stems.state.get("output") or {}
+    if (changed or not os.path.exists(output_file) or previous.get("file") != output_file
+            or previous.get("target_rms") != target_rms):
+        gain = stems.write_output(output_file, target_rms)
+        if manifest is not None:
+            sr, audio = audio_io.read(output_file)
+            manifest.record(output_file, sr, audio, gain=gain, target_rms=target_rms)
+            manifest.save()
+        print(f"Success! Babble track saved to:\n{output_file}")
+    else:
+        print("Babble stems unchanged, nothing to do.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the babble bed from cached per-talker stems.")
+    parser.add_argument("--voices", type=int, default=N_VOICES)
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+    update_babble(duration_seconds=args.duration, n_voices=args.voices, seed=args.seed)
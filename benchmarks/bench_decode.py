@@ -0,0 +1,84 @@
+"""Per-sentence cost of the in-process decoder vs. the ffmpeg paths.
+
+Usage: python3 benchmarks/bench_decode.py [--repeat 3] [--limit 25]
+
+Inputs are the MP3s under audio_output/Form */mp3 when present (real gTTS
+output), otherwise offline tone WAVs from generate.tone_synthesize.
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import tempfile
+import argparse
+import subprocess
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import audio_decode
+from generate import tone_synthesize
+
+def legacy_ffmpeg_tempfile(audio_bytes, workdir):
+    """The old generate.py path: temp mp3 -> ffmpeg -> wav on disk -> read back"""
+    temp_mp3 = os.path.join(workdir, "temp.mp3")
+    wav_path = os.path.join(workdir, "out.wav")
+    with open(temp_mp3, 'wb') as f:
+        f.write(audio_bytes)
+    subprocess.run(['ffmpeg', '-i', temp_mp3, '-ac', '1', '-ar', '44100', wav_path, '-y'],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    os.remove(temp_mp3)
+
+def load_inputs(limit):
+    mp3s = sorted(glob.glob(os.path.join("audio_output", "Form *", "mp3", "*.mp3")))[:limit]
+    if mp3s:
+        inputs = []
+        for path in mp3s:
+            with open(path, 'rb') as f:
+                inputs.append(f.read())
+        return "mp3", inputs
+    texts = [f"Sentence number {i} for the decoder benchmark." for i in range(limit)]
+    return "wav", [tone_synthesize(text) for text in texts]
+
+def time_path(fn, inputs, repeat):
+    per_item = []
+    for _ in range(repeat):
+        for data in inputs:
+            start = time.perf_counter()
+            fn(data)
+            per_item.append(time.perf_counter() - start)
+    return per_item
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=25)
+    args = parser.parse_args()
+
+    kind, inputs = load_inputs(args.limit)
+    print(f"Benchmarking {len(inputs)} {kind} inputs x {args.repeat} repeats\n")
+
+    paths = {}
+    in_process = "wav" if kind == "wav" else ("miniaudio" if audio_decode.miniaudio else None)
+    if in_process:
+        paths[f"in-process ({in_process})"] = audio_decode.DECODERS[in_process]
+    else:
+        print("in-process: skipped (pip install miniaudio to decode MP3 in-process)")
+
+    workdir = tempfile.mkdtemp()
+    if shutil.which("ffmpeg"):
+        paths["ffmpeg pipe"] = audio_decode.decode_ffmpeg
+        paths["ffmpeg temp file (old)"] = lambda data: legacy_ffmpeg_tempfile(data, workdir)
+    else:
+        print("ffmpeg: skipped (not on PATH)")
+
+    print(f"{'path':<28}{'median ms':>12}{'mean ms':>12}")
+    for name, fn in paths.items():
+        times = time_path(fn, inputs, args.repeat)
+        print(f"{name:<28}{statistics.median(times) * 1000:>12.2f}{statistics.mean(times) * 1000:>12.2f}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Level kernel micro-benchmark: old struct/loop RMS vs. the vectorized kernel.
+
+Usage: python3 benchmarks/bench_levels.py [path/to/bed.wav] [--repeat 3]
+
+Defaults to audio_output/babble_noise.wav; a 300 s synthetic 16-bit bed is
+used when that file does not exist.
+"""
+import os
+import sys
+import math
+import time
+import wave
+import struct
+import argparse
+import tempfile
+import numpy as np
+from scipy.io import wavfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import audio_io
+from analyze_audio_levels import calculate_rms_amplitude, calculate_db_fs
+
+def legacy_rms_amplitude(frames, width):
+    """The previous analyze_audio_levels.calculate_rms_amplitude (16-bit path)"""
+    count = len(frames) // width
+    samples = struct.unpack(f"<{count}h", frames)
+    sum_squares = 0
+    for s in samples:
+        sum_squares += s * s
+    return math.sqrt(sum_squares / count)
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", nargs="?", default=os.path.join("audio_output", "babble_noise.wav"))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = args.path
+    if not os.path.exists(path):
+        path = os.path.join(tempfile.mkdtemp(), "synthetic_bed.wav")
+        rng = np.random.default_rng(0)
+        wavfile.write(path, 44100, (rng.standard_normal(44100 * 300) * 2300).astype(np.int16))
+        print(f"{args.path} not found; using a synthetic 300 s bed")
+
+    with wave.open(path, 'rb') as wav:
+        frames = wav.readframes(wav.getnframes())
+        width = wav.getsampwidth()
+    if width != 2:
+        sys.exit("The legacy kernel only handled 16-bit files")
+
+    megabytes = len(frames) / 1e6
+    print(f"{path}: {megabytes:.1f} MB of 16-bit PCM\n")
+
+    rows = [
+        ("legacy struct loop", lambda: legacy_rms_amplitude(frames, width), 1),
+        ("vectorized (bytes in RAM)", lambda: calculate_rms_amplitude(frames, width), args.repeat),
+        ("vectorized file (mmap)", lambda: calculate_db_fs(path), args.repeat),
+        ("channel_stats (mmap)", lambda: audio_io.channel_stats(path)[2], args.repeat),
+    ]
+
+    print(f"{'kernel':<28}{'seconds':>10}{'MB/s':>10}")
+    for name, fn, repeat in rows:
+        seconds, _ = best_of(fn, repeat)
+        print(f"{name:<28}{seconds:>10.3f}{megabytes / seconds:>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Level-mode benchmark: plain RMS vs BS.1770 LUFS vs P.56 active speech level.
+
+Usage: python3 benchmarks/level_modes.py [--files 1000] [--seconds 2.5]
+
+Writes a synthetic corpus of speech-like clips (noise-excited syllables with
+TTS-style leading and trailing silence of random length), then for each mode
+times the level kernel alone and a full normalize_safe run, and counts the
+clips whose gain had to be clamped to protect the peaks.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import audio_io
+import loudness
+import normalize_safe
+import create_calibration
+
+SAMPLE_RATE = 24000
+
+def speech_like(rng, seconds, sample_rate=SAMPLE_RATE):
+    """Syllable bursts (band-limited noise under a raised-cosine envelope) between silences"""
+    n = int(seconds * sample_rate)
+    out = np.zeros(n, dtype=np.float32)
+    start = int(rng.uniform(0.1, 0.8) * sample_rate)            # Leading silence
+    end = n - int(rng.uniform(0.1, 0.8) * sample_rate)          # Trailing silence
+    while start < end:
+        length = min(int(rng.uniform(0.08, 0.25) * sample_rate), end - start)
+        if length < 64:
+            break
+        burst = np.convolve(rng.standard_normal(length), np.ones(6) / 6, mode='same')
+        out[start:start + length] = burst * np.hanning(length) * rng.uniform(0.3, 1.0)
+        start += length + int(rng.uniform(0.02, 0.15) * sample_rate)
+    return (out / max(np.abs(out).max(), 1e-9) * 12000).astype(np.int16)
+
+def make_corpus(folder, files, seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    wav_folder = os.path.join(folder, "wav")
+    os.makedirs(wav_folder, exist_ok=True)
+    create_calibration.generate_calibration_tone(output_folder=folder)
+    for i in range(files):
+        audio = speech_like(rng, seconds * rng.uniform(0.6, 1.4))
+        audio_io.write(os.path.join(wav_folder, f"swir_{i:05d}.wav"), SAMPLE_RATE, audio)
+    return wav_folder
+
+def time_kernel(paths, mode):
+    clips = [audio_io.read(path) for path in paths]
+    started = time.perf_counter()
+    for sr, audio in clips:
+        loudness.level(audio, sr, mode)
+    return time.perf_counter() - started
+
+def time_normalize(corpus, wav_folder, mode):
+    """Fresh copy of the corpus, one normalize_safe run; returns (seconds, clamped clips)"""
+    work = corpus + f"_{mode}"
+    shutil.copytree(corpus, work)
+    calibration = os.path.join(work, create_calibration.OUTPUT_FILE)
+    folder = os.path.join(work, os.path.relpath(wav_folder, corpus))
+    lines = []
+    stdout, sys.stdout = sys.stdout, _Capture(lines)
+    try:
+        started = time.perf_counter()
+        normalize_safe.normalize_safe(calibration, [folder], mode=mode)
+        elapsed = time.perf_counter() - started
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(work, ignore_errors=True)
+    return elapsed, sum("Protected" in line for line in lines)
+
+class _Capture:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def write(self, text):
+        self.lines.extend(text.splitlines())
+
+    def flush(self):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=2.5, help="mean clip length")
+    parser.add_argument("--modes", nargs="+", default=loudness.MODES, choices=loudness.MODES)
+    args = parser.parse_args()
+
+    corpus = tempfile.mkdtemp(prefix="swir_levels_")
+    try:
+        wav_folder = make_corpus(corpus, args.files, args.seconds)
+        paths = sorted(os.path.join(wav_folder, name) for name in os.listdir(wav_folder))
+        print(f"\n{args.files} clips of ~{args.seconds:g}s ({corpus})")
+        print(f"  {'mode':<8}{'kernel':>10}{'per file':>12}{'normalize':>12}{'files/s':>10}{'clamped':>9}")
+        rms_time = None
+        for mode in args.modes:
+            kernel = time_kernel(paths, mode)
+            total, clamped = time_normalize(corpus, wav_folder, mode)
+            rms_time = total if mode == "rms" else rms_time
+            ratio = f"  ({total / rms_time:.1f}x rms)" if rms_time and mode != "rms" else ""
+            print(f"  {mode:<8}{kernel:>9.2f}s{kernel / len(paths) * 1e3:>10.2f}ms{total:>11.2f}s"
+                  f"{len(paths) / total:>10.0f}{clamped:>9}{ratio}")
+    finally:
+        shutil.rmtree(corpus, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
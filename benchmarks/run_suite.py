@@ -0,0 +1,179 @@
+"""Asset build benchmark: every swir_build stage on a synthetic corpus, offline.
+
+Usage: python3 benchmarks/run_suite.py [--sizes 100 1000 10000] [--baseline benchmarks/baseline.json]
+
+Sentences are synthesized with generate.tone_synthesize (no network). Each
+stage runs in a fresh process so its wall time, CPU time and peak memory
+(RSS and Python/numpy allocations) are its own. Results go to a JSON file
+that a later run can be compared against (--save-baseline writes one).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import resource
+import tracemalloc
+import multiprocessing
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+FORM_SHARES = {"A": 0.3, "B": 0.3, "C": 0.3, "P": 0.1}
+WORDS = ("the dog cat ran sat down street plate grass cake house tree water light small green "
+         "quickly under over market school table window river garden morning yellow").split()
+
+def make_corpus(folder, size, seed=0):
+    """Write sentences.json / babble_sentences.json / practice_sentences.json with `size` items"""
+    rng = np.random.default_rng(seed)
+    lists = {"A": [], "B": [], "C": [], "P": []}
+    forms = rng.choice(list(FORM_SHARES), size=size, p=list(FORM_SHARES.values()))
+    for i, form in enumerate(forms):
+        words = rng.choice(WORDS, size=rng.integers(5, 9))
+        text = " ".join(words).capitalize() + "."
+        lists[form].append({"id": f"{form.lower()}{i:05d}", "text": text, "target": words[-1], "list": form})
+
+    files = {"sentences.json": lists["A"] + lists["B"], "babble_sentences.json": lists["C"],
+             "practice_sentences.json": lists["P"]}
+    for name, items in files.items():
+        with open(os.path.join(folder, name), 'w') as f:
+            json.dump(items, f)
+
+def stage_names():
+    """Every swir_build stage, in the order a full build runs them"""
+    import swir_build
+    return [s.name for s in swir_build.order_stages(swir_build.build_stages(swir_build.BASE_PATH, tts="tone"))]
+
+def _rss_mb(who):
+    # ru_maxrss is in kB on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+def run_stage(name, workdir, duration):
+    """Child process: run one build stage and report its cost"""
+    os.chdir(workdir)
+    import create_noise
+    import create_babble
+    import swir_build
+
+    create_noise.DURATION_SECONDS = duration
+    create_babble.DURATION_SECONDS = duration
+    stage = {s.name: s for s in swir_build.build_stages(swir_build.BASE_PATH, tts="tone")}[name]
+    store = swir_build.AudioStore()
+
+    rss_before = _rss_mb(resource.RUSAGE_SELF)
+    tracemalloc.start()
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    stage.run(store)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "peak_rss_mb": _rss_mb(resource.RUSAGE_SELF),
+        "rss_before_mb": rss_before,
+        "children_peak_rss_mb": _rss_mb(resource.RUSAGE_CHILDREN),
+        "traced_peak_mb": traced_peak / 1e6,
+        "files_opened": store.opened,
+    }
+
+def run_size(size, workdir, duration, stages, quiet=True):
+    make_corpus(workdir, size)
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for name in stages:
+        with ctx.Pool(1) as pool:
+            if quiet:
+                result = pool.apply(_run_quietly, (name, workdir, duration))
+            else:
+                result = pool.apply(run_stage, (name, workdir, duration))
+        results[name] = result
+        print(f"  {name:<12}{result['wall_s']:>9.2f}s{result['cpu_s']:>9.2f}s"
+              f"{result['peak_rss_mb']:>10.0f} MB{result['traced_peak_mb']:>10.1f} MB")
+    return results
+
+def _run_quietly(name, workdir, duration):
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            return run_stage(name, workdir, duration)
+        finally:
+            sys.stdout = stdout
+
+def compare(results, baseline, tolerance):
+    """Print wall-time ratios against the baseline; returns the regressions"""
+    regressions = []
+    print(f"\n{'size':>6}  {'stage':<12}{'baseline':>10}{'now':>10}{'ratio':>8}")
+    for size, stages in results["runs"].items():
+        for name, now in stages.items():
+            before = baseline.get("runs", {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            ratio = now["wall_s"] / before["wall_s"] if before["wall_s"] else float('inf')
+            # Sub-50 ms stages are all noise
+            flag = ratio > 1 + tolerance and now["wall_s"] - before["wall_s"] > 0.05
+            if flag:
+                regressions.append((size, name, ratio))
+            print(f"{size:>6}  {name:<12}{before['wall_s']:>10.2f}{now['wall_s']:>10.2f}{ratio:>8.2f}"
+                  f"{'  SLOWER' if flag else ''}")
+    return regressions
+
+def main():
+    stages = stage_names()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100], help="sentences per corpus")
+    parser.add_argument("--stages", nargs="+", default=stages, choices=stages)
+    parser.add_argument("--duration", type=float, default=60, help="noise/babble seconds")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results.json"))
+    parser.add_argument("--baseline", default=os.path.join(ROOT, "benchmarks", "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown (0.15 = 15%%)")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic corpora")
+    parser.add_argument("--verbose", action="store_true", help="show the stages' own output")
+    args = parser.parse_args()
+    # Later stages read what earlier ones wrote, so they always run in build order
+    args.stages = [name for name in stages if name in args.stages]
+
+    results = {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "numpy": np.__version__, "cpus": os.cpu_count()},
+        "duration_s": args.duration,
+        "runs": {},
+    }
+
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix=f"swir_bench_{size}_")
+        print(f"\n{size} sentences ({workdir})")
+        print(f"  {'stage':<12}{'wall':>10}{'cpu':>10}{'peak RSS':>13}{'allocated':>13}")
+        try:
+            results["runs"][str(size)] = run_size(size, workdir, args.duration, args.stages, not args.verbose)
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Saved as baseline: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than the baseline by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
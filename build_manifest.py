@@ -0,0 +1,159 @@
+import os
+import json
+import hashlib
+import numpy as np
+import audio_io
+import loudness
+
+# --- CONFIGURATION ---
+MANIFEST_FILE = "manifest.json"   # Lives in the root of audio_output
+HASH_CHUNK = 1 << 20              # Read 1 MB at a time when hashing
+
+def file_hash(path):
+    """SHA-256 of the raw file bytes"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class BuildManifest:
+    """Per-asset record of content hash, format, levels and applied gain.
+
+    Entries are keyed by path relative to the audio_output folder. A file is
+    only re-hashed when its size or mtime differs from what was recorded.
+    """
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.path = os.path.join(base_path, MANIFEST_FILE)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f).get("assets", {})
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.base_path))
+
+    def lookup(self, path):
+        """Return the entry for `path` if the file content still matches it"""
+        entry = self.entries.get(self._key(path))
+        if entry is None or not os.path.exists(path):
+            return None
+
+        st = os.stat(path)
+        if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry
+
+        # Touched but maybe not changed (e.g. copied or checked out again)
+        if entry["size"] == st.st_size and entry["sha256"] == file_hash(path):
+            entry["mtime_ns"] = st.st_mtime_ns
+            return entry
+        return None
+
+    def is_normalized(self, path, target_rms, level_mode="rms"):
+        """True if `path` was normalized to `target_rms` (in `level_mode`) and not modified since"""
+        entry = self.lookup(path)
+        if entry is None or entry.get("target_rms") is None:
+            return False
+        if entry.get("level_mode", "rms") != level_mode:
+            return False
+        return bool(np.isclose(entry["target_rms"], target_rms, rtol=1e-9, atol=0))
+
+    def record(self, path, sample_rate, audio, gain=None, target_rms=None):
+        """Store hash, format and measured levels of the file just written"""
+        st = os.stat(path)
+        rms, peak = audio_io.level_stats(audio)
+        entry = {
+            "sha256": file_hash(path),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sample_rate": int(sample_rate),
+            "length": int(audio.shape[0]),
+            "rms": rms,
+            "peak": peak,
+            "gain": gain,
+            "target_rms": target_rms,
+        }
+        self.entries[self._key(path)] = entry
+        return entry
+
+    def record_row(self, path, row, gain=None, target_rms=None, level_mode=None):
+        """Store a measure_levels.measure_file(..., with_hash=True) row"""
+        entry = {key: row[key] for key in ("sha256", "size", "mtime_ns", "sample_rate", "length", "rms", "peak")}
+        entry.update({key: row[key] for key in loudness.LEVEL_KEYS if key in row})
+        entry.update({"gain": gain, "target_rms": target_rms})
+        if level_mode is not None:
+            entry["level_mode"] = level_mode
+        self.entries[self._key(path)] = entry
+        return entry
+
+    def copy_entry(self, source, path):
+        """Give `path` (a byte-for-byte copy of `source`) the same levels and gain"""
+        entry = self.lookup(source)
+        if entry is None:
+            return None
+        st = os.stat(path)
+        entry = dict(entry, size=st.st_size, mtime_ns=st.st_mtime_ns)
+        self.entries[self._key(path)] = entry
+        return entry
+
+    def measure_many(self, paths, workers=None, mode="rms", wav_io=None):
+        """{path: entry} for many files; stale ones are measured on a process pool.
+
+        An entry without a level for `mode` (see loudness.py) also counts as
+        stale. Files that could not be read map to {"error": message}. With a
+        `wav_io` (e.g. swir_build's AudioStore) stale files are measured in
+        process from the arrays it already holds instead of being decoded again.
+        """
+        from measure_levels import measure_files, WORKERS
+
+        key = loudness.level_key(mode)
+        results = {}
+        stale = []
+        for path in paths:
+            entry = self.lookup(path)
+            if entry is None or key not in entry:
+                stale.append(path)
+            else:
+                results[path] = entry
+
+        if wav_io is not None:
+            for path in stale:
+                try:
+                    results[path] = self.measure(path, wav_io, mode)
+                except Exception as e:
+                    results[path] = {"error": str(e)}
+            return results
+
+        for row in measure_files(stale, workers=workers or WORKERS, with_hash=True, mode=mode):
+            path = row["path"]
+            if row["error"]:
+                results[path] = {"error": row["error"]}
+                continue
+            entry = self.lookup(path)
+            if entry is not None:
+                # Keep the recorded gain/target, only the new level is added
+                entry[key] = row[key]
+                results[path] = entry
+            else:
+                results[path] = self.record_row(path, row)
+        return results
+
+    def measure(self, path, wav_io, mode="rms"):
+        """Levels for `path`, decoding it only if the manifest entry is stale"""
+        entry = self.lookup(path)
+        if entry is None:
+            sr, audio = wav_io.read(path)
+            entry = self.record(path, sr, audio)
+        key = loudness.level_key(mode)
+        if key not in entry:
+            sr, audio = wav_io.read(path)
+            entry[key] = loudness.level(audio, sr, mode)
+        return entry
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": 1, "assets": self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,188 @@
+import os
+import glob
+import json
+import math
+import zlib
+import argparse
+import numpy as np
+import noise_index
+from build_manifest import BuildManifest
+import render_snr_ladder
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+BABBLE_FILE = "babble_noise.wav"
+OUTPUT_FILE = "snr_offsets.json"   # Inside BASE_PATH, loaded by the app
+FORMS = ["A", "B", "P"]
+N_OFFSETS = 2000                   # Random babble start points tried per sentence
+SEED = 0                           # Fixed so the table only changes when the audio does
+
+def power_db(power):
+    if power <= 0: return -float('inf')
+    return 10 * math.log10(power / 32768.0 ** 2)
+
+def solve_offsets(speech_power, window_powers):
+    """Offset (dB) that makes App.js's `-snr + offset` babble gain give a true SNR of `snr`.
+
+    True SNR = speech dB - (window dB + gain dB); with gain dB = -snr + offset
+    this is snr exactly when offset = speech dB - window dB. Window power is
+    energy-averaged over the offsets tried.
+    """
+    return power_db(speech_power) - power_db(float(np.mean(window_powers)))
+
+def sentence_rng(seed, form, sentence_id):
+    """Start points per sentence, so one sentence can be re-solved without the others"""
+    return np.random.default_rng([seed, zlib.crc32(f"{form}/{sentence_id}".encode())])
+
+def sentence_offsets(index, form, sentence_id, entry, n_offsets=N_OFFSETS, seed=SEED):
+    """Table row for one sentence (manifest `entry`), or None if it does not fit the bed"""
+    babble_sr, babble_length = index.sample_rate, index.length
+    speech_power = entry["rms"] ** 2
+
+    # The babble that plays under this sentence, at the bed's own rate
+    length = int(round(entry["length"] * babble_sr / entry["sample_rate"]))
+    if length == 0 or length >= babble_length:
+        return None
+    starts = sentence_rng(seed, form, sentence_id).integers(0, babble_length - length, size=n_offsets)
+    powers = index.power(starts, length)
+    window_db = 10 * np.log10(np.maximum(powers, 1e-12) / 32768.0 ** 2)
+
+    # The exact window render_snr_ladder.py mixes this sentence with
+    lead = int(round(render_snr_ladder.LEAD_IN * babble_sr))
+    tail = int(round(render_snr_ladder.TAIL * babble_sr))
+    ladder_start = render_snr_ladder.segment_offset(form, sentence_id, lead + length + tail, babble_length)
+    ladder_power = float(index.power(ladder_start + lead, length))
+
+    return {
+        "offset_db": solve_offsets(speech_power, powers),
+        "ladder_offset_db": power_db(speech_power) - power_db(ladder_power),
+        "speech_db": power_db(speech_power),
+        "babble_db": power_db(float(np.mean(powers))),
+        "babble_p5_db": float(np.percentile(window_db, 5)),
+        "babble_p95_db": float(np.percentile(window_db, 95)),
+    }
+
+def _mean_power(sentences, key):
+    return float(np.mean([32768.0 ** 2 * 10 ** (s[key] / 10) for s in sentences]))
+
+def summarize(table):
+    """Per-form and overall offsets from the sentence rows.
+
+    Every sentence tries the same number of windows, so the energy average over
+    all windows is the mean of the per-sentence babble powers.
+    """
+    everything = []
+    for form in table["forms"].values():
+        sentences = list(form["sentences"].values())
+        form["offset_db"] = power_db(_mean_power(sentences, "speech_db")) - power_db(_mean_power(sentences, "babble_db"))
+        everything.extend(sentences)
+    if everything:
+        table["offset_db"] = power_db(_mean_power(everything, "speech_db")) - power_db(_mean_power(everything, "babble_db"))
+    return table
+
+def write_table(base, table):
+    out_path = os.path.join(base, OUTPUT_FILE)
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(table, f, indent=1)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def calibrate_snr(base=BASE_PATH, forms=FORMS, n_offsets=N_OFFSETS, seed=SEED, manifest=None):
+    print("--- SNR Calibration Solver ---")
+    babble_file = os.path.join(base, BABBLE_FILE)
+    if not os.path.exists(babble_file):
+        print(f"CRITICAL: Babble file missing: {babble_file}")
+        return None
+
+    if manifest is None:
+        manifest = BuildManifest(base)
+
+    # Window levels come from the bed's cumulative-energy index (built once, cached)
+    index = noise_index.load_index(babble_file, base)
+    babble_power = index.mean_rms ** 2
+    print(f"Babble bed: {power_db(babble_power):.2f} dB ({index.duration:.1f}s)")
+
+    table = {"version": 1, "babble": BABBLE_FILE, "babble_db": power_db(babble_power),
+             "n_offsets": n_offsets, "seed": seed, "forms": {}}
+
+    for form in forms:
+        files = sorted(glob.glob(os.path.join(base, f"Form {form}", "wav", "swir_*.wav")))
+        levels = manifest.measure_many(files)
+        sentences = {}
+
+        for path in files:
+            entry = levels[path]
+            if entry.get("error"):
+                print(f"  Error reading {path}: {entry['error']}")
+                continue
+            sentence_id = os.path.basename(path)[len("swir_"):-len(".wav")]
+            row = sentence_offsets(index, form, sentence_id, entry, n_offsets, seed)
+            if row is None:
+                print(f"  Skipping {path}: length does not fit the babble bed")
+                continue
+            sentences[sentence_id] = row
+
+        if not sentences:
+            print(f"  Form {form}: no sentences found")
+            continue
+        table["forms"][form] = {"sentences": sentences}
+
+    manifest.save()
+    if not table["forms"]:
+        print("No valid speech files found.")
+        return None
+
+    summarize(table)
+    for form, rows in table["forms"].items():
+        spread = [s["offset_db"] for s in rows["sentences"].values()]
+        print(f"  Form {form}: offset {rows['offset_db']:+.2f} dB over {len(spread)} sentences "
+              f"(per sentence {min(spread):+.2f} to {max(spread):+.2f} dB)")
+    print(f"\nOverall offset (replaces BABBLE_OFFSET_DB): {table['offset_db']:+.2f} dB")
+
+    out_path = write_table(base, table)
+    print(f"Offset tables written to {out_path}")
+    return table
+
+def update_offsets(base, paths, manifest, index, n_offsets=N_OFFSETS, seed=SEED):
+    """Re-solve only the sentences in `paths` (Form X/wav/swir_<id>.wav) in an existing table.
+
+    Sentences whose file is gone are dropped. Returns the table, or None when
+    there is no table yet (run calibrate_snr first).
+    """
+    out_path = os.path.join(base, OUTPUT_FILE)
+    if not os.path.exists(out_path):
+        return None
+    with open(out_path, 'r') as f:
+        table = json.load(f)
+    if table.get("n_offsets") != n_offsets or table.get("seed") != seed:
+        return None
+
+    levels = manifest.measure_many([p for p in paths if os.path.exists(p)])
+    for path in paths:
+        form = os.path.basename(os.path.dirname(os.path.dirname(path)))[len("Form "):]
+        if form not in FORMS:
+            continue
+        sentence_id = os.path.basename(path)[len("swir_"):-len(".wav")]
+        sentences = table["forms"].setdefault(form, {"sentences": {}})["sentences"]
+        entry = levels.get(path)
+        row = None
+        if entry is not None and not entry.get("error"):
+            row = sentence_offsets(index, form, sentence_id, entry, n_offsets, seed)
+        if row is None:
+            sentences.pop(sentence_id, None)
+        else:
+            sentences[sentence_id] = row
+
+    table["forms"] = {form: rows for form, rows in table["forms"].items() if rows["sentences"]}
+    write_table(base, summarize(table))
+    return table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve per-form and per-sentence babble offsets for exact SNR.")
+    parser.add_argument("--base", default=BASE_PATH)
+    parser.add_argument("--offsets", type=int, default=N_OFFSETS, help="random babble windows per sentence")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+    calibrate_snr(base=args.base, n_offsets=args.offsets, seed=args.seed)
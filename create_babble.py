@@ -1,8 +1,10 @@
 import os
 import glob
-import random
+import argparse
 import numpy as np
-from scipy.io import wavfile
+import audio_io
+import sample_format
+import instrumentation
 
 # --- CONFIGURATION ---
 # The root folder for your project
@@ -18,19 +20,22 @@ SOURCE_FOLDERS = [
 OUTPUT_FILE = os.path.join(BASE_PATH, "babble_noise.wav")
 DURATION_SECONDS = 300   # 300 second loop (5 Minutes)
 N_VOICES = 4             # 4-talker babble (Hard Mode / Informational Masking)
+SEED = 0                 # Same seed + parameters + sources = same track (None: fresh random track)
 
-def create_custom_babble():
+def create_custom_babble(source_folders=SOURCE_FOLDERS, output_file=OUTPUT_FILE, wav_io=audio_io, seed=SEED,
+                         duration_seconds=DURATION_SECONDS, n_voices=N_VOICES):
     print("--- Generative Babble Creator ---")
 
     # 1. Gather all source files
     source_files = []
-    for folder in SOURCE_FOLDERS:
+    for folder in source_folders:
         # Recursive glob to find files even if subfolders exist
-        files = glob.glob(os.path.join(folder, "swir_*.wav"))
+        # (sorted: clip indices in the schedule must not depend on directory order)
+        files = sorted(glob.glob(os.path.join(folder, "swir_*.wav")))
         source_files.extend(files)
 
     if not source_files:
-        print(f"CRITICAL ERROR: No sentence files found in: {SOURCE_FOLDERS}")
+        print(f"CRITICAL ERROR: No sentence files found in: {source_folders}")
         print("Did you run generate.py with DATA_FILE='babble_sentences.json'?")
         return
 
@@ -42,13 +47,13 @@ def create_custom_babble():
 
     for f in source_files:
         try:
-            sr, audio = wavfile.read(f)
+            sr, audio = wav_io.read(f)
             sample_rate = sr
 
-            # Convert to Float64 (-1.0 to 1.0) for mixing math
+            # Convert to Float32 (-1.0 to 1.0) for mixing math
             # If it's 16-bit integer, normalize it.
             if audio.dtype == np.int16:
-                audio = audio.astype(np.float64) / 32768.0
+                audio = audio.astype(sample_format.WORK_DTYPE) / 32768.0
 
             loaded_audio_clips.append(audio)
         except Exception as e:
@@ -58,64 +63,100 @@ def create_custom_babble():
         print("Error: Could not load any audio clips.")
         return
 
-    # 3. Create the empty timeline (The "Room")
-    total_samples = sample_rate * DURATION_SECONDS
-    final_mix = np.zeros(total_samples, dtype=np.float64)
-
-    print(f"Generating {N_VOICES}-talker babble track ({DURATION_SECONDS}s)...")
-    print("This may take a moment due to the longer duration.")
-
-    # 4. Layer the voices
-    for voice_idx in range(N_VOICES):
-        # Create a temporary track for this single voice
-        voice_track = np.zeros(total_samples, dtype=np.float64)
-        cursor = 0
-
-        # Start the first sentence at a random offset so voices don't start in unison
-        start_delay = int(random.uniform(0, 2.0) * sample_rate)
-        cursor += start_delay
-
-        # Fill the track until we reach the end
-        while cursor < total_samples:
-            # Pick a random sentence
-            clip = random.choice(loaded_audio_clips)
-
-            # Determine length of this specific clip
-            clip_len = len(clip)
-
-            # Calculate placement
-            end = cursor + clip_len
-
-            # Add it to the voice track
-            if end > total_samples:
-                # Crop if it goes past the end
-                usable_len = total_samples - cursor
-                voice_track[cursor:] = clip[:usable_len]
-                cursor = total_samples # Done
-            else:
-                voice_track[cursor:end] = clip
-                # Add a tiny random breath gap (0.1s to 0.4s) between sentences
-                gap = int(random.uniform(0.1, 0.4) * sample_rate)
-                cursor = end + gap
-
-        # Add this voice to the main room mix
-        final_mix += voice_track
-        print(f" -> Voice Layer {voice_idx + 1} added.")
+    output_int16 = mix_babble(loaded_audio_clips, sample_rate, duration_seconds, n_voices, seed=seed)
+
+    # 6. Save as 16-bit WAV
+    wav_io.write(output_file, sample_rate, output_int16)
+
+    print(f"Success! Babble track saved to:\n{output_file}")
+    print("IMPORTANT: Now run 'python3 normalize_safe.py' to match the calibration level.")
+
+# Placement schedule: one row per sentence placed on the timeline
+SCHEDULE_DTYPE = np.dtype([
+    ("voice", np.int32),    # Talker the sentence belongs to
+    ("clip", np.int32),     # Index into the loaded clip list
+    ("offset", np.int64),   # Start sample in the output track
+    ("length", np.int64),   # Samples actually used (cropped at the end)
+    ("gap", np.int64),      # Breath gap after the sentence
+])
+
+def plan_babble_schedule(clip_lengths, total_samples, n_voices, sample_rate, rng, start_offsets=None):
+    """Compute every voice's sentence placements up front as arrays.
+
+    start_offsets (one per voice) continues existing voices from a cursor
+    instead of starting them after a random delay.
+    """
+    clip_lengths = np.asarray(clip_lengths, dtype=np.int64)
+    min_gap = int(0.1 * sample_rate)
+
+    # Each placement advances the cursor by at least (shortest clip + 0.1s),
+    # so this many draws per voice is always enough to reach the end
+    max_per_voice = int(total_samples // (clip_lengths.min() + min_gap)) + 2
+
+    # Start the first sentence at a random offset so voices don't start in unison
+    if start_offsets is None:
+        start_delay = (rng.uniform(0, 2.0, size=(n_voices, 1)) * sample_rate).astype(np.int64)
+    else:
+        start_delay = np.asarray(start_offsets, dtype=np.int64).reshape(n_voices, 1)
+
+    # Pick random sentences and tiny random breath gaps (0.1s to 0.4s)
+    clips = rng.integers(0, len(clip_lengths), size=(n_voices, max_per_voice))
+    gaps = (rng.uniform(0.1, 0.4, size=(n_voices, max_per_voice)) * sample_rate).astype(np.int64)
+
+    steps = clip_lengths[clips] + gaps
+    offsets = start_delay + np.cumsum(steps, axis=1) - steps
+    keep = offsets < total_samples
+
+    voices = np.broadcast_to(np.arange(n_voices)[:, None], clips.shape)
+    schedule = np.empty(int(keep.sum()), dtype=SCHEDULE_DTYPE)
+    schedule["voice"] = voices[keep]
+    schedule["clip"] = clips[keep]
+    schedule["offset"] = offsets[keep]
+    # Crop if it goes past the end
+    schedule["length"] = np.minimum(clip_lengths[clips[keep]], total_samples - offsets[keep])
+    schedule["gap"] = gaps[keep]
+    return schedule
+
+@instrumentation.hot
+def render_babble(clips, schedule, total_samples, out=None):
+    """Accumulate scheduled clips straight into one float buffer (WORK_DTYPE)"""
+    if out is None:
+        out = np.zeros(total_samples, dtype=sample_format.WORK_DTYPE)
+    for clip_idx, offset, length in zip(schedule["clip"], schedule["offset"], schedule["length"]):
+        out[offset:offset + length] += clips[clip_idx][:length]
+    return out
+
+def mix_babble(loaded_audio_clips, sample_rate, duration_seconds=DURATION_SECONDS, n_voices=N_VOICES, seed=SEED):
+    """Layer float clips into an n-talker babble track (returns int16)"""
+    # 3. Plan the whole timeline (The "Room") before touching any audio
+    total_samples = int(sample_rate * duration_seconds)
+    rng = np.random.default_rng(seed)
+    clips = [np.asarray(clip, dtype=sample_format.WORK_DTYPE) for clip in loaded_audio_clips]
+    schedule = plan_babble_schedule([len(c) for c in clips], total_samples, n_voices, sample_rate, rng)
+
+    print(f"Generating {n_voices}-talker babble track ({duration_seconds}s, {len(schedule)} sentences)...")
+
+    # 4. Layer the voices: memory is one output buffer, whatever the voice count
+    final_mix = render_babble(clips, schedule, total_samples)
 
     # 5. Normalize the Crowd (Preliminary)
     # This prevents the raw file from being distorted before the final safety pass
     print("Performing preliminary mix normalization...")
-    max_val = np.max(np.abs(final_mix))
+    # (max/min instead of abs() so no second full-length buffer is allocated)
+    max_val = max(final_mix.max(), -final_mix.min())
+    scale = 32767.0
     if max_val > 0:
         # Scale to peak at 90% (-1 dB)
-        final_mix = final_mix / max_val * 0.9
-
-    # 6. Save as 16-bit WAV
-    output_int16 = (final_mix * 32767).astype(np.int16)
-    wavfile.write(OUTPUT_FILE, sample_rate, output_int16)
+        scale *= 0.9 / max_val
 
-    print(f"Success! Babble track saved to:\n{OUTPUT_FILE}")
-    print("IMPORTANT: Now run 'python3 normalize_safe.py' to match the calibration level.")
+    final_mix *= scale
+    # The only rounding step: dither continues the seeded stream, so the track stays reproducible
+    return sample_format.quantize(final_mix, np.int16, rng)
 
 if __name__ == "__main__":
-    create_custom_babble()
+    parser = argparse.ArgumentParser(description="Mix Form C sentences into an n-talker babble track.")
+    parser.add_argument("--voices", type=int, default=N_VOICES)
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+    create_custom_babble(seed=args.seed, duration_seconds=args.duration, n_voices=args.voices)
@@ -1,6 +1,7 @@
 import os
 import numpy as np
-from scipy.io import wavfile
+import audio_io
+import sample_format
 
 # --- CONFIGURATION ---
 OUTPUT_FOLDER = "audio_output"
@@ -10,31 +11,36 @@ DURATION = 60     # Seconds (Make it long enough to give you time to adjust knob
 SAMPLE_RATE = 44100
 DB_LEVEL = -20.0  # The target level in dBFS
 
-def generate_calibration_tone():
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
-
-    print(f"Generating {FREQUENCY}Hz tone at {DB_LEVEL} dBFS...")
-
+def make_calibration_tone(sample_rate=SAMPLE_RATE, duration=DURATION):
+    """Build the 16-bit calibration sine wave as an array (no disk I/O)"""
     # 1. Calculate the Linear Amplitude from dB
     # Formula: Amplitude = 10 ^ (dB / 20)
     # -20 dB -> 0.1
     amplitude = 10 ** (DB_LEVEL / 20)
 
     # 2. Generate the Time Axis
-    t = np.linspace(0, DURATION, int(SAMPLE_RATE * DURATION), endpoint=False)
+    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
 
     # 3. Generate the Sine Wave
     # y = A * sin(2 * pi * f * t)
     audio = amplitude * np.sin(2 * np.pi * FREQUENCY * t)
 
     # 4. Convert to 16-bit PCM (Standard WAV format)
-    # We multiply the -1.0 to 1.0 float data by the max 16-bit integer (32767)
-    audio_int16 = (audio * 32767).astype(np.int16)
+    # We multiply the -1.0 to 1.0 float data by the max 16-bit integer (32767),
+    # then round with TPDF dither (sample_format.py) instead of truncating
+    audio = (audio * 32767).astype(sample_format.WORK_DTYPE)
+    return sample_format.quantize(audio, np.int16, sample_format.dither_rng(OUTPUT_FILE))
+
+def generate_calibration_tone(output_folder=OUTPUT_FOLDER, wav_io=audio_io):
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    print(f"Generating {FREQUENCY}Hz tone at {DB_LEVEL} dBFS...")
+    audio_int16 = make_calibration_tone()
 
     # 5. Save the file
-    filepath = os.path.join(OUTPUT_FOLDER, OUTPUT_FILE)
-    wavfile.write(filepath, SAMPLE_RATE, audio_int16)
+    filepath = os.path.join(output_folder, OUTPUT_FILE)
+    wav_io.write(filepath, SAMPLE_RATE, audio_int16)
 
     print(f"Success! Saved calibration tone to: {filepath}")
 
@@ -1,78 +1,164 @@
 import os
 import glob
+import wave
+import argparse
 import numpy as np
-from scipy.io import wavfile
+import audio_io
+import sample_format
+import instrumentation
+from build_manifest import BuildManifest
 from scipy import signal
+from scipy import fft as sp_fft
 
 # CONFIGURATION
 INPUT_FOLDER = "audio_output/Form A/wav"
 OUTPUT_FILE = "audio_output/speech_shaped_noise.wav"
 DURATION_SECONDS = 300  # How long the noise loop should be (5 minutes)
 
-def create_speech_shaped_noise():
-    print("Reading WAV files to analyze spectrum...")
+N_FFT = 4096            # Welch segment length for the LTASS estimate
+FILTER_TAPS = 1001      # FIR length of the speech-shaping filter
+BLOCK_SECONDS = 10      # Noise is generated, filtered and written this much at a time
+OUTPUT_DB_LEVEL = -20.0 # RMS of the written noise in dBFS when no calibration file is given
+SEED = 0                # Same seed + parameters + sources = same noise (None: fresh random noise)
 
-    # 1. Load all WAVs and concatenate them into one giant array
-    wav_files = glob.glob(os.path.join(INPUT_FOLDER, "swir_*.wav"))
-    if not wav_files:
-        print("No WAV files found! Run generate.py first.")
-        return
+class RunningWelch:
+    """Long-Term Average Speech Spectrum accumulated one clip at a time.
 
-    all_samples = []
-    sample_rate = 0
+    Each clip's Welch estimate is weighted by its segment count, which matches
+    a Welch average over the concatenated corpus without building it.
+    """
 
-    for wf in wav_files:
-        sr, audio = wavfile.read(wf)
-        sample_rate = sr
+    def __init__(self, sample_rate, nperseg=N_FFT):
+        self.sample_rate = sample_rate
+        self.nperseg = nperseg
+        self.freqs = None
+        self.total = None
+        self.segments = 0
+
+    def add(self, audio):
         # If stereo, take just one channel, otherwise take as is
         if len(audio.shape) > 1:
-            all_samples.append(audio[:, 0])
-        else:
-            all_samples.append(audio)
-
-    # Combine into one long signal
-    full_signal = np.concatenate(all_samples)
-
-    # 2. Normalize
-    full_signal = full_signal / np.max(np.abs(full_signal))
+            audio = audio[:, 0]
+        if len(audio) < self.nperseg:
+            return
+
+        f, pxx = signal.welch(audio.astype(np.float32), fs=self.sample_rate, nperseg=self.nperseg)
+        count = 1 + (len(audio) - self.nperseg) // (self.nperseg // 2)
+        if self.total is None:
+            self.freqs, self.total = f, np.zeros_like(pxx, dtype=np.float64)
+        self.total += pxx * count
+        self.segments += count
+
+    def average(self):
+        if not self.segments:
+            raise ValueError(f"No clip is longer than {self.nperseg} samples")
+        return self.freqs, self.total / self.segments
+
+def design_ssn_filter(freqs, pxx, sample_rate, taps=FILTER_TAPS):
+    """FIR whose magnitude response follows the LTASS"""
+    # We interpolate the spectrum to create a filter kernel
+    return signal.firwin2(taps, freqs, np.sqrt(pxx), fs=sample_rate)
 
-    print("Calculating Long-Term Average Speech Spectrum (LTASS)...")
+@instrumentation.hot
+def stream_filtered_noise(b, n_samples, block_size, rng):
+    """Yield speech-shaped noise blocks via FFT overlap-add (same output as lfilter(b, 1, noise))"""
+    nfft = sp_fft.next_fast_len(block_size + len(b) - 1)
+    b_spec = sp_fft.rfft(b.astype(np.float32), nfft)
+    tail = np.zeros(len(b) - 1, dtype=np.float32)
 
-    # 3. Create a filter that matches this spectrum
-    # We use a Linear Predictive Coding (LPC) method (simplified here via frequency envelope)
-    # Actually, the easiest way to make SSN is to filter White Noise with the signal's spectral envelope.
+    produced = 0
+    while produced < n_samples:
+        n = min(block_size, n_samples - produced)
+        white_noise = rng.standard_normal(n, dtype=np.float32)
 
-    # Generate white noise for the desired duration
-    num_samples_out = sample_rate * DURATION_SECONDS
-    white_noise = np.random.randn(num_samples_out)
+        y = sp_fft.irfft(sp_fft.rfft(white_noise, nfft) * b_spec, nfft)[:n + len(b) - 1]
+        y[:len(tail)] += tail
+        tail = y[n:].copy()
 
-    # Get the spectral shape (order 50 filter is usually sufficient for speech)
-    # We use LPC (Linear Prediction) to extract the spectral envelope
-    # NOTE: "lpc" isn't in standard scipy, so we use a standard signal processing trick:
-    # Filter white noise to match the magnitude spectrum of the speech.
+        produced += n
+        yield y[:n]
 
-    # Calculate FFT of the speech
-    n_fft = 4096
-    f, Pxx_den = signal.welch(full_signal, fs=sample_rate, nperseg=n_fft)
+def create_speech_shaped_noise(input_folder=INPUT_FOLDER, output_file=OUTPUT_FILE, wav_io=audio_io,
+                               duration_seconds=DURATION_SECONDS, seed=SEED, calibration_file=None):
+    print("Reading WAV files to analyze spectrum...")
 
-    # Create a filter design from this spectrum
-    # (A simple FIR filter method)
-    # We interpolate the spectrum to create a filter kernel
-    b = signal.firwin2(1001, f, np.sqrt(Pxx_den), fs=sample_rate)
+    # 1. Stream the WAVs through a running LTASS estimate (nothing is concatenated)
+    wav_files = sorted(glob.glob(os.path.join(input_folder, "swir_*.wav")))
+    if not wav_files:
+        print("No WAV files found! Run generate.py first.")
+        return
 
-    # 4. Apply this filter to the white noise
-    print("Filtering white noise to match speech spectrum...")
-    ssn_audio = signal.lfilter(b, 1, white_noise)
+    ltass = None
+    for wf in wav_files:
+        sr, audio = wav_io.read(wf)
+        if ltass is None:
+            ltass = RunningWelch(sr)
+        ltass.add(audio)
 
-    # 5. Normalize volume to be safe (peak at -1dB)
-    ssn_audio = ssn_audio / np.max(np.abs(ssn_audio)) * 0.9
+    print("Calculating Long-Term Average Speech Spectrum (LTASS)...")
+    sample_rate = ltass.sample_rate
+    freqs, pxx = ltass.average()
 
-    # Convert to 16-bit PCM for writing
-    ssn_int16 = (ssn_audio * 32767).astype(np.int16)
+    # 2. Create a filter that matches this spectrum
+    # The easiest way to make SSN is to filter White Noise with the signal's spectral envelope.
+    b = design_ssn_filter(freqs, pxx, sample_rate)
 
-    # 6. Save
-    wavfile.write(OUTPUT_FILE, sample_rate, ssn_int16)
-    print(f"Success! Created {OUTPUT_FILE} ({DURATION_SECONDS}s loop)")
+    # 3. Measuring pass: filter white noise block by block for its RMS and peak only
+    print("Filtering white noise to match speech spectrum...")
+    num_samples_out = int(sample_rate * duration_seconds)
+    block_size = int(sample_rate * BLOCK_SECONDS)
+    # Both passes draw from generators seeded by this one sequence, so they see the same noise
+    # (also with seed=None, whose entropy is drawn once here)
+    seed_seq = np.random.SeedSequence(seed)
+    sum_squares, peak = 0.0, 0.0
+    for block in stream_filtered_noise(b, num_samples_out, block_size, np.random.default_rng(seed_seq)):
+        sum_squares += float(np.dot(block, block))
+        peak = max(peak, float(block.max()), float(-block.min()))
+
+    # 4. Exact output level: the calibration RMS if given (so normalize_safe.py
+    # has nothing left to do), else OUTPUT_DB_LEVEL
+    rms = np.sqrt(sum_squares / max(num_samples_out, 1))
+    manifest = None
+    if calibration_file and os.path.exists(calibration_file):
+        manifest = BuildManifest(os.path.dirname(calibration_file))
+        target_rms = manifest.measure(calibration_file, wav_io)["rms"]
+    else:
+        target_rms = 10 ** (OUTPUT_DB_LEVEL / 20) * 32767
+    gain = target_rms / rms if rms else 0.0
+    limit = sample_format.MAX_ALLOWED / (peak * gain) if peak * gain else 1.0
+    if limit < 1.0:
+        print(f"Warning: peaks limited the level by {20 * np.log10(limit):.2f} dB.")
+        gain *= limit
+
+    # 5. Writing pass: the same blocks again, with the one quantization (gain, TPDF dither,
+    # 16-bit) applied as they stream out; memory stays one block whatever the duration
+    dither = sample_format.dither_rng(os.path.basename(output_file))
+    tmp_file = output_file + ".tmp"
+    try:
+        with wave.open(tmp_file, 'wb') as out:
+            out.setnchannels(1)
+            out.setsampwidth(2)
+            out.setframerate(sample_rate)
+            for block in stream_filtered_noise(b, num_samples_out, block_size, np.random.default_rng(seed_seq)):
+                block *= sample_format.WORK_DTYPE(gain)
+                out.writeframes(sample_format.quantize(block, '<i2', dither).tobytes())
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    if manifest is not None:
+        sr, audio = audio_io.read(output_file)
+        manifest.record(output_file, sr, audio, gain=float(gain), target_rms=float(target_rms))
+        manifest.save()
+    print(f"Success! Created {output_file} ({duration_seconds}s loop)")
 
 if __name__ == "__main__":
-    create_speech_shaped_noise()
+    parser = argparse.ArgumentParser(description="Create speech-shaped noise from the Form A sentences.")
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS, help="seconds (hours are fine)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--calibration", default=None, help="write straight at this calibration tone's RMS")
+    args = parser.parse_args()
+    create_speech_shaped_noise(output_file=args.output, duration_seconds=args.duration, seed=args.seed,
+                               calibration_file=args.calibration)
@@ -0,0 +1,168 @@
+import os
+import json
+import math
+import argparse
+import numpy as np
+import audio_io
+from build_manifest import BuildManifest, file_hash
+
+# Optional FLAC encoder (pip install soundfile). Without it, chunks are
+# written as plain 16-bit WAV: still independently decodable, just not smaller.
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+CALIBRATION_FILE = "calibration_1khz_neg20db.wav"
+NOISE_FILES = ["babble_noise.wav", "speech_shaped_noise.wav"]
+CHUNK_FOLDER = "noise_chunks"   # Inside BASE_PATH, one sub-folder per noise bed
+INDEX_FILE = "index.json"       # Inside each bed's folder
+
+CHUNK_SECONDS = 5.0             # Playback can start after one chunk
+MATCH_DB = 0.5                  # Chunks within this of the bed level are listed as start points
+TOLERANCE_DB = 0.1              # Same tolerance as verify_audio_standards.py
+
+def to_db(rms):
+    if rms == 0: return -float('inf')
+    return 20 * math.log10(rms / 32768.0)
+
+def chunk_codec():
+    return "flac" if soundfile is not None else "wav"
+
+def write_chunk(path, sample_rate, block):
+    if soundfile is not None:
+        soundfile.write(path, block, sample_rate, format="FLAC", subtype="PCM_16")
+    else:
+        audio_io.write(path, sample_rate, block)
+
+def read_chunk(path):
+    if path.endswith(".flac"):
+        block, sample_rate = soundfile.read(path, dtype="int16")
+        return sample_rate, block
+    return audio_io.read(path)
+
+def export_chunks(noise_file, out_folder, chunk_seconds=CHUNK_SECONDS):
+    """Split a noise bed into independently decodable chunks plus a seek index"""
+    sample_rate, audio = audio_io.read(noise_file)
+    if audio.ndim > 1:
+        audio = audio[:, 0]
+    if audio.dtype != np.int16:
+        raise ValueError(f"{noise_file}: expected 16-bit PCM, got {audio.dtype}")
+
+    os.makedirs(out_folder, exist_ok=True)
+    codec = chunk_codec()
+    chunk_frames = int(chunk_seconds * sample_rate)
+    bed_rms, bed_peak = audio_io.level_stats(audio)
+
+    chunks = []
+    for i, start in enumerate(range(0, len(audio), chunk_frames)):
+        block = np.asarray(audio[start:start + chunk_frames])
+        name = f"chunk_{i:04d}.{codec}"
+        path = os.path.join(out_folder, name)
+        write_chunk(path, sample_rate, block)
+
+        rms, peak = audio_io.level_stats(block)
+        chunks.append({
+            "file": name,
+            "start": start / sample_rate,
+            "frames": int(len(block)),
+            "bytes": os.path.getsize(path),
+            "rms": rms,
+            "dbfs": to_db(rms),
+            "peak": peak,
+        })
+
+    # Full chunks whose level is close to the whole bed: safe random start points
+    matched = [i for i, c in enumerate(chunks)
+               if c["frames"] == chunk_frames and abs(c["dbfs"] - to_db(bed_rms)) <= MATCH_DB]
+
+    # Stale chunks from a longer previous export would otherwise linger
+    names = {c["file"] for c in chunks}
+    for stale in os.listdir(out_folder):
+        if stale.startswith("chunk_") and stale not in names:
+            os.remove(os.path.join(out_folder, stale))
+
+    index = {
+        "version": 1,
+        "source": os.path.basename(noise_file),
+        "source_sha256": file_hash(noise_file),
+        "codec": codec,
+        "sample_rate": int(sample_rate),
+        "chunk_frames": chunk_frames,
+        "length": int(len(audio)),
+        "rms": bed_rms,
+        "dbfs": to_db(bed_rms),
+        "peak": bed_peak,
+        "matched_starts": matched,
+        "chunks": chunks,
+    }
+    with open(os.path.join(out_folder, INDEX_FILE), 'w') as f:
+        json.dump(index, f, indent=1)
+    return index
+
+def verify_chunks(out_folder, noise_file, ref_rms):
+    """Decode every chunk back and compare with the source bed and the calibration level"""
+    with open(os.path.join(out_folder, INDEX_FILE), 'r') as f:
+        index = json.load(f)
+    sample_rate, source = audio_io.read(noise_file)
+    if source.ndim > 1:
+        source = source[:, 0]
+
+    sum_squares = 0.0
+    exact = True
+    for chunk in index["chunks"]:
+        sr, block = read_chunk(os.path.join(out_folder, chunk["file"]))
+        start = int(round(chunk["start"] * sample_rate))
+        exact &= sr == sample_rate and np.array_equal(block, source[start:start + chunk["frames"]])
+        block = block.astype(np.float32)
+        sum_squares += float(np.dot(block, block))
+
+    rms = math.sqrt(sum_squares / index["length"]) if index["length"] else 0.0
+    diff = to_db(rms) - to_db(ref_rms)
+    return exact, to_db(rms), diff
+
+def export_noise_chunks(base=BASE_PATH, noise_files=NOISE_FILES, chunk_seconds=CHUNK_SECONDS):
+    print("--- Noise Bed Chunk Export ---")
+    calibration_file = os.path.join(base, CALIBRATION_FILE)
+    if not os.path.exists(calibration_file):
+        print(f"CRITICAL: Calibration file missing: {calibration_file}")
+        return False
+
+    manifest = BuildManifest(base)
+    ref_rms = manifest.measure(calibration_file, audio_io)["rms"]
+    manifest.save()
+    print(f"Reference (calibration): {to_db(ref_rms):.2f} dB")
+    if soundfile is None:
+        print("Note: soundfile is not installed, chunks are written as WAV (no compression).")
+
+    ok = True
+    for name in noise_files:
+        noise_file = os.path.join(base, name)
+        if not os.path.exists(noise_file):
+            print(f"  {name}: FILE NOT FOUND")
+            ok = False
+            continue
+
+        out_folder = os.path.join(base, CHUNK_FOLDER, os.path.splitext(name)[0])
+        index = export_chunks(noise_file, out_folder, chunk_seconds)
+        exact, db, diff = verify_chunks(out_folder, noise_file, ref_rms)
+        status = "MATCH" if exact and abs(diff) < TOLERANCE_DB else "MISMATCH"
+        ok &= status == "MATCH"
+
+        size = sum(c["bytes"] for c in index["chunks"])
+        print(f"  {name}: {len(index['chunks'])} {index['codec']} chunks, "
+              f"{size / 1e6:.1f} MB (source {os.path.getsize(noise_file) / 1e6:.1f} MB), "
+              f"{len(index['matched_starts'])} level-matched start points")
+        print(f"    Decoded: {db:.2f} dB (Diff: {diff:+.2f} dB, "
+              f"{'bit-exact' if exact else 'NOT bit-exact'}) -> {status}")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export noise beds as compressed chunks with a seek index.")
+    parser.add_argument("--base", default=BASE_PATH)
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS)
+    args = parser.parse_args()
+    export_noise_chunks(base=args.base, chunk_seconds=args.chunk_seconds)
@@ -0,0 +1,226 @@
+import os
+import glob
+import json
+import math
+import shutil
+import argparse
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import signal
+import audio_io
+import sample_format
+import instrumentation
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+RATES = [48000]                 # Extra sample rates to export (44.1 kHz is the source rate)
+EXPORT_FOLDER = "rates"         # Inside BASE_PATH: rates/<rate>/ mirrors the audio_output layout
+INDEX_FILE = "index.json"       # Inside each rate folder
+CALIBRATION_FILE = "calibration_1khz_neg20db.wav"
+BED_FILES = ["speech_shaped_noise.wav", "babble_noise.wav", "babble_noise_spatial.wav"]
+FORMS = ["A", "B", "C", "P"]
+
+# Anti-aliasing filter: scipy's resample_poly design (Kaiser window) made flatter. Its default
+# (beta 5, half-length 10) ripples ~0.005 dB at 1 kHz, more than a calibration export should move
+KAISER_BETA = 8.6
+HALF_LENGTH = 16                # Filter half-length in units of max(up, down) taps
+TOLERANCE_DB = 0.01             # The resampled calibration tone must keep its RMS this closely
+WORKERS = os.cpu_count() or 1
+
+# Filter designs handed to pool workers by the parent, so each rate pair is designed once per run
+_FILTERS = {}
+
+def to_db(rms):
+    if rms == 0: return -float('inf')
+    return 20 * math.log10(rms / 32768.0)
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+@functools.lru_cache(maxsize=None)
+def rate_ratio(source_rate, target_rate):
+    """(up, down) in lowest terms, e.g. 44100 -> 48000 is (160, 147)"""
+    g = math.gcd(int(source_rate), int(target_rate))
+    return int(target_rate) // g, int(source_rate) // g
+
+@functools.lru_cache(maxsize=None)
+def design_filter(source_rate, target_rate):
+    """Polyphase low-pass taps for one rate pair (thousands of taps, so designed once and reused)"""
+    up, down = rate_ratio(source_rate, target_rate)
+    max_rate = max(up, down)
+    taps = 2 * HALF_LENGTH * max_rate + 1
+    return signal.firwin(taps, 1.0 / max_rate, window=('kaiser', KAISER_BETA))
+
+def _init_worker(filters):
+    _FILTERS.update(filters)
+
+def resample(audio, source_rate, target_rate):
+    """Polyphase resampling along the time axis, in float64 sample units"""
+    up, down = rate_ratio(source_rate, target_rate)
+    taps = _FILTERS.get((source_rate, target_rate))
+    if taps is None:
+        taps = design_filter(source_rate, target_rate)
+    # resample_poly copies `window` before scaling it by `up`, so the cached taps stay intact
+    return signal.resample_poly(sample_format.to_work(audio).astype(np.float64), up, down, axis=0, window=taps)
+
+def export_file(job):
+    """Resample one WAV to one rate (runs in a worker); returns its index row"""
+    source, out_path, rel_path, target_rate = job
+    sample_rate, audio = audio_io.read(source)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    rms_in = audio_io.level_stats(audio)[0]
+    clipped = 0
+    try:
+        if sample_rate == target_rate:
+            shutil.copyfile(source, tmp_path)
+            rms_out = rms_in
+        else:
+            out = resample(audio, sample_rate, target_rate)
+            if audio.dtype.kind != 'f':
+                info = np.iinfo(audio.dtype)
+                clipped = int(np.count_nonzero((out > info.max) | (out < info.min + 1)))
+            rng = sample_format.dither_rng(f"{target_rate}/{rel_path}")
+            out = sample_format.quantize(out.astype(sample_format.WORK_DTYPE), audio.dtype, rng)
+            audio_io.write(tmp_path, target_rate, out)
+            rms_out = audio_io.level_stats(out)[0]
+        os.replace(tmp_path, out_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {"file": rel_path.replace(os.sep, "/"), "source": _stamp(source), "source_rate": int(sample_rate),
+            "rms_in": rms_in, "rms_out": rms_out, "diff_db": to_db(rms_out) - to_db(rms_in), "clipped": clipped}
+
+def _export_or_error(job):
+    """export_file, with a failure returned as {"error": message} so one bad file cannot stop the pool"""
+    try:
+        return export_file(job)
+    except Exception as e:
+        return {"error": str(e)}
+
+def find_sources(base, forms=FORMS):
+    """(path, path relative to base) of the calibration tone, the noise beds and every sentence"""
+    names = [CALIBRATION_FILE] + BED_FILES
+    names += [os.path.relpath(path, base) for form in forms
+              for path in sorted(glob.glob(os.path.join(base, f"Form {form}", "wav", "swir_*.wav")))]
+    return [(os.path.join(base, name), name) for name in names if os.path.exists(os.path.join(base, name))]
+
+def load_index(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return None
+
+def run_jobs(jobs, filters, workers=WORKERS):
+    """Yield (job, export_file row) from a process pool, largest files first so the pool ends evenly.
+
+    A file that fails yields {"error": message} instead of stopping the export.
+    """
+    jobs = sorted(jobs, key=lambda job: os.path.getsize(job[0]), reverse=True)
+    if workers <= 1 or len(jobs) < 2:
+        _init_worker(filters)
+        for job in jobs:
+            yield job, _export_or_error(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(filters,)) as pool:
+        yield from zip(jobs, pool.map(_export_or_error, jobs, chunksize=1))
+
+def export_rates(base=BASE_PATH, rates=RATES, forms=FORMS, workers=WORKERS, force=False):
+    print("--- Multi-Rate Export ---")
+    sources = find_sources(base, forms)
+    if not any(name == CALIBRATION_FILE for _, name in sources):
+        print(f"CRITICAL: Calibration file missing: {os.path.join(base, CALIBRATION_FILE)}")
+        return False
+
+    settings = {"kaiser_beta": KAISER_BETA, "half_length": HALF_LENGTH}
+    source_rates = {}
+    for path, _ in sources:
+        try:
+            source_rates[path] = audio_io.read_wav_info(path).sample_rate
+        except Exception as e:
+            print(f"Error on {path}: {e}")
+    sources = [(path, name) for path, name in sources if path in source_rates]
+
+    # 1. Per rate, only files whose source changed since the last export (anything in the
+    # filter design invalidates the whole rate)
+    jobs, indexes = [], {}
+    for rate in rates:
+        rate_folder = os.path.join(base, EXPORT_FOLDER, str(rate))
+        previous = load_index(os.path.join(rate_folder, INDEX_FILE))
+        done = {}
+        if previous and not force and previous.get("settings") == settings:
+            done = previous["files"]
+        indexes[rate] = done
+        for path, name in sources:
+            row = done.get(name.replace(os.sep, "/"))
+            out_path = os.path.join(rate_folder, name)
+            if row is None or row["source"] != _stamp(path) or not os.path.exists(out_path):
+                jobs.append((path, out_path, name, rate))
+    print(f"{len(sources)} files x {len(rates)} rate(s), {len(jobs)} to export.")
+
+    # 2. One filter design per rate pair, shared by every worker
+    filters = {}
+    for path, _, _, rate in jobs:
+        pair = (source_rates[path], rate)
+        if pair[0] != pair[1] and pair not in filters:
+            filters[pair] = design_filter(*pair)
+    for (source_rate, rate), taps in sorted(filters.items()):
+        up, down = rate_ratio(source_rate, rate)
+        print(f"  {source_rate} -> {rate} Hz: x{up}/{down}, {len(taps)}-tap filter")
+
+    instrumentation.set_total(len(jobs), "rates")
+    failed = 0
+    for job, row in run_jobs(jobs, filters, workers):
+        instrumentation.advance()
+        if "error" in row:
+            print(f"Error on {job[0]} at {job[3]} Hz: {row['error']}")
+            indexes[job[3]].pop(job[2].replace(os.sep, "/"), None)
+            failed += 1
+            continue
+        indexes[job[3]][row["file"]] = row
+        if row["clipped"]:
+            print(f"  Warning: {row['file']} at {job[3]} Hz: {row['clipped']} samples clipped")
+
+    # 3. Indexes, and the calibration level check per rate
+    ok = True
+    names = {name.replace(os.sep, "/") for _, name in sources}
+    for rate in rates:
+        rate_folder = os.path.join(base, EXPORT_FOLDER, str(rate))
+        files = {name: row for name, row in indexes[rate].items() if name in names}
+        os.makedirs(rate_folder, exist_ok=True)
+        index_path = os.path.join(rate_folder, INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": 1, "sample_rate": int(rate), "settings": settings, "files": files}, f, indent=1)
+        os.replace(tmp_path, index_path)
+
+        calibration = files.get(CALIBRATION_FILE)
+        if calibration is None:
+            print(f"  {rate} Hz: calibration tone could not be exported -> MISMATCH")
+            ok = False
+            continue
+        status = "MATCH" if abs(calibration["diff_db"]) <= TOLERANCE_DB else "MISMATCH"
+        ok &= status == "MATCH"
+        spread = max(abs(row["diff_db"]) for row in files.values() if math.isfinite(row["diff_db"]))
+        print(f"  {rate} Hz: calibration {to_db(calibration['rms_out']):.3f} dB "
+              f"(Diff: {calibration['diff_db']:+.4f} dB) -> {status}; "
+              f"largest level change over {len(files)} files: {spread:.3f} dB")
+    if failed:
+        print(f"{failed} file(s) could not be exported (see errors above).")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export every sentence, noise bed and the calibration tone "
+                                                 "at other sample rates.")
+    parser.add_argument("--base", default=BASE_PATH)
+    parser.add_argument("--rates", type=int, nargs="+", default=RATES)
+    parser.add_argument("--forms", nargs="+", default=FORMS)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    if not export_rates(base=args.base, rates=args.rates, forms=args.forms, workers=args.workers, force=args.force):
+        raise SystemExit(1)
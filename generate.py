@@ -1,7 +1,15 @@
+import io
 import json
 import os
-import subprocess
-from gtts import gTTS
+import sys
+import time
+import zlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from scipy.io import wavfile
+from audio_decode import decode_to_mono, DECODERS
+import instrumentation
 
 # --- CONFIGURATION ---
 # UNCOMMENT the file you want to process:
@@ -13,62 +21,185 @@ from gtts import gTTS
 DATA_FILE = "babble_sentences.json"
 
 OUTPUT_BASE = "audio_output"
+SAMPLE_RATE = 44100  # Mono 44.1 kHz, as the app expects
+
+# Concurrency: each worker synthesizes and decodes one sentence at a time,
+# so network waits (gTTS) and decoding overlap across workers
+WORKERS = 4
+RETRIES = 2          # Extra attempts per sentence before reporting a failure
+RETRY_DELAY = 1.0    # Seconds, doubled after every failed attempt
+TEXT_INDEX = "sentence_texts.json"  # Inside the output folder: the text each WAV was synthesized from
+
+def gtts_synthesize(text):
+    """Google TTS -> MP3 bytes"""
+    # Imported here so the offline stand-in works without gTTS installed
+    from gtts import gTTS
+    buffer = io.BytesIO()
+    gTTS(text=text, lang='en', tld='com').write_to_fp(buffer)
+    return buffer.getvalue()
+
+def tone_synthesize(text, sample_rate=24000):
+    """Offline stand-in for gTTS: WAV bytes with a tone as long as the text"""
+    # Deterministic pitch per sentence, ~60 ms per character, 0.2 s of silence either side
+    frequency = 200 + zlib.crc32(text.encode()) % 600
+    t = np.arange(int(sample_rate * 0.06 * max(len(text), 1))) / sample_rate
+    tone = 0.3 * np.sin(2 * np.pi * frequency * t)
+    pad = np.zeros(int(sample_rate * 0.2))
+    audio = (np.concatenate([pad, tone, pad]) * 32767).astype(np.int16)
+
+    buffer = io.BytesIO()
+    wavfile.write(buffer, sample_rate, audio)
+    return buffer.getvalue()
+
+SYNTHESIZERS = {
+    "gtts": gtts_synthesize,
+    "tone": tone_synthesize,
+}
+
+def synthesize_to_wav(audio_bytes, wav_path, decoder="auto"):
+    # B. Decode the TTS bytes in memory to 44.1 kHz mono int16
+    # (miniaudio / scipy in-process, ffmpeg over pipes as the fallback)
+    audio = decode_to_mono(audio_bytes, backend=decoder, target_rate=SAMPLE_RATE)
+
+    # C. Write only the final WAV; the rename keeps half-written files from
+    # looking "Already exists" on the next run
+    temp_wav = wav_path + ".part"
+    wavfile.write(temp_wav, SAMPLE_RATE, audio)
+    os.replace(temp_wav, wav_path)
+
+def wav_key(item):
+    """Path of a sentence's WAV relative to the output folder"""
+    return os.path.join(f"Form {item['list']}", "wav", f"swir_{item['id']}.wav")
+
+def load_text_index(output_base):
+    path = os.path.join(output_base, TEXT_INDEX)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_text_index(output_base, index):
+    path = os.path.join(output_base, TEXT_INDEX)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def process_item(item, output_base, synthesize, retries, decoder="auto", synthesized_text=None):
+    """Synthesize + decode one sentence. Returns (id, status, error)
+
+    An existing WAV is kept unless `synthesized_text` (what it was made from,
+    if known) differs from the item's text.
+    """
+    s_id = item['id']
+    text = item['text']
+    form_list = item['list'] # "A", "B", "C" or "P"
+
+    # Create folder structure: audio_output/Form A/wav/
+    folder_path = os.path.join(output_base, f"Form {form_list}", "wav")
+    os.makedirs(folder_path, exist_ok=True)
+
+    # Define filenames
+    wav_filename = f"swir_{s_id}.wav"
+    wav_path = os.path.join(folder_path, wav_filename)
+
+    # Check if already exists (skip to save time/API calls), unless the text was edited
+    if os.path.exists(wav_path) and synthesized_text in (None, text):
+        return s_id, "skipped", None
+
+    error = None
+    for attempt in range(retries + 1):
+        try:
+            # A. Generate the speech audio (MP3 from Google TTS by default)
+            audio_bytes = synthesize(text)
+            synthesize_to_wav(audio_bytes, wav_path, decoder)
+            return s_id, "generated", None
+        except Exception as e:
+            error = e
+            if attempt < retries:
+                time.sleep(RETRY_DELAY * 2 ** attempt)
+
+    return s_id, "failed", error
+
+def generate_items(items, output_base=OUTPUT_BASE, synthesize=gtts_synthesize, workers=WORKERS, retries=RETRIES,
+                   decoder="auto"):
+    """Process sentences on a bounded worker pool. Returns a list of (id, error) failures"""
+    failures = []
+    counts = {"generated": 0, "skipped": 0, "failed": 0}
+    texts = load_text_index(output_base)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(process_item, item, output_base, synthesize, retries, decoder,
+                               texts.get(wav_key(item))): item for item in items}
+        instrumentation.set_total(len(futures), "generate")
+        for future in as_completed(futures):
+            s_id, status, error = future.result()
+            counts[status] += 1
+            instrumentation.advance()
+            if status != "failed":
+                texts[wav_key(futures[future])] = futures[future]['text']
+            if status == "skipped":
+                print(f"Skipping {s_id} (Already exists)")
+            elif status == "generated":
+                print(f"Generated {s_id}")
+            else:
+                print(f"FAILED on {s_id}: {error}")
+                failures.append((s_id, error))
+
+    if items:
+        save_text_index(output_base, texts)
+    print(f"{counts['generated']} generated, {counts['skipped']} skipped, {counts['failed']} failed.")
+    return failures
+
+def load_items(data_files):
+    """Concatenate the sentence lists of several JSON files, skipping missing ones"""
+    items = []
+    for path in data_files:
+        if not os.path.exists(path):
+            print(f"Error: Could not find {path}")
+            continue
+        with open(path, 'r') as f:
+            items.extend(json.load(f))
+    return items
 
-def generate_audio():
+def generate_audio(data_file=DATA_FILE, output_base=OUTPUT_BASE, synthesize=gtts_synthesize, workers=WORKERS):
     # 1. Load the sentence data
-    if not os.path.exists(DATA_FILE):
-        print(f"Error: Could not find {DATA_FILE}")
+    if not os.path.exists(data_file):
+        print(f"Error: Could not find {data_file}")
         return
 
-    with open(DATA_FILE, 'r') as f:
+    with open(data_file, 'r') as f:
         data = json.load(f)
 
-    print(f"Loaded {len(data)} sentences from {DATA_FILE}...")
-
-    # 2. Process each sentence
-    for item in data:
-        s_id = item['id']
-        text = item['text']
-        form_list = item['list'] # "A", "B", or "C"
+    print(f"Loaded {len(data)} sentences from {data_file}...")
 
-        # Create folder structure: audio_output/Form A/wav/
-        folder_path = os.path.join(OUTPUT_BASE, f"Form {form_list}", "wav")
-        os.makedirs(folder_path, exist_ok=True)
-
-        # Define filenames
-        wav_filename = f"swir_{s_id}.wav"
-        wav_path = os.path.join(folder_path, wav_filename)
-
-        # Check if already exists (skip to save time/API calls)
-        if os.path.exists(wav_path):
-            print(f"Skipping {s_id} (Already exists)")
-            continue
-
-        print(f"Generating {s_id}: '{text}'...")
-
-        try:
-            # A. Generate MP3 with Google TTS
-            tts = gTTS(text=text, lang='en', tld='com')
-            temp_mp3 = f"temp_{s_id}.mp3"
-            tts.save(temp_mp3)
-
-            # B. Convert MP3 to WAV using FFmpeg (No pydub required)
-            # Flags: -i (input), -ac 1 (mono), -ar 44100 (44.1kHz), -y (overwrite)
-            # We redirect output to /dev/null to keep the terminal clean
-            subprocess.run(
-                ['ffmpeg', '-i', temp_mp3, '-ac', '1', '-ar', '44100', wav_path, '-y'],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=True
-            )
-
-            # C. Clean up temp file
-            os.remove(temp_mp3)
-
-        except Exception as e:
-            print(f"FAILED on {s_id}: {e}")
+    # 2. Process the sentences on the worker pool
+    failures = generate_items(data, output_base=output_base, synthesize=synthesize, workers=workers)
 
     print("\nGeneration Complete.")
+    if failures:
+        print(f"Failed sentences: {', '.join(str(s_id) for s_id, _ in failures)}")
+    return failures
+
+def main(argv=None, data_file=DATA_FILE):
+    parser = argparse.ArgumentParser(description="Generate sentence WAVs with text-to-speech.")
+    parser.add_argument("data_files", nargs="*", default=[data_file], help="sentence JSON files")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--tts", choices=sorted(SYNTHESIZERS), default="gtts",
+                        help="'tone' writes offline test tones instead of calling Google TTS")
+    parser.add_argument("--decoder", choices=["auto"] + sorted(DECODERS), default="auto",
+                        help="MP3/WAV decoder; 'auto' stays in-process when it can")
+    parser.add_argument("--output", default=OUTPUT_BASE)
+    args = parser.parse_args(argv)
+
+    # All forms share one pool, so A, B, C and P together scale with --workers
+    items = load_items(args.data_files)
+    print(f"Loaded {len(items)} sentences from {', '.join(args.data_files)}...")
+    failures = generate_items(items, output_base=args.output,
+                              synthesize=SYNTHESIZERS[args.tts], workers=args.workers,
+                              decoder=args.decoder)
+    print("\nGeneration Complete.")
+    return 1 if failures else 0
 
 if __name__ == "__main__":
-    generate_audio()
+    sys.exit(main())
@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import time
+import atexit
+import signal
+import inspect
+import resource
+import functools
+import threading
+from collections import Counter
+
+# --- CONFIGURATION ---
+# All three are off unless switched on here, by swir_build.py flags or by the environment
+METRICS_FILE = os.environ.get("SWIR_METRICS")         # JSON lines, one per finished stage
+PROGRESS = os.environ.get("SWIR_PROGRESS") == "1"      # Live progress bar on stderr
+PROFILE = os.environ.get("SWIR_PROFILE") == "1"        # Sample the functions marked @hot
+PROFILE_INTERVAL = 0.005                               # Seconds of CPU time between samples
+PROFILE_TOP = 15                                       # Lines kept per stage record
+BAR_WIDTH = 30
+
+_current = []              # Stack of running Stage records
+_samples = Counter()       # (hot function, file:line function) -> samples
+_active = []               # Names of @hot functions currently on the (main thread) stack
+_implicit = None           # Whole-process stage of a script run on its own (see _ensure_stage)
+
+def configure(metrics_file=None, progress=None, profile=None):
+    global METRICS_FILE, PROGRESS, PROFILE
+    if metrics_file is not None:
+        METRICS_FILE = metrics_file
+    if progress is not None:
+        PROGRESS = progress
+    if profile is not None:
+        PROFILE = profile
+
+def _io_bytes():
+    """(read, written) bytes of this process so far: /proc on Linux, block counts elsewhere"""
+    try:
+        with open("/proc/self/io", 'r') as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_inblock * 512, usage.ru_oublock * 512
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+def emit(record):
+    """Append one JSON line to METRICS_FILE (no-op when unset)"""
+    if not METRICS_FILE:
+        return
+    with open(METRICS_FILE, 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+class Stage:
+    """Cost of one unit of work: wall/CPU time, I/O bytes, peak RSS and items per second.
+
+    Used as `with instrumentation.stage("normalize", total=n) as st:` and
+    advanced with st.advance(); nested stages are recorded separately. A script
+    run on its own gets one implicit stage for the whole process (see set_total).
+    """
+
+    def __init__(self, name, total=None, unit="files"):
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.status = "ok"
+        self.extra = {}
+        self._last_draw = 0.0
+
+    def __enter__(self):
+        self.started = time.time()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.io = _io_bytes()
+        self._samples_before = Counter(_samples)
+        _current.append(self)
+        return self
+
+    def backdate(self, started, wall, cpu, io):
+        """Count from an earlier point (e.g. interpreter start) instead of __enter__"""
+        self.started, self.wall, self.cpu, self.io = started, wall, cpu, io
+
+    def advance(self, n=1):
+        self.done += n
+        if PROGRESS:
+            self._draw()
+
+    def _draw(self, final=False):
+        now = time.perf_counter()
+        if not final and now - self._last_draw < 0.1:
+            return
+        self._last_draw = now
+        elapsed = now - self.wall
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        if self.total:
+            filled = int(BAR_WIDTH * min(self.done / self.total, 1.0))
+            bar = "#" * filled + " " * (BAR_WIDTH - filled)
+            text = f"[{bar}] {self.done}/{self.total} {self.unit}"
+        else:
+            text = f"{self.done} {self.unit}"
+        sys.stderr.write(f"\r{self.name}: {text}, {rate:.1f}/s, {elapsed:.1f}s ")
+        if final:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        read, written = _io_bytes()
+        _current.remove(self)
+        if exc_type is not None:
+            self.status = "error"
+        if PROGRESS and self.done:
+            self._draw(final=True)
+
+        record = {
+            "event": "stage",
+            "stage": self.name,
+            "status": self.status,
+            "started": self.started,
+            "wall_s": round(wall, 4),
+            "cpu_s": round(cpu, 4),
+            "read_bytes": read - self.io[0],
+            "written_bytes": written - self.io[1],
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "children_peak_rss_mb": round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            self.unit: self.done,
+            f"{self.unit}_per_s": round(self.done / wall, 2) if wall > 0 else None,
+        }
+        if PROFILE:
+            samples = Counter(_samples)
+            samples.subtract(self._samples_before)
+            record["profile"] = [
+                {"hot": hot, "where": where, "samples": count,
+                 "seconds": round(count * PROFILE_INTERVAL, 3)}
+                for (hot, where), count in samples.most_common(PROFILE_TOP) if count > 0
+            ]
+        record.update(self.extra)
+        emit(record)
+        return False
+
+def stage(name, total=None, unit="files"):
+    return Stage(name, total, unit)
+
+# Process start, so a script's implicit stage covers its setup as well
+_START = (time.time(), time.perf_counter(), time.process_time(), _io_bytes())
+
+def _ensure_stage(name):
+    """Scripts run on their own (their __main__, or an entry function called directly) have no
+    stage open: set_total opens one under the caller's name for the rest of the process,
+    recorded at exit. Pool workers never open one."""
+    global _implicit
+    if _current or _implicit is not None:
+        return
+    import multiprocessing
+    if multiprocessing.parent_process() is not None:
+        return
+    _implicit = Stage(name).__enter__()
+    _implicit.backdate(*_START)
+    _implicit.pid = os.getpid()
+    atexit.register(_finish_implicit)
+
+def _finish_implicit():
+    global _implicit
+    if _implicit is not None and _implicit.pid == os.getpid() and _implicit in _current:
+        _implicit.__exit__(None, None, None)
+    _implicit = None
+
+def advance(n=1):
+    """Count finished items on every running stage"""
+    for running in _current:
+        running.advance(n)
+
+def set_total(total, name):
+    """Give the innermost running stage a total, so the progress bar can fill.
+
+    When no stage is running (a script run on its own) this opens one called `name`.
+    """
+    _ensure_stage(name)
+    if _current:
+        _current[-1].total = (_current[-1].total or 0) + total
+
+# --- Sampling profiler (opt-in) ---
+
+def _sample(signum, frame):
+    if not _active or frame is None:
+        return
+    code = frame.f_code
+    where = f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+    _samples[(_active[-1], where)] += 1
+
+def _start_sampling(name):
+    _active.append(name)
+    if len(_active) == 1:
+        signal.signal(signal.SIGPROF, _sample)
+        signal.setitimer(signal.ITIMER_PROF, PROFILE_INTERVAL, PROFILE_INTERVAL)
+
+def _stop_sampling():
+    _active.pop()
+    if not _active:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+
+def _can_sample():
+    # Signal handlers only run on the main thread (thread/process pool workers are skipped)
+    return PROFILE and threading.current_thread() is threading.main_thread() and hasattr(signal, "setitimer")
+
+def hot(fn):
+    """Mark a hot function: when PROFILE is on, CPU samples taken inside it are attributed to it.
+
+    Generators are sampled only while they run, not while suspended.
+    """
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def gen_wrapper(*args, **kwargs):
+            inner = fn(*args, **kwargs)
+            if not _can_sample():
+                yield from inner
+                return
+            while True:
+                _start_sampling(name)
+                try:
+                    item = next(inner)
+                except StopIteration:
+                    return
+                finally:
+                    _stop_sampling()
+                yield item
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _can_sample():
+            return fn(*args, **kwargs)
+        _start_sampling(name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _stop_sampling()
+    return wrapper
@@ -0,0 +1,183 @@
+import math
+import functools
+import numpy as np
+from scipy import signal
+from scipy.ndimage import maximum_filter1d
+import audio_io
+import sample_format
+import instrumentation
+
+# --- CONFIGURATION ---
+MODES = ["rms", "lufs", "speech"]   # Plain RMS, BS.1770 integrated loudness, P.56 active speech level
+
+# ITU-R BS.1770-4 gating
+BLOCK_SECONDS = 0.4         # Gating block
+STEP_SECONDS = 0.1          # Block hop (75% overlap)
+ABSOLUTE_GATE = -70.0       # LKFS
+RELATIVE_GATE = -10.0       # LU below the absolute-gated loudness
+LUFS_OFFSET = -0.691        # Cancels the K-filter gain at 1 kHz
+
+# ITU-T P.56 method B
+ENVELOPE_SECONDS = 0.03     # Time constant of the two-pole envelope smoother
+HANGOVER_SECONDS = 0.2      # Speech counts as active this long after the envelope drops
+MARGIN_DB = 15.9            # Active level sits this far above the threshold
+N_THRESHOLDS = 16           # Thresholds at envelope peak * 2**-15 ... 2**0
+
+DENORMAL_GUARD = 1e-12      # Offset (x full scale, -240 dB) that keeps IIR tails in silence out of subnormals
+
+def level_key(mode):
+    """Manifest/row key holding a file's level in `mode` (plain RMS is the existing "rms")"""
+    if mode not in MODES:
+        raise ValueError(f"Unknown level mode '{mode}' (choose from {', '.join(MODES)})")
+    return "rms" if mode == "rms" else f"{mode}_level"
+
+LEVEL_KEYS = [level_key(mode) for mode in MODES if mode != "rms"]
+
+def entry_level(entry, mode):
+    return entry[level_key(mode)]
+
+@functools.lru_cache(maxsize=None)
+def k_weighting(sample_rate):
+    """BS.1770 pre-filter (high shelf) and RLB high-pass as second-order sections at any rate.
+
+    Designed from the analog prototype, so 48 kHz gives the coefficients printed in the standard.
+    """
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    a0 = 1 + k / q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, highpass])
+
+def _as_work(samples, full_scale):
+    """(frames, channels) float samples in work units, and the full scale they are relative to"""
+    samples = np.asarray(samples)
+    if full_scale is None:
+        full_scale = audio_io.full_scale(samples.dtype)
+    if samples.dtype.kind != 'f':
+        samples = sample_format.to_work(samples)
+    return samples.reshape(samples.shape[0], int(np.prod(samples.shape[1:]))), full_scale
+
+@instrumentation.hot
+def k_weighted(samples, sample_rate, full_scale):
+    # Digital silence would leave the filter state decaying through subnormal
+    # floats, which are several times slower; the offset is removed by the high-pass
+    guarded = samples + np.float32(DENORMAL_GUARD * full_scale)
+    return signal.sosfilt(k_weighting(sample_rate), guarded, axis=0)
+
+def block_powers(weighted, sample_rate):
+    """Mean square of the K-weighted signal in every 400 ms gating block, summed over channels"""
+    step = int(round(STEP_SECONDS * sample_rate))
+    per_block = int(round(BLOCK_SECONDS / STEP_SECONDS))
+    n_steps = weighted.shape[0] // step
+    if n_steps < per_block:
+        return np.zeros(0)
+
+    # Energy per 100 ms step, then each block is four consecutive steps (cumulative sum)
+    frames = weighted[:n_steps * step].reshape(n_steps, step, -1)
+    cumulative = np.concatenate(([0.0], np.cumsum(np.einsum('ijk,ijk->i', frames, frames))))
+    return (cumulative[per_block:] - cumulative[:-per_block]) / (per_block * step)
+
+def integrated_power(blocks, full_scale):
+    """Gated mean power of the blocks (absolute, then relative gate); 0 if all are gated out"""
+    def loudness(power):
+        return LUFS_OFFSET + 10 * np.log10(np.maximum(power, 1e-30) / full_scale ** 2)
+
+    blocks = blocks[loudness(blocks) > ABSOLUTE_GATE]
+    if blocks.size == 0:
+        return 0.0
+    relative = loudness(blocks.mean()) + RELATIVE_GATE
+    return float(blocks[loudness(blocks) > relative].mean())
+
+def lufs_level(samples, sample_rate, full_scale=None):
+    """BS.1770 integrated loudness as an amplitude in sample units (see to_lufs).
+
+    Clips shorter than one 400 ms block are measured ungated.
+    """
+    samples, full_scale = _as_work(samples, full_scale)
+    # Digital silence is 0, not the DENORMAL_GUARD offset's filter transient
+    if samples.size == 0 or not samples.any():
+        return 0.0
+    weighted = k_weighted(samples, sample_rate, full_scale)
+    blocks = block_powers(weighted, sample_rate)
+    if blocks.size == 0:
+        return math.sqrt(float(np.mean(weighted ** 2, axis=0).sum()))
+    return math.sqrt(integrated_power(blocks, full_scale))
+
+def to_lufs(level, full_scale=32768.0):
+    if level == 0: return -float('inf')
+    return LUFS_OFFSET + 20 * math.log10(level / full_scale)
+
+@instrumentation.hot
+def speech_level(samples, sample_rate, full_scale=None):
+    """ITU-T P.56 (method B) active speech level and activity factor: (level in sample units, activity).
+
+    Silence before, between and after words is left out, so a short sentence
+    with long TTS pauses reads the same as the same words spoken back to back.
+    `full_scale` is accepted for symmetry with lufs_level (the thresholds are relative).
+    """
+    samples, full_scale = _as_work(samples, full_scale)
+    n = samples.shape[0]
+    if n == 0:
+        return 0.0, 0.0
+    mono = samples.mean(axis=1, dtype=np.float64) if samples.shape[1] > 1 else samples[:, 0].astype(np.float64)
+    sum_squares = float(np.dot(mono, mono))
+    if sum_squares == 0:
+        return 0.0, 0.0
+
+    # Two cascaded one-pole smoothers of the rectified signal, run as one second-order filter
+    g = math.exp(-1 / (ENVELOPE_SECONDS * sample_rate))
+    envelope = signal.lfilter([(1 - g) ** 2], [1, -2 * g, g * g], np.abs(mono))
+
+    # Hangover: a sample is active at threshold c if the envelope reached c in the last H samples
+    hangover = max(int(round(HANGOVER_SECONDS * sample_rate)), 1)
+    recent = maximum_filter1d(envelope, size=hangover, origin=(hangover - 1) // 2, mode='nearest')
+
+    # Activity count at every threshold at once. The grid hangs from the envelope peak rather
+    # than from full scale, so scaling a clip scales its level exactly (a normalizer needs that)
+    thresholds = recent.max() * 2.0 ** np.arange(-(N_THRESHOLDS - 1), 1)
+    above = np.searchsorted(thresholds, recent, side='right')
+    active = np.cumsum(np.bincount(above, minlength=N_THRESHOLDS + 1)[::-1])[::-1][1:]
+
+    with np.errstate(divide='ignore'):
+        levels = 10 * np.log10(sum_squares / active)
+    excess = levels - 20 * np.log10(thresholds)
+
+    # Active level where (level - threshold) falls to the margin, interpolated in dB
+    below = np.nonzero(excess <= MARGIN_DB)[0]
+    if below.size == 0 or below[0] == 0 or not np.isfinite(levels[below[0] - 1]):
+        j = below[0] if below.size else N_THRESHOLDS - 1
+        level_db, count = levels[j], active[j]
+    else:
+        j = below[0]
+        t = (excess[j - 1] - MARGIN_DB) / (excess[j - 1] - excess[j])
+        level_db = levels[j - 1] + t * (levels[j] - levels[j - 1])
+        count = sum_squares / 10 ** (level_db / 10)
+    if not np.isfinite(level_db):
+        return math.sqrt(sum_squares / n), 1.0
+    return 10 ** (level_db / 20), float(min(count / n, 1.0))
+
+def level(samples, sample_rate, mode="rms", full_scale=None):
+    """Level of a clip in sample units: the amplitude a normalizer matches to the reference.
+
+    Integer samples are converted like sample_format.to_work; float samples are
+    taken as they are, relative to `full_scale` (default: 1.0).
+    """
+    if mode == "rms":
+        return audio_io.level_stats(np.asarray(samples))[0]
+    if mode == "lufs":
+        return lufs_level(samples, sample_rate, full_scale)
+    if mode == "speech":
+        return speech_level(samples, sample_rate, full_scale)[0]
+    raise ValueError(f"Unknown level mode '{mode}' (choose from {', '.join(MODES)})")
+
+def file_level(path, mode="rms", wav_io=audio_io):
+    sr, audio = wav_io.read(path)
+    return level(audio, sr, mode)
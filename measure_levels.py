@@ -0,0 +1,101 @@
+import os
+import sys
+import glob
+import math
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import audio_io
+import loudness
+from build_manifest import file_hash
+
+# --- CONFIGURATION ---
+WORKERS = os.cpu_count() or 1
+SERIAL_BELOW = 8     # Fewer files than this are measured in-process (pool start-up costs more)
+POOL_CHUNKSIZE = 4   # Files handed to a worker at a time
+
+def to_db(rms, full_scale=32768.0):
+    if rms == 0: return -float('inf')
+    return 20 * math.log10(rms / full_scale)
+
+def measure_file(path, with_hash=False, mode="rms"):
+    """One row of the level table for a WAV file.
+
+    Keys: path, sample_rate, channels, length, duration, rms, dbfs,
+    channel_dbfs, peak, crest_db, clipped, error. Levels are in sample units
+    (int16: +-32768). Other level modes add loudness.level_key(mode).
+    """
+    row = {"path": path, "error": None}
+    try:
+        # One vectorized pass over the raw PCM, any bit depth, per channel
+        info, frames, sum_squares, peaks, clipped = audio_io.channel_stats(path)
+        scale = audio_io.pcm_full_scale(info.bits, info.format_tag)
+        channel_rms = np.sqrt(sum_squares / max(frames, 1))
+        rms = float(np.sqrt(sum_squares.sum() / max(frames * info.channels, 1)))
+        peak = float(peaks.max()) if frames else 0.0
+
+        # Report in the same units audio_io.read() returns (24-bit is left-justified int32)
+        unit = 256.0 if info.bits == 24 and info.format_tag == audio_io.WAVE_FORMAT_PCM else 1.0
+
+        row.update({
+            "sample_rate": int(info.sample_rate),
+            "channels": int(info.channels),
+            "length": int(frames),
+            "duration": frames / info.sample_rate if info.sample_rate else 0.0,
+            "rms": rms * unit,
+            "dbfs": to_db(rms, scale),
+            "channel_dbfs": [to_db(float(r), scale) for r in channel_rms],
+            "peak": peak * unit,
+            "crest_db": to_db(peak, rms) if rms else float('inf'),
+            "clipped": int(clipped.sum()),
+        })
+        if mode != "rms":
+            row[loudness.level_key(mode)] = loudness.file_level(path, mode)
+        if with_hash:
+            st = os.stat(path)
+            row.update({"sha256": file_hash(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns})
+    except Exception as e:
+        row["error"] = str(e)
+    return row
+
+def measure_files(paths, workers=WORKERS, with_hash=False, mode="rms"):
+    """Yield measure_file rows (in input order) as the process pool finishes them"""
+    paths = list(paths)
+    fn = partial(measure_file, with_hash=with_hash, mode=mode)
+    if workers <= 1 or len(paths) < SERIAL_BELOW:
+        for path in paths:
+            yield fn(path)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(fn, paths, chunksize=POOL_CHUNKSIZE)
+
+def find_wavs(targets):
+    """Expand folders (swir_*.wav and other *.wav inside) and glob patterns to files"""
+    files = []
+    for target in targets:
+        if os.path.isdir(target):
+            files.extend(sorted(glob.glob(os.path.join(target, "*.wav"))))
+        else:
+            files.extend(sorted(glob.glob(target)))
+    return files
+
+def print_table(rows, out=sys.stdout):
+    print(f"{'file':<40}{'RMS':>10}{'dBFS':>9}{'peak':>9}{'crest dB':>10}{'dur s':>8}{'clip':>6}", file=out)
+    for row in rows:
+        name = os.path.relpath(row["path"])
+        if row["error"]:
+            print(f"{name:<40}  ERROR: {row['error']}", file=out)
+            continue
+        print(f"{name:<40}{row['rms']:>10.1f}{row['dbfs']:>9.2f}{row['peak']:>9.0f}"
+              f"{row['crest_db']:>10.2f}{row['duration']:>8.2f}{row['clipped']:>6}", file=out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure WAV levels across the corpus in parallel.")
+    parser.add_argument("targets", nargs="*", default=[os.path.join("audio_output", "Form *", "wav", "*.wav")],
+                        help="folders, files or glob patterns")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    print_table(measure_files(find_wavs(args.targets), workers=args.workers))
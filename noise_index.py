@@ -0,0 +1,180 @@
+import os
+import math
+import argparse
+import numpy as np
+import audio_io
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+NOISE_FILES = ["babble_noise.wav", "speech_shaped_noise.wav"]
+INDEX_FOLDER = "noise_index"    # Inside BASE_PATH, one .npz per noise bed
+
+HOP_SECONDS = 0.005             # Resolution of the cumulative energy grid
+SHORT_TERM_SECONDS = 0.4        # Window of the stored short-term RMS curve
+MATCH_DB = 0.5                  # "Close to the long-term mean" tolerance
+
+def to_db(rms):
+    if rms == 0: return -float('inf')
+    return 20 * math.log10(rms / 32768.0)
+
+class NoiseIndex:
+    """Cumulative sum of squares of a noise bed on a fixed hop grid.
+
+    Any window's energy is the difference of two cumulative values,
+    so level queries cost O(1) whatever the window length, and thousands of
+    windows are answered in one vectorized call. Levels are in 16-bit sample
+    units, like the rest of the scripts. With the bed's samples attached
+    (`audio`), window edges inside a hop are summed exactly (at most one hop
+    read per edge); without them they are interpolated.
+    """
+
+    def __init__(self, sample_rate, length, hop, cumulative, short_term_rms, source_stamp=None, audio=None):
+        self.sample_rate = int(sample_rate)
+        self.length = int(length)
+        self.hop = int(hop)
+        self.cumulative = cumulative
+        self.short_term_rms = short_term_rms
+        self.source_stamp = source_stamp
+        self.audio = audio
+        # Sample position of each grid point (the last hop may be short)
+        self.bounds = np.minimum(np.arange(len(cumulative), dtype=np.int64) * self.hop, self.length)
+
+    @classmethod
+    def build(cls, noise_file, hop_seconds=HOP_SECONDS):
+        sample_rate, audio = audio_io.read(noise_file)
+        if audio.ndim > 1:
+            audio = audio[:, 0]
+        hop = max(1, int(round(hop_seconds * sample_rate)))
+        n_hops = -(-len(audio) // hop)
+
+        # Per-hop energy, streamed through whole-hop chunks of the memory map
+        energy = np.zeros(n_hops, dtype=np.float64)
+        step = max(hop, audio_io.CHUNK_FRAMES // hop * hop)
+        for start in range(0, len(audio), step):
+            block = audio[start:start + step].astype(np.float64)
+            block = np.pad(block, (0, -len(block) % hop))
+            energy[start // hop:start // hop + len(block) // hop] = np.einsum(
+                'ij,ij->i', block.reshape(-1, hop), block.reshape(-1, hop))
+
+        cumulative = np.concatenate(([0.0], np.cumsum(energy)))
+        index = cls(sample_rate, len(audio), hop, cumulative, None, _stamp(noise_file), audio)
+        index.short_term_rms = index.window_rms(SHORT_TERM_SECONDS)
+        return index
+
+    @classmethod
+    def load(cls, path, audio=None):
+        with np.load(path) as data:
+            return cls(data["sample_rate"], data["length"], data["hop"], data["cumulative"],
+                       data["short_term_rms"], data["source_stamp"].tolist(), audio)
+
+    def save(self, path):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, sample_rate=self.sample_rate, length=self.length, hop=self.hop,
+                 cumulative=self.cumulative, short_term_rms=self.short_term_rms,
+                 source_stamp=np.array(self.source_stamp, dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    @property
+    def duration(self):
+        return self.length / self.sample_rate
+
+    @property
+    def mean_rms(self):
+        """Long-term RMS of the whole bed"""
+        return math.sqrt(self.cumulative[-1] / self.length) if self.length else 0.0
+
+    def energy_at(self, samples):
+        """Cumulative energy up to sample position(s)"""
+        if self.audio is None:
+            return np.interp(samples, self.bounds, self.cumulative)
+
+        samples = np.clip(np.rint(samples).astype(np.int64), 0, self.length)
+        grid = samples // self.hop
+        # Samples between the grid point and the position, one row per query
+        within = np.arange(self.hop)
+        rows = np.minimum(grid[..., None] * self.hop + within, self.length - 1)
+        partial = self.audio[rows].astype(np.float64)
+        partial *= within < (samples - grid * self.hop)[..., None]
+        return self.cumulative[grid] + np.einsum('...i,...i->...', partial, partial)
+
+    def power(self, start, length):
+        """Mean square of windows [start, start + length) in samples; both may be arrays"""
+        start = np.asarray(start, dtype=np.float64)
+        length = np.asarray(length, dtype=np.float64)
+        return (self.energy_at(start + length) - self.energy_at(start)) / length
+
+    def rms(self, t0, t1):
+        """RMS of the bed between t0 and t1 seconds (scalars or arrays)"""
+        t0 = np.asarray(t0, dtype=np.float64) * self.sample_rate
+        t1 = np.asarray(t1, dtype=np.float64) * self.sample_rate
+        result = np.sqrt(np.maximum(self.power(t0, t1 - t0), 0.0))
+        return float(result) if result.ndim == 0 else result
+
+    def level(self, t0, t1):
+        """dBFS of the bed between t0 and t1 seconds"""
+        rms = self.rms(t0, t1)
+        with np.errstate(divide='ignore'):
+            db = 20 * np.log10(np.asarray(rms) / 32768.0)
+        return float(db) if db.ndim == 0 else db
+
+    def window_rms(self, seconds):
+        """RMS of a `seconds` long window starting at every grid point that fits"""
+        span = int(round(seconds * self.sample_rate / self.hop))
+        if span <= 0 or span >= len(self.cumulative):
+            return np.zeros(0)
+        energy = self.cumulative[span:] - self.cumulative[:-span]
+        length = self.bounds[span:] - self.bounds[:-span]
+        return np.sqrt(np.maximum(energy, 0.0) / length)
+
+    def matched_offsets(self, seconds, tolerance_db=MATCH_DB):
+        """Start times (s) whose local RMS over `seconds` is within tolerance of the long-term mean"""
+        rms = self.window_rms(seconds)
+        with np.errstate(divide='ignore'):
+            diff = 20 * np.log10(rms / self.mean_rms)
+        return np.flatnonzero(np.abs(diff) <= tolerance_db) * self.hop / self.sample_rate
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def index_path(noise_file, base=None):
+    base = base or os.path.dirname(noise_file)
+    name = os.path.splitext(os.path.basename(noise_file))[0]
+    return os.path.join(base, INDEX_FOLDER, name + ".npz")
+
+def load_index(noise_file, base=None):
+    """Cached NoiseIndex for a bed, rebuilt only when the bed changed"""
+    path = index_path(noise_file, base)
+    if os.path.exists(path):
+        # The memory-mapped samples are only touched at window edges
+        sr, audio = audio_io.read(noise_file)
+        index = NoiseIndex.load(path, audio[:, 0] if audio.ndim > 1 else audio)
+        if index.source_stamp == _stamp(noise_file) and index.hop == int(round(HOP_SECONDS * index.sample_rate)):
+            return index
+
+    index = NoiseIndex.build(noise_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    index.save(path)
+    return index
+
+def build_indexes(base=BASE_PATH, noise_files=NOISE_FILES):
+    print("--- Noise Bed Level Index ---")
+    for name in noise_files:
+        noise_file = os.path.join(base, name)
+        if not os.path.exists(noise_file):
+            print(f"  {name}: FILE NOT FOUND")
+            continue
+        index = load_index(noise_file, base)
+        short_db = 20 * np.log10(np.maximum(index.short_term_rms, 1e-9) / 32768.0)
+        matched = index.matched_offsets(2.0)
+        print(f"  {name}: {to_db(index.mean_rms):.2f} dB over {index.duration:.1f}s, "
+              f"{SHORT_TERM_SECONDS}s level {np.percentile(short_db, 5):.1f} to {np.percentile(short_db, 95):.1f} dB "
+              f"(5-95%), {len(matched) / max(len(index.window_rms(2.0)), 1):.0%} of 2s starts within "
+              f"{MATCH_DB} dB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the sliding-window RMS index of the noise beds.")
+    parser.add_argument("--base", default=BASE_PATH)
+    args = parser.parse_args()
+    build_indexes(base=args.base)
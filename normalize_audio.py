@@ -1,7 +1,9 @@
 import os
 import glob
-import numpy as np
-from scipy.io import wavfile
+import audio_io
+import instrumentation
+from build_manifest import BuildManifest
+from measure_levels import measure_files
 
 # --- CONFIGURATION ---
 # The root folder where your project audio lives
@@ -22,18 +24,22 @@ TARGET_FOLDERS = [
 
 def measure_rms(audio_data):
     """Calculate Root Mean Square (average energy) of a signal"""
-    data = audio_data.astype(np.float64)
-    return np.sqrt(np.mean(data**2))
+    return audio_io.measure_rms(audio_data)
 
-def normalize_structured_assets():
+def normalize_structured_assets(calibration_file=CALIBRATION_FILE, noise_file=NOISE_FILE,
+                                 babble_file=BABBLE_FILE, target_folders=TARGET_FOLDERS, wav_io=audio_io,
+                                 manifest=None):
     # 1. Measure the "Anchor" (Calibration Tone)
-    if not os.path.exists(CALIBRATION_FILE):
-        print(f"CRITICAL ERROR: Calibration file not found at: {CALIBRATION_FILE}")
+    if not os.path.exists(calibration_file):
+        print(f"CRITICAL ERROR: Calibration file not found at: {calibration_file}")
         print("Please ensure it is in the root 'audio_output' folder.")
         return
 
-    sr, cal_audio = wavfile.read(CALIBRATION_FILE)
-    target_rms = measure_rms(cal_audio)
+    # The manifest sits next to the calibration tone (root of audio_output)
+    if manifest is None:
+        manifest = BuildManifest(os.path.dirname(calibration_file))
+
+    target_rms = manifest.measure(calibration_file, wav_io)["rms"]
 
     print(f"Target RMS (Reference): {target_rms:.4f}")
 
@@ -41,22 +47,24 @@ def normalize_structured_assets():
     files_to_process = []
 
     # A. Add the Noise File (if it exists)
-    if os.path.exists(NOISE_FILE):
-        files_to_process.append(NOISE_FILE)
+    if os.path.exists(noise_file):
+        files_to_process.append(noise_file)
     else:
-        print(f"Warning: Noise file not found at {NOISE_FILE}")
+        print(f"Warning: Noise file not found at {noise_file}")
 
     # A.2 Add the Babble File (if it exists)
-    if os.path.exists(BABBLE_FILE):
-        files_to_process.append(BABBLE_FILE)
+    if os.path.exists(babble_file):
+        files_to_process.append(babble_file)
     else:
-        print(f"Warning: Babble file not found at {BABBLE_FILE}")
+        print(f"Warning: Babble file not found at {babble_file}")
 
-    # B. Add all sentences from Form A and Form B
-    for folder in TARGET_FOLDERS:
+    # B. Add all sentences from the target folders (Form A and Form B by default)
+    found_folders = []
+    for folder in target_folders:
         if not os.path.exists(folder):
             print(f"Warning: Folder not found: {folder}")
             continue
+        found_folders.append(folder)
 
         # Find all .wav files in this folder
         search_pattern = os.path.join(folder, "swir_*.wav")
@@ -67,34 +75,44 @@ def normalize_structured_assets():
     print(f"Starting normalization for {len(files_to_process)} total files...")
 
     # 3. Process them all
-    for wf in files_to_process:
+    # Files unchanged since they were normalized to this target are skipped;
+    # the rest are measured in parallel (measure_levels.py)
+    pending = [wf for wf in files_to_process if not manifest.is_normalized(wf, target_rms)]
+    skipped = len(files_to_process) - len(pending)
+
+    applied = {}
+    instrumentation.set_total(len(pending), "normalize")
+    for row in measure_files(pending):
+        wf = row["path"]
+        instrumentation.advance()
         try:
-            sr, audio = wavfile.read(wf)
+            if row["error"]:
+                raise ValueError(row["error"])
 
-            current_rms = measure_rms(audio)
+            current_rms = row["rms"]
             if current_rms == 0: continue
 
             # Calculate Gain
             gain = target_rms / current_rms
 
-            # Apply Gain
-            new_audio = audio.astype(np.float64) * gain
-
-            # Clip protection
-            if np.max(np.abs(new_audio)) > 32767:
-                new_audio = np.clip(new_audio, -32767, 32767)
-
-            # Save (Overwrite)
-            wavfile.write(wf, sr, new_audio.astype(np.int16))
-
-            # Cleaner output: print file name only
-            name = os.path.basename(wf)
-            # print(f" -> Normalized {name}")
+            # Apply Gain in place, with clip protection (+-32767), chunk by chunk
+            wav_io.apply_gain(wf, gain)
+            applied[wf] = float(gain)
 
         except Exception as e:
             print(f"Error processing {wf}: {e}")
 
-    print("Success! All Form A, Form B, and Noise files are calibrated.")
+    # 4. Record the written files in the manifest
+    for row in measure_files(applied, with_hash=True):
+        if not row["error"]:
+            manifest.record_row(row["path"], row, gain=applied[row["path"]], target_rms=float(target_rms))
+
+    manifest.save()
+    if skipped:
+        print(f"Skipped {skipped} files already at the target level.")
+    print(f"Success! Processed {len(files_to_process)} files from:")
+    for location in [f for f in (noise_file, babble_file) if f in files_to_process] + found_folders:
+        print(f"  {location}")
 
 if __name__ == "__main__":
     normalize_structured_assets()
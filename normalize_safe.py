@@ -1,73 +1,233 @@
 import os
 import glob
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from scipy.io import wavfile
+import audio_io
+import sample_format
+import loudness
+import instrumentation
+from build_manifest import BuildManifest, file_hash
+from measure_levels import measure_files
 
 # --- CONFIGURATION ---
 BASE_PATH = "/home/marks/Development/swir_project/audio_output"
 CALIBRATION_FILE = os.path.join(BASE_PATH, "calibration_1khz_neg20db.wav")
-# We scan Form A, Form B, and the root folder (for babble)
+# We scan Form A, Form B, Form P (trimmed by trim_silence.py), and the root folder (for babble)
 TARGET_FOLDERS = [
     BASE_PATH,
     os.path.join(BASE_PATH, "Form A/wav"),
-    os.path.join(BASE_PATH, "Form B/wav")
+    os.path.join(BASE_PATH, "Form B/wav"),
+    os.path.join(BASE_PATH, "Form P/wav")
 ]
+LEVEL_MODE = "rms"   # "rms" (whole file), "lufs" (BS.1770) or "speech" (P.56 active level), see loudness.py
 
-def measure_rms(audio_data):
-    data = audio_data.astype(np.float64)
-    return np.sqrt(np.mean(data**2))
+BATCH = True                 # Measure/solve many files at once (False: one file at a time)
+BATCH_BYTES = audio_io.BATCH_BYTES   # Float32 samples held in memory per batch
+WRITE_THREADS = 8            # Files scaled and written concurrently
 
-def normalize_safe():
-    if not os.path.exists(CALIBRATION_FILE):
+def measure_rms(audio_data):
+    return audio_io.measure_rms(audio_data)
+
+def safe_gain(audio, target_rms):
+    """Return (gain, safety_ratio) matching target RMS without clipping"""
+    # One chunked float32 pass gives both RMS and peak (no full float64 copy)
+    current_rms, peak = audio_io.level_stats(audio)
+    return safe_gain_from_levels(current_rms, peak, target_rms)
+
+def safe_gain_from_levels(current_rms, peak, target_rms):
+    """safe_gain() for an already measured RMS and peak"""
+    if current_rms == 0:
+        return None, 1.0
+
+    # 1. Calculate ideal gain to match RMS
+    gain = target_rms / current_rms
+
+    # 2. SAFETY CHECK: Check for clipping
+    # The peak scales linearly with gain, so we don't need a scaled copy to test it
+    max_val = peak * gain
+    safety_ratio = 1.0
+
+    if max_val > sample_format.MAX_ALLOWED:
+        # If we are about to clip, calculate a "Safety Gain"
+        # This reduces volume just enough to save the peaks
+        safety_ratio = sample_format.MAX_ALLOWED / max_val
+        gain = gain * safety_ratio
+
+    return gain, safety_ratio
+
+def batch_levels(buffer, offsets, lengths):
+    """RMS and peak of every clip in a ragged buffer, one reduction each (clips must be non-empty)"""
+    # Contiguous float32 add.reduceat sums pairwise (~1e-7 relative error), no float64 copy needed
+    sum_squares = np.add.reduceat(np.square(buffer), offsets).astype(np.float64)
+    peak = np.maximum(np.maximum.reduceat(buffer, offsets), -np.minimum.reduceat(buffer, offsets))
+    return np.sqrt(sum_squares / lengths), peak.astype(np.float64)
+
+def batch_gains(rms, peak, target_rms):
+    """safe_gain_from_levels() for arrays: (gains, safety_ratios); silent clips get NaN"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gains = np.where(rms > 0, target_rms / rms, np.nan)
+        safety = np.minimum(1.0, sample_format.MAX_ALLOWED / (peak * gains))
+    safety = np.where(np.isfinite(safety), safety, 1.0)
+    return gains * safety, safety
+
+def clip_levels(buffer, offsets, lengths, clips, mode):
+    """Per-clip levels in `mode`; plain RMS comes from the batch reduction in batch_levels"""
+    levels = np.empty(len(clips))
+    for i, (path, sr, dtype, shape) in enumerate(clips):
+        block = buffer[offsets[i]:offsets[i] + lengths[i]].reshape(shape)
+        levels[i] = loudness.level(block, sr, mode, full_scale=audio_io.full_scale(dtype))
+    return levels
+
+def _write_scaled(clip, block, gain, wav_io, mode="rms"):
+    """Thread pool job: quantize one already scaled clip once, write it in place; returns a manifest row"""
+    path, sr, dtype, shape = clip
+    if dtype == np.int32:
+        # float32 cannot hold 32-bit samples, so rescale from the file in float64
+        block = wav_io.read(path)[1].astype(np.float64).reshape(-1) * gain
+    out = sample_format.quantize(block, dtype, sample_format.dither_rng(os.path.basename(path))).reshape(shape)
+    wav_io.store_samples(path, out)
+    rms, peak = audio_io.level_stats(out)
+    st = os.stat(path)
+    row = {"sha256": file_hash(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+           "sample_rate": int(sr), "length": int(shape[0]), "rms": rms, "peak": peak}
+    if mode != "rms":
+        row[loudness.level_key(mode)] = loudness.level(out, sr, mode)
+    return row
+
+def _unchanged_row(clip, rms, peak, level, mode="rms"):
+    """Manifest row for a clip left as it is, from the levels the batch already measured"""
+    path, sr, dtype, shape = clip
+    st = os.stat(path)
+    row = {"sha256": file_hash(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+           "sample_rate": int(sr), "length": int(shape[0]), "rms": float(rms), "peak": float(peak)}
+    if mode != "rms":
+        row[loudness.level_key(mode)] = float(level)
+    return row
+
+def normalize_batch(paths, target_rms, wav_io=audio_io, manifest=None, threads=WRITE_THREADS, mode="rms"):
+    """Normalize many files: one ragged buffer, vectorized levels and gains, threaded writes.
+
+    `target_rms` is the reference level in `mode`. Returns {path: gain} for the files written.
+    """
+    applied = {}
+    instrumentation.set_total(len(paths), "normalize")
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for batch in audio_io.batches(paths, BATCH_BYTES):
+            # 1. Every RMS and peak of the batch in one pass
+            buffer, offsets, lengths, clips = audio_io.load_ragged(batch, wav_io)
+            instrumentation.advance(len(batch) - len(clips))
+            if not clips:
+                continue
+            rms, peak = batch_levels(buffer, offsets, lengths)
+            levels = rms if mode == "rms" else clip_levels(buffer, offsets, lengths, clips, mode)
+
+            # 2. All gains and clip-protection clamps at once
+            gains, safety = batch_gains(levels, peak, target_rms)
+            for clip, ratio in zip(clips, safety):
+                if ratio < 1.0:
+                    print(f" -> Protected {os.path.basename(clip[0])} from clipping (Reduced by {ratio:.2f}x)")
+            # Silent and already normalized clips are not rewritten
+            write = np.isfinite(gains) & (np.abs(gains - 1.0) >= sample_format.UNITY_TOLERANCE)
+            buffer *= np.repeat(np.where(write, gains, 1.0).astype(buffer.dtype), lengths)
+
+            # 3. Quantize and write on the thread pool (numpy and file I/O release the GIL)
+            jobs = []
+            for i, clip in enumerate(clips):
+                if not write[i]:
+                    instrumentation.advance()
+                    # Already at the target: recorded as such, so later runs skip it without reading it
+                    if manifest is not None and np.isfinite(gains[i]):
+                        row = _unchanged_row(clip, rms[i], peak[i], levels[i], mode)
+                        manifest.record_row(clip[0], row, gain=1.0, target_rms=float(target_rms), level_mode=mode)
+                    continue
+                block = buffer[offsets[i]:offsets[i] + lengths[i]]
+                jobs.append((clip[0], float(gains[i]), pool.submit(_write_scaled, clip, block, float(gains[i]), wav_io, mode)))
+
+            for path, gain, future in jobs:
+                instrumentation.advance()
+                try:
+                    row = future.result()
+                except Exception as e:
+                    print(f"Error on {path}: {e}")
+                    continue
+                applied[path] = gain
+                if manifest is not None:
+                    manifest.record_row(path, row, gain=gain, target_rms=float(target_rms), level_mode=mode)
+            del buffer
+    return applied
+
+def normalize_safe(calibration_file=CALIBRATION_FILE, target_folders=TARGET_FOLDERS, wav_io=audio_io, manifest=None,
+                   mode=LEVEL_MODE):
+    if not os.path.exists(calibration_file):
         print("Error: Calibration file missing.")
         return
 
-    sr, cal_audio = wavfile.read(CALIBRATION_FILE)
-    target_rms = measure_rms(cal_audio)
-    print(f"Target RMS (from Calibration): {target_rms:.2f}")
+    # The manifest sits next to the calibration tone (root of audio_output)
+    if manifest is None:
+        manifest = BuildManifest(os.path.dirname(calibration_file))
+
+    # The tone is measured the same way as the files, so every mode targets the same reference
+    target_rms = loudness.entry_level(manifest.measure(calibration_file, wav_io, mode), mode)
+    if mode == "rms":
+        print(f"Target RMS (from Calibration): {target_rms:.2f}")
+    else:
+        print(f"Target {mode} level (from Calibration): {target_rms:.2f}")
 
     # Gather files (Sentences + Babble)
     files = []
-    for folder in TARGET_FOLDERS:
+    for folder in target_folders:
         # Grab wavs, but exclude the calibration file itself
         found = glob.glob(os.path.join(folder, "*.wav"))
         files.extend([f for f in found if "calibration" not in f])
 
     print(f"Processing {len(files)} files...")
 
-    for wf in files:
-        try:
-            sr, audio = wavfile.read(wf)
-            if len(audio) == 0: continue
-
-            current_rms = measure_rms(audio)
-            if current_rms == 0: continue
+    # Unchanged since they were last normalized to this same target
+    pending = [wf for wf in files if not manifest.is_normalized(wf, target_rms, mode)]
+    skipped = len(files) - len(pending)
 
-            # 1. Calculate ideal gain to match RMS
-            gain = target_rms / current_rms
+    if BATCH:
+        normalize_batch(pending, target_rms, wav_io, manifest, mode=mode)
+        manifest.save()
+        if skipped:
+            print(f"Skipped {skipped} files already at the target level (see {manifest.path}).")
+        print("Success! All files normalized (with peak protection).")
+        return
 
-            # 2. Test the gain
-            audio_float = audio.astype(np.float64)
-            proposed_audio = audio_float * gain
+    # 1. Measure everything that needs work in parallel (measure_levels.py)
+    applied = {}
+    instrumentation.set_total(len(pending), "normalize")
+    level_key = loudness.level_key(mode)
+    for row in measure_files(pending, mode=mode):
+        wf = row["path"]
+        instrumentation.advance()
+        try:
+            if row["error"]:
+                raise ValueError(row["error"])
+            if row["length"] == 0: continue
 
-            # 3. SAFETY CHECK: Check for clipping
-            max_val = np.max(np.abs(proposed_audio))
-            MAX_ALLOWED = 32700  # Just under the 16-bit limit (32767)
+            gain, safety_ratio = safe_gain_from_levels(row[level_key], row["peak"], target_rms)
+            if gain is None: continue
 
-            if max_val > MAX_ALLOWED:
-                # If we are about to clip, calculate a "Safety Gain"
-                # This reduces volume just enough to save the peaks
-                safety_ratio = MAX_ALLOWED / max_val
-                gain = gain * safety_ratio
+            if safety_ratio < 1.0:
                 print(f" -> Protected {os.path.basename(wf)} from clipping (Reduced by {safety_ratio:.2f}x)")
 
-            # 4. Apply Final Gain
-            final_audio = audio_float * gain
-            wavfile.write(wf, sr, final_audio.astype(np.int16))
+            # 2. Apply Final Gain in place (memory-mapped, chunk by chunk)
+            wav_io.apply_gain(wf, gain)
+            applied[wf] = float(gain)
 
         except Exception as e:
             print(f"Error on {wf}: {e}")
 
+    # 3. Record what was written, measured again in parallel
+    for row in measure_files(applied, with_hash=True, mode=mode):
+        if not row["error"]:
+            manifest.record_row(row["path"], row, gain=applied[row["path"]], target_rms=float(target_rms),
+                                level_mode=mode)
+
+    manifest.save()
+    if skipped:
+        print(f"Skipped {skipped} files already at the target level (see {manifest.path}).")
     print("Success! All files normalized (with peak protection).")
 
 if __name__ == "__main__":
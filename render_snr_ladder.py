@@ -0,0 +1,182 @@
+import os
+import glob
+import json
+import zlib
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import signal
+import audio_io
+import sample_format
+import instrumentation
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+MIX_FOLDER = "mixes"            # Inside BASE_PATH
+INDEX_FILE = "index.json"       # Inside MIX_FOLDER, loaded by the app
+FORMS = ["A", "B", "P"]         # Form C is the babble source, it is never presented
+
+SNR_LADDER = [0, 5, 10, 15, 20, 25]   # dB, same range as the SNR slider in src/App.js
+BABBLE_OFFSET_DB = 1.5          # Same correction App.js applies to the babble gain
+LEAD_IN = 0.5                   # Seconds of babble before the sentence starts
+TAIL = 0.5                      # Seconds of babble after it ends
+WORKERS = os.cpu_count() or 1
+
+def babble_gain(snr, offset_db=BABBLE_OFFSET_DB):
+    """Linear babble gain for an SNR step, exactly as App.js sets its GainNode"""
+    return 10 ** ((-snr + offset_db) / 20)
+
+def segment_offset(form, sentence_id, segment_length, babble_length, variant=0):
+    """Deterministic babble start for a trial: same form + sentence (+ variant), same segment.
+
+    Variant 0 is the segment the ladder pre-renders; others are alternative draws.
+    """
+    span = babble_length - segment_length
+    if span <= 0:
+        return 0
+    key = f"{form}/{sentence_id}" if variant == 0 else f"{form}/{sentence_id}/{variant}"
+    return zlib.crc32(key.encode()) % span
+
+def babble_segment(babble, babble_sr, sr, start, length):
+    """`length` samples of babble at rate `sr`, cut at the babble's own rate from `start`"""
+    babble_length = int(np.ceil(length * babble_sr / sr))
+    segment = babble[start:start + babble_length].astype(np.float32)
+    if babble_sr != sr:
+        g = np.gcd(sr, babble_sr)
+        segment = signal.resample_poly(segment, sr // g, babble_sr // g).astype(np.float32)
+    return np.pad(segment[:length], (0, max(0, length - len(segment))))
+
+def trial_name(form, sentence_id, snr, variant=0):
+    """Seeds the dither of one presentation, so the ladder and the asset server write the same bytes"""
+    name = f"{form}/{sentence_id}/{float(snr):g}"
+    return name if variant == 0 else f"{name}/{variant}"
+
+def mix_trial(speech_track, segment, snr, offset_db=BABBLE_OFFSET_DB, gain_db=0.0, rng=None):
+    """One presentation: speech plus babble at `snr`, as int16; returns (mix, clipped samples)
+
+    Quantized once with TPDF dither from `rng` (see trial_name).
+    """
+    mix = speech_track + segment * np.float32(babble_gain(snr, offset_db))
+    if gain_db:
+        mix *= np.float32(10 ** (gain_db / 20))
+    clipped = int(np.count_nonzero(np.abs(mix) > sample_format.MAX_ALLOWED))
+    np.clip(mix, -sample_format.MAX_ALLOWED, sample_format.MAX_ALLOWED, out=mix)
+    return sample_format.quantize(mix, np.int16, rng), clipped
+
+def _stamp(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+def render_trial(job, babble_file, mix_base, snr_ladder):
+    """Mix one sentence with its babble segment at every SNR step (runs in a worker)"""
+    form, sentence_id, sentence_file = job
+    sr, speech = audio_io.read(sentence_file)
+    babble_sr, babble = audio_io.read(babble_file)
+    if speech.ndim > 1:
+        speech = speech[:, 0]
+    if babble.ndim > 1:
+        babble = babble[:, 0]
+
+    lead, tail = int(LEAD_IN * sr), int(TAIL * sr)
+    length = lead + len(speech) + tail
+
+    # Cut the segment at the babble's own rate, then bring it to the sentence rate
+    start = segment_offset(form, sentence_id, int(np.ceil(length * babble_sr / sr)), len(babble))
+    segment = babble_segment(babble, babble_sr, sr, start, length)
+
+    speech_track = np.zeros(length, dtype=np.float32)
+    speech_track[lead:lead + len(speech)] = speech
+
+    trial = {"form": form, "id": sentence_id, "sample_rate": int(sr),
+             "speech_start": LEAD_IN, "speech_duration": len(speech) / sr,
+             "babble_offset": start / babble_sr, "source": _stamp(sentence_file), "snr": {}}
+
+    for snr in snr_ladder:
+        rng = sample_format.dither_rng(trial_name(form, sentence_id, snr))
+        mix, clipped = mix_trial(speech_track, segment, snr, rng=rng)
+
+        rel_path = os.path.join(f"Form {form}", f"snr_{snr:+03d}", f"swir_{sentence_id}.wav")
+        out_path = os.path.join(mix_base, rel_path)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        audio_io.write(out_path, sr, mix)
+        trial["snr"][str(snr)] = {"file": rel_path.replace(os.sep, "/"), "clipped": clipped}
+    return trial
+
+def find_trials(base, forms):
+    """(form, sentence id, path) for every normalized sentence WAV"""
+    jobs = []
+    for form in forms:
+        for path in sorted(glob.glob(os.path.join(base, f"Form {form}", "wav", "swir_*.wav"))):
+            sentence_id = os.path.basename(path)[len("swir_"):-len(".wav")]
+            jobs.append((form, sentence_id, path))
+    return jobs
+
+def render_trials(jobs, babble_file, mix_base, snr_ladder, workers=WORKERS):
+    """Yield render_trial results (in input order) from a process pool"""
+    fn = partial(render_trial, babble_file=babble_file, mix_base=mix_base, snr_ladder=list(snr_ladder))
+    if workers <= 1 or len(jobs) < 2:
+        for job in jobs:
+            yield fn(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(fn, jobs, chunksize=4)
+
+def load_index(path):
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return None
+
+def render_snr_ladder(base=BASE_PATH, forms=FORMS, snr_ladder=SNR_LADDER, workers=WORKERS, force=False):
+    print("--- SNR Ladder Renderer ---")
+    babble_file = os.path.join(base, "babble_noise.wav")
+    if not os.path.exists(babble_file):
+        print(f"CRITICAL: Babble file missing: {babble_file}")
+        return
+
+    mix_base = os.path.join(base, MIX_FOLDER)
+    index_path = os.path.join(mix_base, INDEX_FILE)
+    settings = {"babble": _stamp(babble_file), "ladder": list(snr_ladder),
+                "babble_offset_db": BABBLE_OFFSET_DB, "lead_in": LEAD_IN, "tail": TAIL,
+                "dither": sample_format.DITHER}
+
+    # A trial is re-rendered only if its sentence changed; anything global
+    # (babble bed, ladder, offsets) invalidates the whole index
+    previous = load_index(index_path)
+    done = {}
+    if previous and not force and previous.get("settings") == settings:
+        done = {(t["form"], t["id"]): t for t in previous["trials"]}
+
+    jobs = find_trials(base, forms)
+    pending = [job for job in jobs
+               if (job[0], job[1]) not in done or done[job[:2]]["source"] != _stamp(job[2])]
+    print(f"{len(jobs)} trials x {len(snr_ladder)} SNR steps, {len(pending)} to render.")
+
+    instrumentation.set_total(len(pending), "snr")
+    for trial in render_trials(pending, babble_file, mix_base, snr_ladder, workers):
+        instrumentation.advance()
+        done[(trial["form"], trial["id"])] = trial
+        clipped = sum(step["clipped"] for step in trial["snr"].values())
+        if clipped:
+            print(f"  Warning: Form {trial['form']} swir_{trial['id']}: {clipped} samples clipped")
+
+    trials = [done[job[:2]] for job in jobs]
+    os.makedirs(mix_base, exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"version": 1, "settings": settings, "trials": trials}, f, indent=1)
+    os.replace(tmp_path, index_path)
+    print(f"Index written to {index_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-mix every sentence with babble at each SNR step.")
+    parser.add_argument("--base", default=BASE_PATH)
+    parser.add_argument("--forms", nargs="+", default=FORMS)
+    parser.add_argument("--snr", type=int, nargs="+", default=SNR_LADDER, help="SNR steps in dB")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    render_snr_ladder(base=args.base, forms=args.forms, snr_ladder=args.snr, workers=args.workers, force=args.force)
@@ -0,0 +1,53 @@
+import zlib
+import numpy as np
+
+# --- CONFIGURATION ---
+WORK_DTYPE = np.float32     # Intermediate precision for every DSP step (np.float64 for extra headroom)
+DITHER = True               # TPDF dither on the one quantization at export
+UNITY_TOLERANCE = 1e-4      # Gains closer than this to 1.0 (~0.001 dB) are not applied at all
+MAX_ALLOWED = 32700         # Output ceiling in 16-bit units, just under 32767 (leaves room for dither)
+
+def to_work(audio):
+    """Samples as WORK_DTYPE in the file's own integer units, unscaled.
+
+    8-bit is re-centered on 0; 16-, 24- (left-justified, as stored) and
+    32-bit values are kept as they are, and floats stay in +-1.0.
+    """
+    if audio.dtype == np.uint8:
+        block = audio.astype(WORK_DTYPE)
+        block -= 128
+        return block
+    return audio.astype(WORK_DTYPE)
+
+def dither_rng(name):
+    """Reproducible dither stream per file, so the same input gives the same bytes"""
+    return np.random.default_rng(zlib.crc32(str(name).encode()))
+
+def is_unity(gain):
+    return abs(gain - 1.0) < UNITY_TOLERANCE
+
+def quantize(block, dtype=np.int16, rng=None, dither=DITHER):
+    """The single float -> integer step: TPDF dither, round, symmetric clip.
+
+    `block` is in sample units of `dtype` (uint8 centered on 0) and is
+    modified in place. Float dtypes are only clipped to +-1.0.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        np.clip(block, -1.0, 1.0, out=block)
+        return block.astype(dtype)
+
+    if dither:
+        # Difference of two uniform variables: triangular PDF, +-1 LSB
+        rng = rng or np.random.default_rng(0)
+        block += rng.random(block.shape, dtype=np.float32)
+        block -= rng.random(block.shape, dtype=np.float32)
+    np.rint(block, out=block)
+
+    if dtype == np.uint8:
+        np.clip(block, -127, 127, out=block)
+        block += 128
+    else:
+        info = np.iinfo(dtype)
+        np.clip(block, info.min + 1, info.max, out=block)  # Symmetric, like the old +-32767 clip
+    return block.astype(dtype)
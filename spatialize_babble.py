@@ -0,0 +1,234 @@
+import os
+import re
+import glob
+import math
+import wave
+import argparse
+import numpy as np
+from scipy import fft, signal
+import audio_io
+import sample_format
+import instrumentation
+import babble_stems
+from create_babble import DURATION_SECONDS, N_VOICES, SEED
+from build_manifest import BuildManifest
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+SOURCE_FOLDERS = [os.path.join(BASE_PATH, "Form C", "wav")]
+CALIBRATION_FILE = os.path.join(BASE_PATH, "calibration_1khz_neg20db.wav")
+IR_FOLDER = "impulse_responses"                   # Stereo WAVs named az_<degrees>.wav (e.g. az_-030.wav, az_+045.wav)
+OUTPUT_FILE = os.path.join(BASE_PATH, "babble_noise_spatial.wav")
+SPREAD_DEGREES = 180        # Talkers are spaced evenly over this arc, centred straight ahead
+BLOCK = 4096                # Partition / hop size in samples (FFT size is twice this)
+SCRATCH_SUFFIX = ".f32"     # Float stereo scratch next to the output, removed after the int16 pass
+
+# Synthetic spherical-head set for --make-irs (Brown & Duda 1998 head shadow + Woodworth delay)
+HEAD_RADIUS = 0.0875        # metres
+SPEED_OF_SOUND = 343.0      # metres / second
+IR_SAMPLE_RATE = 48000
+IR_LENGTH = 256
+SINC_HALF_WIDTH = 16        # Taps either side of the fractional-delay centre
+IR_AZIMUTHS = range(-90, 91, 15)
+
+AZIMUTH_PATTERN = re.compile(r"az_([+-]?\d+(?:\.\d+)?)\.wav$")
+
+def load_irs(folder=IR_FOLDER, sample_rate=None, wav_io=audio_io):
+    """{azimuth: (length, 2) float32 IR} from the folder, resampled to `sample_rate` if given"""
+    irs = {}
+    for path in sorted(glob.glob(os.path.join(folder, "az_*.wav"))):
+        match = AZIMUTH_PATTERN.search(os.path.basename(path))
+        if not match:
+            continue
+        sr, ir = wav_io.read(path)
+        ir = ir.astype(np.float32) / np.float32(audio_io.full_scale(ir.dtype))
+        if ir.ndim != 2 or ir.shape[1] != 2:
+            print(f"Skipping {path}: impulse responses must be stereo")
+            continue
+        if sample_rate is not None and sr != sample_rate:
+            g = math.gcd(int(sample_rate), int(sr))
+            ir = signal.resample_poly(ir, sample_rate // g, sr // g, axis=0).astype(np.float32)
+        irs[float(match.group(1))] = ir
+    return irs
+
+def talker_azimuths(n_voices, spread=SPREAD_DEGREES):
+    """Evenly spaced azimuths (degrees, positive = right) across the spread"""
+    if n_voices == 1:
+        return [0.0]
+    return list(np.linspace(-spread / 2, spread / 2, n_voices))
+
+def nearest_irs(irs, azimuths):
+    """(chosen azimuth, IR) per requested azimuth"""
+    available = sorted(irs)
+    chosen = [min(available, key=lambda a: abs(a - azimuth)) for azimuth in azimuths]
+    return [(a, irs[a]) for a in chosen]
+
+class PartitionedConvolver:
+    """Uniformly partitioned overlap-save convolution of T mono talkers with T stereo IRs, summed.
+
+    Every IR is cut into BLOCK-long partitions and transformed once. Each new
+    block of all talkers is transformed together (one batched rFFT) into a
+    frequency-domain delay line; the stereo output is the sum over partitions
+    and talkers of delay line x IR spectra, so only two inverse FFTs are done
+    per block no matter how many talkers there are.
+    """
+
+    def __init__(self, irs, block=BLOCK):
+        self.block = block
+        self.n_fft = 2 * block
+        n_talkers = len(irs)
+        n_parts = max(1, -(-max(len(ir) for ir in irs) // block))
+        padded = np.zeros((n_talkers, n_parts * block, 2), dtype=np.float32)
+        for t, ir in enumerate(irs):
+            padded[t, :len(ir)] = ir
+        # (partitions, talkers, channels, bins)
+        parts = padded.reshape(n_talkers, n_parts, block, 2).transpose(1, 0, 3, 2)
+        self.spectra = fft.rfft(parts, n=self.n_fft, axis=-1).astype(np.complex64)
+        self.delay_line = np.zeros((n_parts, n_talkers, block + 1), dtype=np.complex64)
+        self.previous = np.zeros((n_talkers, block), dtype=np.float32)
+        self.newest = 0
+
+    @instrumentation.hot
+    def process(self, blocks):
+        """(talkers, block) float32 input -> (block, 2) float32 output"""
+        frames = np.concatenate((self.previous, blocks), axis=1)
+        self.previous = blocks
+        n_parts = len(self.delay_line)
+        self.newest = (self.newest - 1) % n_parts
+        self.delay_line[self.newest] = fft.rfft(frames, axis=1)
+
+        # Partition p of every IR meets the input spectrum from p blocks ago
+        order = (self.newest + np.arange(n_parts)) % n_parts
+        summed = (self.delay_line[order][:, :, None, :] * self.spectra).sum(axis=(0, 1))
+        return fft.irfft(summed, n=self.n_fft, axis=1)[:, self.block:].T.astype(np.float32)
+
+def render_spatial(stems, irs, scratch_file, block=BLOCK):
+    """Convolve every stem with its IR into a (samples, 2) float32 scratch file; returns (rms, peak).
+
+    Stems are read and the scratch written block by block with plain file I/O
+    (no memory maps), so memory stays at a few blocks whatever the duration.
+    """
+    total = stems.state["total_samples"]
+    voices = [open(stems.stem_path(int(key)), 'rb') for key in sorted(stems.state["voices"], key=int)]
+    convolver = PartitionedConvolver(irs, block)
+    sum_squares, peak = 0.0, 0.0
+    try:
+        with open(scratch_file, 'wb') as out:
+            for start in range(0, total, block):
+                n = min(block, total - start)
+                inputs = np.zeros((len(voices), block), dtype=np.float32)   # Last block zero-padded
+                for t, voice in enumerate(voices):
+                    inputs[t, :n] = np.fromfile(voice, dtype=np.float32, count=n)
+                y = convolver.process(inputs)[:n]
+                out.write(y.tobytes())
+                sum_squares += float(np.einsum('ij,ij->', y, y))
+                peak = max(peak, float(y.max()), float(-y.min()))
+    finally:
+        for voice in voices:
+            voice.close()
+    rms = math.sqrt(sum_squares / (2 * total)) if total else 0.0
+    return rms, peak
+
+def write_stereo(scratch_file, output_file, sample_rate, gain, chunk=babble_stems.CHUNK):
+    """Stream the float scratch to a 16-bit stereo WAV, one gain and one quantize pass"""
+    rng = sample_format.dither_rng(os.path.basename(output_file))
+    with open(scratch_file, 'rb') as data, wave.open(output_file, 'wb') as out:
+        out.setnchannels(2)
+        out.setsampwidth(2)
+        out.setframerate(sample_rate)
+        while True:
+            block = np.fromfile(data, dtype=np.float32, count=2 * chunk).astype(sample_format.WORK_DTYPE)
+            if block.size == 0:
+                break
+            block *= gain
+            out.writeframes(sample_format.quantize(block, '<i2', rng).tobytes())
+
+def make_synthetic_irs(folder=IR_FOLDER, azimuths=IR_AZIMUTHS, sample_rate=IR_SAMPLE_RATE, length=IR_LENGTH):
+    """Write a spherical-head IR per azimuth: interaural delay plus a one-pole head-shadow shelf per ear"""
+    os.makedirs(folder, exist_ok=True)
+    w0 = SPEED_OF_SOUND / HEAD_RADIUS
+    taps = np.arange(length)
+    for azimuth in azimuths:
+        ir = np.zeros((length, 2), dtype=np.float32)
+        for ch, ear in enumerate((-90.0, 90.0)):
+            theta = math.radians(abs(azimuth - ear))       # Angle between the source and this ear
+            alpha = 1.05 + 0.95 * math.cos(theta / math.radians(150.0) * math.pi)
+            if theta < math.pi / 2:
+                delay = -HEAD_RADIUS / SPEED_OF_SOUND * math.cos(theta)
+            else:
+                delay = HEAD_RADIUS / SPEED_OF_SOUND * (theta - math.pi / 2)
+            delay = (delay + HEAD_RADIUS / SPEED_OF_SOUND) * sample_rate + SINC_HALF_WIDTH   # Causal
+            # Fractional delay: Hann-windowed sinc centred on the delay
+            x = taps - delay
+            impulse = np.where(np.abs(x) < SINC_HALF_WIDTH,
+                               np.sinc(x) * (0.5 + 0.5 * np.cos(np.pi * x / SINC_HALF_WIDTH)), 0.0)
+            b, a = signal.bilinear([alpha / (2 * w0), 1], [1 / (2 * w0), 1], sample_rate)
+            ir[:, ch] = signal.lfilter(b, a, impulse)
+        audio_io.write(os.path.join(folder, f"az_{azimuth:+04d}.wav"), sample_rate, ir)
+    print(f"Wrote {len(azimuths)} synthetic impulse responses to {folder}/")
+
+def spatialize_babble(source_folders=SOURCE_FOLDERS, output_file=OUTPUT_FILE, stems_folder=babble_stems.STEMS_FOLDER,
+                      ir_folder=IR_FOLDER, calibration_file=CALIBRATION_FILE, duration_seconds=DURATION_SECONDS,
+                      n_voices=N_VOICES, seed=SEED, spread=SPREAD_DEGREES, wav_io=audio_io):
+    print("--- Spatial Babble Builder ---")
+
+    # 1. The same per-talker stems as babble_noise.wav (only changed talkers are re-rendered)
+    sample_rate, clips = babble_stems.load_clips(source_folders, wav_io)
+    if not clips:
+        print(f"CRITICAL ERROR: No sentence files found in: {source_folders}")
+        return None
+    irs = load_irs(ir_folder, sample_rate, wav_io)
+    if not irs:
+        print(f"No impulse responses in {ir_folder}/ (az_<degrees>.wav), spatial bed skipped. "
+              f"`python3 spatialize_babble.py --make-irs` writes a synthetic set.")
+        return None
+    stems = babble_stems.BabbleStems(stems_folder)
+    stems.update(clips, sample_rate, duration_seconds, n_voices, seed)
+
+    # 2. One IR per talker, nearest to its place on the arc
+    placed = nearest_irs(irs, talker_azimuths(len(stems.state["voices"]), spread))
+    print("Talker azimuths: " + ", ".join(f"{a:+.0f}" for a, _ in placed))
+
+    # 3. Partitioned convolution of all talkers at once into a float scratch
+    scratch_file = output_file + SCRATCH_SUFFIX
+    rms, peak = render_spatial(stems, [ir for _, ir in placed], scratch_file)
+    if rms == 0:
+        os.remove(scratch_file)
+        raise ValueError("Spatial babble mix is silent")
+
+    # 4. Level against the calibration tone (RMS over both channels), peaks protected
+    target_rms = None
+    manifest = None
+    if os.path.exists(calibration_file):
+        manifest = BuildManifest(os.path.dirname(calibration_file))
+        target_rms = manifest.measure(calibration_file, wav_io)["rms"]
+    if target_rms is None:
+        gain = 0.9 * 32767 / peak
+    else:
+        gain = target_rms / rms
+        if peak * gain > sample_format.MAX_ALLOWED:
+            gain *= sample_format.MAX_ALLOWED / (peak * gain)
+
+    write_stereo(scratch_file, output_file, sample_rate, gain)
+    os.remove(scratch_file)
+    if manifest is not None:
+        sr, audio = audio_io.read(output_file)
+        manifest.record(output_file, sr, audio, gain=gain, target_rms=target_rms)
+        manifest.save()
+    print(f"Success! Spatial babble ({len(placed)} talkers, stereo) saved to:\n{output_file}")
+    return output_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a stereo babble bed with each talker at its own azimuth.")
+    parser.add_argument("--voices", type=int, default=N_VOICES)
+    parser.add_argument("--duration", type=float, default=DURATION_SECONDS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--spread", type=float, default=SPREAD_DEGREES, help="arc in degrees the talkers cover")
+    parser.add_argument("--irs", default=IR_FOLDER, help="folder of az_<degrees>.wav stereo impulse responses")
+    parser.add_argument("--make-irs", action="store_true", help="write a synthetic spherical-head IR set first")
+    args = parser.parse_args()
+    if args.make_irs:
+        make_synthetic_irs(args.irs)
+    spatialize_babble(ir_folder=args.irs, duration_seconds=args.duration, n_voices=args.voices, seed=args.seed,
+                      spread=args.spread)
@@ -0,0 +1,436 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import audio_io
+import sample_format
+import instrumentation
+import loudness
+
+import create_calibration
+import create_noise
+import create_babble
+import babble_stems
+import spatialize_babble
+import trim_silence
+import normalize_safe
+import verify_audio_standards
+import analyze_audio_levels
+import render_snr_ladder
+import export_noise_chunks
+import export_rates
+import calibrate_snr
+from asset_cache import AssetCache
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as generate.py / create_calibration.py
+BASE_PATH = "audio_output"
+STATE_FILE = ".swir_build_state.json"   # Lives inside BASE_PATH
+
+# Sentence lists that feed the generate stage
+SENTENCE_FILES = [
+    "sentences.json",
+    "babble_sentences.json",
+    "practice_sentences.json"
+]
+
+class AudioStore:
+    """Write-through WAV cache so each file is opened at most once per build.
+
+    Exposes the same read/write/apply_gain/store_samples functions as audio_io, so it can be
+    handed to the standalone scripts as their `wav_io` argument. Reads are
+    memory-mapped, so caching a file costs address space, not RAM. Files a stage
+    exports with write_work() keep their float samples, and the next stage's
+    read_work() gets those, so a file is quantized once per build, not once per stage.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._work = {}     # Float samples of files written this build, before their quantization
+        self.opened = 0
+
+    def read(self, filename):
+        key = os.path.abspath(filename)
+        if key not in self._cache:
+            sr, audio = audio_io.read(filename)
+            # Shared between stages, so nobody may modify it in place
+            audio.flags.writeable = False
+            self._cache[key] = (sr, audio)
+            self.opened += 1
+        return self._cache[key]
+
+    def read_work(self, filename):
+        key = os.path.abspath(filename)
+        if key in self._work:
+            return self._work[key]
+        sr, audio = self.read(filename)
+        return sr, audio_io.work_samples(audio), audio.dtype
+
+    def forget(self, filename):
+        """Drop a cached entry for a file that was written behind the store's back"""
+        self._cache.pop(os.path.abspath(filename), None)
+        self._work.pop(os.path.abspath(filename), None)
+
+    def apply_gain(self, filename, gain):
+        # A cached in-memory copy would go stale; a fresh memory map will not
+        self.forget(filename)
+        return audio_io.apply_gain(filename, gain)
+
+    def store_samples(self, filename, samples):
+        self.forget(filename)
+        audio_io.store_samples(filename, samples)
+
+    def write(self, filename, rate, data):
+        audio_io.write(filename, rate, data)
+        data = data.copy()
+        data.flags.writeable = False
+        self._work.pop(os.path.abspath(filename), None)
+        self._cache[os.path.abspath(filename)] = (rate, data)
+
+    def write_work(self, filename, rate, work, dtype, rng=None):
+        kept = work.copy()
+        kept.flags.writeable = False
+        data = sample_format.quantize(work, dtype, rng)
+        self.write(filename, rate, data)
+        self._work[os.path.abspath(filename)] = (rate, kept, data.dtype)
+        return data
+
+class Stage:
+    """One step of the build with declared input/output glob patterns"""
+
+    def __init__(self, name, run, inputs=(), outputs=(), deps=(), params=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+        self.params = params or {}
+
+    def input_files(self):
+        files = set()
+        for pattern in self.inputs:
+            files.update(glob.glob(pattern))
+        return sorted(files)
+
+    def outputs_exist(self):
+        return all(glob.glob(pattern) for pattern in self.outputs)
+
+    def signature(self):
+        """Hash of input file stats plus stage parameters"""
+        h = hashlib.sha256()
+        h.update(json.dumps(self.params, sort_keys=True).encode())
+        for path in self.input_files():
+            st = os.stat(path)
+            h.update(f"{path}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+        return h.hexdigest()
+
+def _form_wavs(base, form):
+    return os.path.join(base, f"Form {form}", "wav", "swir_*.wav")
+
+def build_stages(base=BASE_PATH, tts="gtts"):
+    calibration = os.path.join(base, create_calibration.OUTPUT_FILE)
+    ssn = os.path.join(base, "speech_shaped_noise.wav")
+    babble = os.path.join(base, "babble_noise.wav")
+
+    def run_generate(store):
+        import generate
+        # One worker pool across every sentence list
+        items = generate.load_items(SENTENCE_FILES)
+        failures = generate.generate_items(items, output_base=base, synthesize=generate.SYNTHESIZERS[tts])
+        if failures:
+            raise RuntimeError(f"{len(failures)} sentences could not be generated")
+
+    def run_trim(store):
+        # Only WAVs written since the last run are opened (see trim_silence.OnsetTable)
+        trim_silence.trim_silence(base=base, forms=trim_silence.FORMS, wav_io=store)
+
+    def run_calibration(store):
+        create_calibration.generate_calibration_tone(output_folder=base, wav_io=store)
+
+    def run_noise(store):
+        # Same seed, parameters and source sentences: copied from the asset cache
+        sources = sorted(glob.glob(_form_wavs(base, "A"))) + [calibration]
+        params = {"duration": create_noise.DURATION_SECONDS, "n_fft": create_noise.N_FFT,
+                  "taps": create_noise.FILTER_TAPS, "level": create_noise.OUTPUT_DB_LEVEL,
+                  "seed": create_noise.SEED}
+
+        def build(path):
+            create_noise.create_speech_shaped_noise(
+                input_folder=os.path.join(base, "Form A", "wav"), output_file=path, wav_io=store,
+                duration_seconds=params["duration"], seed=params["seed"], calibration_file=calibration)
+
+        AssetCache(base).fetch("noise", params, sources, ssn, build)
+        # The noise is streamed to disk block by block, not through the store
+        store.forget(ssn)
+
+    def run_babble(store):
+        # Per-talker stems are cached, so only the layers that changed are rendered;
+        # finished configurations are kept side by side in the asset cache
+        sources = sorted(glob.glob(_form_wavs(base, "C"))) + [calibration]
+        params = {"duration": create_babble.DURATION_SECONDS, "voices": create_babble.N_VOICES,
+                  "seed": create_babble.SEED}
+
+        def build(path):
+            babble_stems.update_babble(
+                source_folders=[os.path.join(base, "Form C", "wav")], output_file=path,
+                stems_folder=os.path.join(base, "babble_stems"), calibration_file=calibration, wav_io=store,
+                duration_seconds=params["duration"], n_voices=params["voices"], seed=params["seed"])
+
+        AssetCache(base).fetch("babble", params, sources, babble, build)
+        store.forget(babble)
+
+    def run_spatial(store):
+        # Same stems as the babble stage, one IR per talker; skipped when no IRs are present
+        spatial = os.path.join(base, os.path.basename(spatialize_babble.OUTPUT_FILE))
+        spatialize_babble.spatialize_babble(
+            source_folders=[os.path.join(base, "Form C", "wav")], output_file=spatial,
+            stems_folder=os.path.join(base, "babble_stems"), ir_folder=spatialize_babble.IR_FOLDER,
+            calibration_file=calibration, wav_io=store, duration_seconds=create_babble.DURATION_SECONDS,
+            n_voices=create_babble.N_VOICES, seed=create_babble.SEED)
+        store.forget(spatial)
+
+    def run_normalize(store):
+        normalize_safe.normalize_safe(
+            calibration_file=calibration,
+            target_folders=[base] + [os.path.join(base, f"Form {form}", "wav") for form in "ABP"],
+            wav_io=store, mode=normalize_safe.LEVEL_MODE)
+
+    def run_verify(store):
+        if not verify_audio_standards.verify_levels(
+            calibration_file=calibration, babble_file=babble, speech_noise_file=ssn,
+            target_folders=[os.path.join(base, f"Form {form}", "wav") for form in "ABCP"],
+            wav_io=store, mode=normalize_safe.LEVEL_MODE):
+            raise RuntimeError("Asset levels do not match the calibration tone")
+
+    def run_ladder(store):
+        render_snr_ladder.render_snr_ladder(base=base)
+
+    def run_chunks(store):
+        if not export_noise_chunks.export_noise_chunks(base=base):
+            raise RuntimeError("Exported noise chunks do not match the calibration level")
+
+    def run_rates(store):
+        if not export_rates.export_rates(base=base):
+            raise RuntimeError("Resampled calibration tone does not keep the calibration level")
+
+    def run_snr(store):
+        if calibrate_snr.calibrate_snr(base=base) is None:
+            raise RuntimeError("No SNR offsets could be solved")
+
+    def run_analyze(store):
+        analyze_audio_levels.analyze_levels(base_dir=base)
+
+    return [
+        Stage("generate", run_generate,
+              inputs=SENTENCE_FILES,
+              outputs=[os.path.join(base, "Form *", "wav", "swir_*.wav")]),
+        Stage("trim", run_trim,
+              inputs=[_form_wavs(base, form) for form in trim_silence.FORMS],
+              outputs=[os.path.join(base, trim_silence.ONSET_FILE)],
+              deps=["generate"],
+              params={"frame": trim_silence.FRAME_SECONDS,
+                      "relative_db": trim_silence.RELATIVE_DB,
+                      "absolute_db": trim_silence.ABSOLUTE_DB,
+                      "pad": [trim_silence.PAD_BEFORE, trim_silence.PAD_AFTER],
+                      "min_trim": trim_silence.MIN_TRIM_SECONDS,
+                      "forms": trim_silence.FORMS}),
+        Stage("calibration", run_calibration,
+              outputs=[calibration],
+              params={"frequency": create_calibration.FREQUENCY,
+                      "duration": create_calibration.DURATION,
+                      "sample_rate": create_calibration.SAMPLE_RATE,
+                      "db_level": create_calibration.DB_LEVEL}),
+        Stage("noise", run_noise,
+              inputs=[calibration, _form_wavs(base, "A")],
+              outputs=[ssn],
+              deps=["trim", "calibration"],
+              params={"duration": create_noise.DURATION_SECONDS,
+                      "taps": create_noise.FILTER_TAPS,
+                      "level": create_noise.OUTPUT_DB_LEVEL,
+                      "seed": create_noise.SEED}),
+        Stage("babble", run_babble,
+              inputs=[calibration, _form_wavs(base, "C")],
+              outputs=[babble],
+              deps=["trim", "calibration"],
+              params={"duration": create_babble.DURATION_SECONDS,
+                      "voices": create_babble.N_VOICES,
+                      "seed": create_babble.SEED}),
+        Stage("spatial", run_spatial,
+              inputs=[calibration, _form_wavs(base, "C"), os.path.join(spatialize_babble.IR_FOLDER, "az_*.wav")],
+              deps=["babble"],
+              params={"duration": create_babble.DURATION_SECONDS,
+                      "voices": create_babble.N_VOICES,
+                      "seed": create_babble.SEED,
+                      "spread": spatialize_babble.SPREAD_DEGREES,
+                      "block": spatialize_babble.BLOCK}),
+        Stage("normalize", run_normalize,
+              inputs=[calibration, os.path.join(base, "*.wav")] + [_form_wavs(base, form) for form in "ABP"],
+              deps=["trim", "calibration", "noise", "babble", "spatial"],
+              params={"max_allowed": sample_format.MAX_ALLOWED, "level_mode": normalize_safe.LEVEL_MODE}),
+        Stage("verify", run_verify,
+              inputs=[calibration, babble, ssn] + [_form_wavs(base, form) for form in "ABCP"],
+              deps=["normalize"],
+              params={"level_mode": normalize_safe.LEVEL_MODE}),
+        Stage("ladder", run_ladder,
+              inputs=[babble] + [_form_wavs(base, form) for form in render_snr_ladder.FORMS],
+              outputs=[os.path.join(base, render_snr_ladder.MIX_FOLDER, render_snr_ladder.INDEX_FILE)],
+              deps=["normalize"],
+              params={"ladder": render_snr_ladder.SNR_LADDER,
+                      "babble_offset_db": render_snr_ladder.BABBLE_OFFSET_DB,
+                      "lead_in": render_snr_ladder.LEAD_IN,
+                      "tail": render_snr_ladder.TAIL}),
+        Stage("chunks", run_chunks,
+              inputs=[calibration, babble, ssn],
+              outputs=[os.path.join(base, export_noise_chunks.CHUNK_FOLDER, os.path.splitext(name)[0],
+                                    export_noise_chunks.INDEX_FILE) for name in export_noise_chunks.NOISE_FILES],
+              deps=["normalize"],
+              params={"chunk_seconds": export_noise_chunks.CHUNK_SECONDS,
+                      "codec": export_noise_chunks.chunk_codec()}),
+        Stage("rates", run_rates,
+              inputs=[calibration, os.path.join(base, "*.wav")]
+                     + [_form_wavs(base, form) for form in export_rates.FORMS],
+              outputs=[os.path.join(base, export_rates.EXPORT_FOLDER, str(rate), export_rates.INDEX_FILE)
+                       for rate in export_rates.RATES],
+              deps=["normalize"],
+              params={"rates": export_rates.RATES,
+                      "kaiser_beta": export_rates.KAISER_BETA,
+                      "half_length": export_rates.HALF_LENGTH}),
+        Stage("snr", run_snr,
+              inputs=[babble] + [_form_wavs(base, form) for form in calibrate_snr.FORMS],
+              outputs=[os.path.join(base, calibrate_snr.OUTPUT_FILE)],
+              deps=["normalize"],
+              params={"offsets": calibrate_snr.N_OFFSETS,
+                      "seed": calibrate_snr.SEED,
+                      "lead_in": render_snr_ladder.LEAD_IN}),
+        Stage("analyze", run_analyze,
+              inputs=[babble, os.path.join(base, "Form *", "wav", "swir_*.wav")],
+              deps=["normalize"]),
+    ]
+
+def order_stages(stages):
+    """Topological sort on deps, keeping declaration order where possible"""
+    by_name = {s.name: s for s in stages}
+    ordered, done = [], set()
+
+    def visit(stage, trail):
+        if stage.name in done:
+            return
+        if stage.name in trail:
+            raise ValueError(f"Dependency cycle at stage '{stage.name}'")
+        for dep in stage.deps:
+            if dep in by_name:
+                visit(by_name[dep], trail | {stage.name})
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage, set())
+    return ordered
+
+def load_state(base):
+    path = os.path.join(base, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_state(base, state):
+    with open(os.path.join(base, STATE_FILE), 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+def run_pipeline(base=BASE_PATH, only=None, skip=(), force=False, store=None, tts="gtts"):
+    os.makedirs(base, exist_ok=True)
+    store = store or AudioStore()
+    state = load_state(base)
+    stages = order_stages(build_stages(base, tts=tts))
+    failed = set()
+    finished = []
+
+    print("--- SWIR Asset Build ---")
+
+    for stage in stages:
+        if (only and stage.name not in only) or stage.name in skip:
+            print(f"[{stage.name}] not selected")
+            continue
+
+        if any(dep in failed for dep in stage.deps):
+            print(f"[{stage.name}] BLOCKED (upstream stage failed)")
+            failed.add(stage.name)
+            continue
+
+        if not force and state.get(stage.name) == stage.signature() and stage.outputs_exist():
+            print(f"[{stage.name}] up to date")
+            finished.append(stage)
+            continue
+
+        print(f"[{stage.name}] running...")
+        started = time.time()
+        try:
+            # Wall/CPU time, I/O, peak RSS and files/s as one JSON line per stage
+            with instrumentation.stage(stage.name):
+                stage.run(store)
+        except Exception as e:
+            print(f"[{stage.name}] FAILED: {e}")
+            failed.add(stage.name)
+            continue
+
+        if not stage.outputs_exist():
+            print(f"[{stage.name}] FAILED: declared outputs were not produced")
+            failed.add(stage.name)
+            continue
+
+        print(f"[{stage.name}] done in {time.time() - started:.1f}s")
+        finished.append(stage)
+
+    # Record signatures only once every stage has run, so in-place rewrites
+    # (normalize) do not make upstream stages look stale on the next build
+    for stage in finished:
+        state[stage.name] = stage.signature()
+    save_state(base, state)
+
+    print(f"\nOpened {store.opened} WAV files from disk.")
+    if failed:
+        print(f"Build finished with failures: {', '.join(sorted(failed))}")
+        return False
+    print("Build complete.")
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="swir-build", description="Build all SWIR audio assets in one pass.")
+    parser.add_argument("--base", default=BASE_PATH, help="audio_output folder")
+    parser.add_argument("--only", help="comma-separated stages to run")
+    parser.add_argument("--skip", default="", help="comma-separated stages to leave alone")
+    parser.add_argument("--force", action="store_true", help="ignore the cached stage signatures")
+    parser.add_argument("--list", action="store_true", help="list the stages and exit")
+    parser.add_argument("--tts", choices=["gtts", "tone"], default="gtts",
+                        help="speech synthesizer for the generate stage ('tone' is an offline stand-in)")
+    parser.add_argument("--level-mode", choices=loudness.MODES,
+                        help="level the normalize and verify stages match to the tone "
+                             f"(default: {normalize_safe.LEVEL_MODE})")
+    parser.add_argument("--metrics", help="append per-stage metrics as JSON lines to this file")
+    parser.add_argument("--progress", action="store_true", help="show a live progress bar")
+    parser.add_argument("--profile", action="store_true",
+                        help="sample hot functions (level kernels, babble voices, noise filter) into --metrics")
+    args = parser.parse_args(argv)
+    instrumentation.configure(metrics_file=args.metrics, progress=args.progress or None,
+                              profile=args.profile or None)
+
+    if args.level_mode:
+        normalize_safe.LEVEL_MODE = args.level_mode
+
+    if args.list:
+        for stage in order_stages(build_stages(args.base)):
+            deps = f" (after {', '.join(stage.deps)})" if stage.deps else ""
+            print(f"{stage.name}{deps}")
+        return 0
+
+    only = set(args.only.split(",")) if args.only else None
+    skip = set(filter(None, args.skip.split(",")))
+    ok = run_pipeline(base=args.base, only=only, skip=skip, force=args.force, tts=args.tts)
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import os
+import numpy as np
+import pytest
+import audio_io
+import asset_server
+import render_snr_ladder
+
+SAMPLE_RATE = 8000
+
+@pytest.fixture
+def base(tmp_path):
+    """A tiny audio_output: four Form A sentences and a babble bed"""
+    rng = np.random.default_rng(0)
+    folder = tmp_path / "audio_output"
+    os.makedirs(folder / "Form A" / "wav")
+    for i in range(4):
+        audio = (rng.standard_normal(int(SAMPLE_RATE * 0.4)) * 2000).astype(np.int16)
+        audio_io.write(str(folder / "Form A" / "wav" / f"swir_{i:02d}.wav"), SAMPLE_RATE, audio)
+    babble = (rng.standard_normal(SAMPLE_RATE * 3) * 2000).astype(np.int16)
+    audio_io.write(str(folder / "babble_noise.wav"), SAMPLE_RATE, babble)
+    (tmp_path / "x").write_bytes(b"outside the asset folder")
+    return str(folder)
+
+@pytest.fixture
+def service(base):
+    service = asset_server.AssetService(base, prefetch=0)
+    yield service
+    service.close()
+
+def test_static_file_whole_and_ranges(base, service):
+    with open(os.path.join(base, "babble_noise.wav"), 'rb') as f:
+        data = f.read()
+
+    status, headers, body = service.handle("/audio_output/babble_noise.wav")
+    assert status == 200 and body == data
+    assert headers["Content-Type"] == "audio/wav"
+
+    status, headers, body = service.handle("/audio_output/babble_noise.wav", {"Range": "bytes=10-19"})
+    assert status == 206 and body == data[10:20]
+    assert headers["Content-Range"] == f"bytes 10-19/{len(data)}"
+
+    status, headers, body = service.handle("/audio_output/babble_noise.wav", {"Range": "bytes=-4"})
+    assert status == 206 and body == data[-4:]
+
+    status, headers, body = service.handle("/audio_output/babble_noise.wav", {"Range": f"bytes={len(data)}-"})
+    assert status == 416 and body == b""
+    assert headers["Content-Range"] == f"bytes */{len(data)}"
+
+def test_paths_outside_the_asset_folder_are_not_served(service):
+    assert service.handle("/audio_output/../x")[0] == 404
+    assert service.handle("/audio_output/%2e%2e/x")[0] == 404
+    assert service.handle("/elsewhere")[0] == 404
+
+def test_mix_matches_ladder_render(base, tmp_path, service):
+    path = os.path.join(base, "Form A", "wav", "swir_01.wav")
+    trial = render_snr_ladder.render_trial(("A", "01", path), os.path.join(base, "babble_noise.wav"),
+                                           str(tmp_path / "mixes"), [5])
+    with open(tmp_path / "mixes" / trial["snr"]["5"]["file"], 'rb') as f:
+        ladder = f.read()
+
+    status, _, body = service.handle("/mix/A/01?snr=5&k=0")
+    assert status == 200 and body == ladder
+    assert service.handle("/mix/A/01?snr=5&k=1")[2] != ladder
+    assert service.handle("/mix/A/99?snr=5")[0] == 404
+    assert service.handle("/mix/A/01")[0] == 400
+
+def test_repeated_mix_comes_from_cache(service):
+    first = service.handle("/mix/A/00?snr=10")[2]
+    assert service.handle("/mix/A/00?snr=10")[2] == first
+    assert service.stats["rendered"] == 1 and service.stats["memory_hits"] == 1
+
+def test_memory_cache_evicts_least_recently_used_by_bytes():
+    cache = asset_server.LRUCache(100)
+    cache.put("a", b"1" * 40)
+    cache.put("b", b"2" * 40)
+    cache.get("a")
+    cache.put("c", b"3" * 40)
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert cache.size == 80
+    cache.put("d", b"4" * 101)     # Larger than the whole cache: not kept
+    assert "d" not in cache and cache.size == 80
+
+def test_disk_cache_evicts_least_recently_used_by_bytes(tmp_path):
+    cache = asset_server.DiskCache(str(tmp_path / "cache"), 100)
+    cache.put("a", b"1" * 40)
+    cache.put("b", b"2" * 40)
+    cache.get("a")
+    cache.put("c", b"3" * 40)
+    assert cache.get("b") is None and not os.path.exists(cache.path("b"))
+    assert cache.get("a") == b"1" * 40 and cache.size == 80
+
+def test_prefetch_renders_the_next_sentences(base):
+    service = asset_server.AssetService(base, prefetch=2)
+    try:
+        service.handle("/mix/A/00?snr=5")
+    finally:
+        service.close()
+    assert service.stats["prefetched"] == 2
+    for sentence_id in ("01", "02"):
+        key = service.mix_key("A", sentence_id, 5.0, 0, render_snr_ladder.BABBLE_OFFSET_DB, 0.0)
+        assert key in service.memory
+    assert service.mix_key("A", "03", 5.0, 0, render_snr_ladder.BABBLE_OFFSET_DB, 0.0) not in service.memory
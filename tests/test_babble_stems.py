@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import audio_io
+import babble_stems
+
+SAMPLE_RATE = 8000
+
+def write_sentences(folder, count, seed=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        audio = (rng.standard_normal(int(SAMPLE_RATE * rng.uniform(0.3, 0.8))) * 3000).astype(np.int16)
+        audio_io.write(os.path.join(folder, f"swir_{i:02d}.wav"), SAMPLE_RATE, audio)
+
+def build(root, sources, duration, voices=4, seed=7):
+    output = os.path.join(root, "babble_noise.wav")
+    babble_stems.update_babble(source_folders=[sources], output_file=output,
+                               stems_folder=os.path.join(root, "stems"),
+                               calibration_file=os.path.join(root, "missing.wav"),
+                               duration_seconds=duration, n_voices=voices, seed=seed)
+    with open(output, 'rb') as f:
+        return f.read()
+
+def test_extended_bed_matches_fresh_build(tmp_path):
+    sources = str(tmp_path / "sources")
+    write_sentences(sources, 6)
+    build(str(tmp_path / "a"), sources, 2.0)
+    extended = build(str(tmp_path / "a"), sources, 3.0)
+    assert extended == build(str(tmp_path / "b"), sources, 3.0)
+
+def test_added_sentence_matches_fresh_build(tmp_path):
+    sources = str(tmp_path / "sources")
+    write_sentences(sources, 6)
+    build(str(tmp_path / "a"), sources, 2.0)
+    write_sentences(sources, 7)
+    updated = build(str(tmp_path / "a"), sources, 2.0)
+    assert updated == build(str(tmp_path / "b"), sources, 2.0)
+
+def test_voice_count_changes_match_fresh_build(tmp_path):
+    sources = str(tmp_path / "sources")
+    write_sentences(sources, 6)
+    build(str(tmp_path / "a"), sources, 2.0, voices=6)
+    fewer = build(str(tmp_path / "a"), sources, 2.0, voices=3)
+    assert fewer == build(str(tmp_path / "b"), sources, 2.0, voices=3)
+    more = build(str(tmp_path / "a"), sources, 2.0, voices=5)
+    assert more == build(str(tmp_path / "c"), sources, 2.0, voices=5)
+
+def test_removing_voices_tolerates_missing_stems(tmp_path):
+    sources = str(tmp_path / "sources")
+    write_sentences(sources, 6)
+    build(str(tmp_path / "a"), sources, 2.0, voices=4)
+    os.remove(babble_stems.BabbleStems(str(tmp_path / "a" / "stems")).stem_path(3))
+    fewer = build(str(tmp_path / "a"), sources, 2.0, voices=2)
+    assert fewer == build(str(tmp_path / "b"), sources, 2.0, voices=2)
@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import audio_io
+import normalize_safe
+from build_manifest import BuildManifest
+
+SAMPLE_RATE = 16000
+CALIBRATION = "calibration_1khz_neg20db.wav"
+
+def write_corpus(folder, count=4):
+    """Calibration tone plus `count` noise sentences at different levels"""
+    rng = np.random.default_rng(0)
+    os.makedirs(os.path.join(folder, "wav"))
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    tone = np.round(0.1 * 32767 * np.sin(2 * np.pi * 1000 * t)).astype(np.int16)
+    audio_io.write(os.path.join(folder, CALIBRATION), SAMPLE_RATE, tone)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, "wav", f"swir_{i:02d}.wav")
+        audio_io.write(path, SAMPLE_RATE, (rng.standard_normal(SAMPLE_RATE // 2) * (500 + 1000 * i)).astype(np.int16))
+        paths.append(path)
+    return paths
+
+def stamps(paths):
+    return [os.stat(path).st_mtime_ns for path in paths]
+
+def normalize(folder):
+    normalize_safe.normalize_safe(os.path.join(folder, CALIBRATION), [os.path.join(folder, "wav")])
+
+def test_second_run_skips_normalized_files(tmp_path, capsys):
+    folder = str(tmp_path)
+    paths = write_corpus(folder)
+    normalize(folder)
+    before = stamps(paths)
+    capsys.readouterr()
+
+    normalize(folder)
+    assert stamps(paths) == before
+    assert f"Skipped {len(paths)} files" in capsys.readouterr().out
+
+def test_only_changed_files_are_normalized_again(tmp_path, capsys):
+    folder = str(tmp_path)
+    paths = write_corpus(folder)
+    normalize(folder)
+
+    # Touched but identical: recognised by its hash. Rewritten at a new level: normalized again
+    os.utime(paths[0])
+    sr, audio = audio_io.read(paths[1])
+    audio_io.write(paths[1], sr, (audio // 2).copy())
+    before = stamps(paths)
+    capsys.readouterr()
+
+    normalize(folder)
+    after = stamps(paths)
+    assert after[0] == before[0] and after[2:] == before[2:]
+    assert after[1] != before[1]
+    assert f"Skipped {len(paths) - 1} files" in capsys.readouterr().out
+
+    manifest = BuildManifest(folder)
+    target = manifest.lookup(os.path.join(folder, CALIBRATION))["rms"]
+    assert all(manifest.is_normalized(path, target) for path in paths)
@@ -0,0 +1,59 @@
+import os
+import json
+import glob
+import numpy as np
+import pytest
+import audio_io
+import export_rates
+
+SAMPLE_RATE = 44100
+
+@pytest.fixture
+def base(tmp_path):
+    """Calibration tone (1 kHz, -20 dBFS peak) and three Form A sentences at 44.1 kHz"""
+    folder = tmp_path / "audio_output"
+    os.makedirs(folder / "Form A" / "wav")
+    t = np.arange(SAMPLE_RATE * 2) / SAMPLE_RATE
+    tone = np.round(0.1 * 32767 * np.sin(2 * np.pi * 1000 * t)).astype(np.int16)
+    audio_io.write(str(folder / export_rates.CALIBRATION_FILE), SAMPLE_RATE, tone)
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        audio = (rng.standard_normal(SAMPLE_RATE // 2) * 2000).astype(np.int16)
+        audio_io.write(str(folder / "Form A" / "wav" / f"swir_{i:02d}.wav"), SAMPLE_RATE, audio)
+    return str(folder)
+
+def load_index(base, rate):
+    with open(os.path.join(base, export_rates.EXPORT_FOLDER, str(rate), export_rates.INDEX_FILE)) as f:
+        return json.load(f)
+
+def test_calibration_rms_is_preserved_at_48k(base):
+    assert export_rates.export_rates(base, rates=[48000], forms=["A"], workers=1)
+
+    path = os.path.join(base, export_rates.EXPORT_FOLDER, "48000", export_rates.CALIBRATION_FILE)
+    sr, audio = audio_io.read(path)
+    source_rms = audio_io.level_stats(audio_io.read(os.path.join(base, export_rates.CALIBRATION_FILE))[1])[0]
+    assert sr == 48000
+    assert abs(export_rates.to_db(audio_io.level_stats(audio)[0]) - export_rates.to_db(source_rms)) \
+        <= export_rates.TOLERANCE_DB
+    assert len(load_index(base, 48000)["files"]) == 4
+
+def test_failed_file_is_reported_and_the_rest_indexed(base, monkeypatch, capsys):
+    write = audio_io.write
+
+    def failing_write(filename, rate, data):
+        write(filename, rate, data)
+        if "swir_01" in filename:
+            raise OSError("disk full")
+
+    monkeypatch.setattr(audio_io, "write", failing_write)
+    assert export_rates.export_rates(base, rates=[48000], forms=["A"], workers=1)
+
+    files = load_index(base, 48000)["files"]
+    assert set(files) == {export_rates.CALIBRATION_FILE, "Form A/wav/swir_00.wav", "Form A/wav/swir_02.wav"}
+    assert not glob.glob(os.path.join(base, export_rates.EXPORT_FOLDER, "**", "*.tmp"), recursive=True)
+    assert "disk full" in capsys.readouterr().out
+
+    # The next run only retries the file that failed
+    monkeypatch.setattr(audio_io, "write", write)
+    assert export_rates.export_rates(base, rates=[48000], forms=["A"], workers=1)
+    assert "Form A/wav/swir_01.wav" in load_index(base, 48000)["files"]
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+import loudness
+
+SAMPLE_RATE = 48000
+
+def tone(seconds, peak_db=-20.0, frequency=1000.0):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (10 ** (peak_db / 20) * 32768 * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+@pytest.mark.parametrize("seconds", [3.0, 0.3])
+def test_tone_at_minus_20_dbfs_reads_minus_23_lufs(seconds):
+    level = loudness.lufs_level(tone(seconds), SAMPLE_RATE)
+    assert loudness.to_lufs(level) == pytest.approx(-23.0, abs=0.01)
+
+@pytest.mark.parametrize("frames", [0, 1000, SAMPLE_RATE * 2])
+def test_silence_reads_minus_infinity(frames):
+    level = loudness.lufs_level(np.zeros(frames, dtype=np.int16), SAMPLE_RATE)
+    assert level == 0.0
+    assert loudness.to_lufs(level) == -float('inf')
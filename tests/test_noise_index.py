@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+import audio_io
+import noise_index
+
+SAMPLE_RATE = 8000
+
+@pytest.fixture
+def bed(tmp_path):
+    """Noise whose level changes every 0.3 s, so window edges matter; length not a multiple of the hop"""
+    rng = np.random.default_rng(0)
+    envelope = np.repeat(rng.uniform(500, 8000, size=20), int(0.3 * SAMPLE_RATE))
+    audio = (rng.standard_normal(len(envelope) + 17) * np.append(envelope, [1000] * 17)).astype(np.int16)
+    path = str(tmp_path / "noise.wav")
+    audio_io.write(path, SAMPLE_RATE, audio)
+    return path, audio.astype(np.float64)
+
+def brute_power(audio, start, length):
+    return np.array([np.mean(audio[s:s + n] ** 2) for s, n in zip(start, length)])
+
+def test_power_matches_brute_force_mean_square(bed):
+    path, audio = bed
+    index = noise_index.NoiseIndex.build(path)
+    rng = np.random.default_rng(1)
+    length = rng.integers(1, 3 * SAMPLE_RATE, size=500)
+    start = rng.integers(0, len(audio) - length)
+    # Edges on, next to and between grid points, and windows ending at the last sample
+    start[:4] = [0, index.hop, index.hop - 1, index.hop + 1]
+    start[4], length[4] = len(audio) - 100, 100
+
+    assert np.allclose(index.power(start, length), brute_power(audio, start, length), rtol=1e-9, atol=0)
+
+def test_cached_index_with_samples_is_exact(bed, tmp_path):
+    path, audio = bed
+    index = noise_index.load_index(path, str(tmp_path))
+    assert index.audio is not None
+    start, length = np.array([123, 4567, 9999]), np.array([801, 333, 2000])
+    assert np.allclose(index.power(start, length), brute_power(audio, start, length), rtol=1e-9, atol=0)
+
+def test_matched_offsets_are_within_tolerance(bed):
+    path, audio = bed
+    index = noise_index.NoiseIndex.build(path)
+    seconds = 0.5
+    n = int(round(seconds * SAMPLE_RATE))
+    offsets = index.matched_offsets(seconds)
+    assert len(offsets) > 0
+
+    starts = np.rint(offsets * SAMPLE_RATE).astype(np.int64)
+    starts = starts[starts + n <= len(audio)]
+    mean = np.mean(audio ** 2)
+    levels = 10 * np.log10(brute_power(audio, starts, np.full(len(starts), n)) / mean)
+    assert np.all(np.abs(levels) <= noise_index.MATCH_DB + 1e-9)
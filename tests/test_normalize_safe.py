@@ -0,0 +1,75 @@
+import os
+import shutil
+import numpy as np
+import pytest
+import audio_io
+import normalize_safe
+from build_manifest import BuildManifest
+
+SAMPLE_RATE = 16000
+CALIBRATION = "calibration_1khz_neg20db.wav"
+
+def write_corpus(folder):
+    """Calibration tone plus sentences that need a gain, a clip-protected gain, no gain, and none at all"""
+    rng = np.random.default_rng(0)
+    os.makedirs(os.path.join(folder, "wav"))
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    tone = np.round(0.1 * 32767 * np.sin(2 * np.pi * 1000 * t)).astype(np.int16)
+    audio_io.write(os.path.join(folder, CALIBRATION), SAMPLE_RATE, tone)
+    target = audio_io.level_stats(tone)[0]
+
+    clips = {
+        "quiet": rng.standard_normal(SAMPLE_RATE) * 500,
+        "loud": rng.standard_normal(SAMPLE_RATE // 2) * 8000,
+        "peaky": np.concatenate([rng.standard_normal(SAMPLE_RATE) * 300, [30000.0]]),
+        "silent": np.zeros(SAMPLE_RATE // 4),
+    }
+    for name, audio in clips.items():
+        audio_io.write(os.path.join(folder, "wav", f"swir_{name}.wav"), SAMPLE_RATE, audio.astype(np.int16))
+
+    # One sentence already at the target level
+    _, quiet = audio_io.read(os.path.join(folder, "wav", "swir_quiet.wav"))
+    at_target = np.round(quiet.astype(np.float64) * target / audio_io.level_stats(quiet)[0]).astype(np.int16)
+    audio_io.write(os.path.join(folder, "wav", "swir_ready.wav"), SAMPLE_RATE, at_target)
+
+def normalize(folder, batch, monkeypatch):
+    monkeypatch.setattr(normalize_safe, "BATCH", batch)
+    normalize_safe.normalize_safe(os.path.join(folder, CALIBRATION), [os.path.join(folder, "wav")])
+    return BuildManifest(folder)
+
+def test_batched_and_serial_paths_agree(tmp_path, monkeypatch):
+    batched, serial = str(tmp_path / "batched"), str(tmp_path / "serial")
+    write_corpus(batched)
+    shutil.copytree(batched, serial)
+
+    batched_manifest = normalize(batched, True, monkeypatch)
+    serial_manifest = normalize(serial, False, monkeypatch)
+
+    for name in sorted(os.listdir(os.path.join(batched, "wav"))):
+        a = audio_io.read(os.path.join(batched, "wav", name))[1].astype(np.int32)
+        b = audio_io.read(os.path.join(serial, "wav", name))[1].astype(np.int32)
+        # Gains agree to float32 precision, so at most an odd sample rounds the other way
+        assert a.shape == b.shape
+        assert np.abs(a - b).max() <= 1, name
+        assert np.count_nonzero(a != b) <= len(a) // 1000, name
+
+        entry_a = batched_manifest.lookup(os.path.join(batched, "wav", name))
+        entry_b = serial_manifest.lookup(os.path.join(serial, "wav", name))
+        assert (entry_a is None) == (entry_b is None), name
+        if entry_a is not None:
+            assert entry_a["gain"] == pytest.approx(entry_b["gain"], rel=1e-5), name
+            assert entry_a["rms"] == pytest.approx(entry_b["rms"], rel=1e-4), name
+
+def test_files_already_at_target_are_recorded(tmp_path, monkeypatch):
+    folder = str(tmp_path / "corpus")
+    write_corpus(folder)
+    ready = os.path.join(folder, "wav", "swir_ready.wav")
+    with open(ready, 'rb') as f:
+        before = f.read()
+
+    manifest = normalize(folder, True, monkeypatch)
+    with open(ready, 'rb') as f:
+        assert f.read() == before
+    target = manifest.lookup(os.path.join(folder, CALIBRATION))["rms"]
+    assert manifest.is_normalized(ready, target)
+    assert manifest.lookup(ready)["gain"] == 1.0
@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import audio_io
+import trim_silence
+
+SAMPLE_RATE = 16000
+
+def write_padded(folder, name, lead, tail, seed=0):
+    """Half a second of noise with `lead`/`tail` seconds of silence around it"""
+    rng = np.random.default_rng(seed)
+    speech = rng.standard_normal(SAMPLE_RATE // 2) * 3000
+    audio = np.concatenate([np.zeros(int(lead * SAMPLE_RATE)), speech, np.zeros(int(tail * SAMPLE_RATE))])
+    path = os.path.join(folder, name)
+    audio_io.write(path, SAMPLE_RATE, audio.astype(np.int16))
+    return path
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_second_trim_leaves_files_unchanged(tmp_path):
+    folder = tmp_path / "Form A" / "wav"
+    os.makedirs(folder)
+    paths = [write_padded(str(folder), "swir_01.wav", 0.4, 0.6),
+             write_padded(str(folder), "swir_02.wav", 0.0, 0.0, seed=1)]
+    table = trim_silence.OnsetTable(str(tmp_path))
+
+    trimmed = trim_silence.trim_paths(paths, table)
+    assert trimmed == [paths[0]]
+    entry = table.entries[table.key(paths[0])]
+    assert entry["onset"] == trim_silence.PAD_BEFORE
+    assert entry["original_length"] == int(1.5 * SAMPLE_RATE)
+    first = [read_bytes(path) for path in paths]
+
+    # Re-checking every file (not just changed ones) cuts nothing more
+    assert trim_silence.trim_paths(paths, table) == []
+    assert [read_bytes(path) for path in paths] == first
+    assert table.entries[table.key(paths[0])] == entry
+
+class CountingIO:
+    """audio_io with a count of the files opened"""
+
+    def __init__(self):
+        self.opened = []
+
+    def read(self, path):
+        self.opened.append(path)
+        return audio_io.read(path)
+
+    def read_work(self, path):
+        self.opened.append(path)
+        return audio_io.read_work(path)
+
+    def write_work(self, *args):
+        return audio_io.write_work(*args)
+
+def test_unchanged_files_are_not_reopened(tmp_path):
+    os.makedirs(tmp_path / "Form A" / "wav")
+    write_padded(str(tmp_path / "Form A" / "wav"), "swir_01.wav", 0.4, 0.6)
+    trim_silence.trim_silence(str(tmp_path), ["A"])
+
+    wav_io = CountingIO()
+    table = trim_silence.trim_silence(str(tmp_path), ["A"], wav_io=wav_io)
+    assert wav_io.opened == [] and len(table.entries) == 1
+    assert len(trim_silence.trim_silence(str(tmp_path), ["A"], wav_io=wav_io, force=True).entries) == 1
+    assert len(wav_io.opened) == 1
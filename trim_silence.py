@@ -0,0 +1,197 @@
+import os
+import glob
+import json
+import argparse
+import numpy as np
+import audio_io
+import sample_format
+import instrumentation
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+FORMS = ["A", "B", "P"]        # Sentences played in trials; Form C only feeds the babble bed
+ONSET_FILE = "onsets.json"      # Per-sentence trim bounds and speech onset/offset (next to the manifest)
+
+FRAME_SECONDS = 0.01            # Energy envelope hop (non-overlapping frames)
+RELATIVE_DB = -40.0             # A frame is speech if within this of the clip's loudest frame...
+ABSOLUTE_DB = -60.0             # ...and above this (dBFS)
+PAD_BEFORE = 0.05               # Silence kept before the onset (seconds)
+PAD_AFTER = 0.10                # Silence kept after the offset (longer: decays and final consonants)
+MIN_TRIM_SECONDS = 0.02         # Edges with less than this to remove are left alone (keeps reruns idempotent)
+FADE_SECONDS = 0.005            # Raised-cosine fade at a cut edge, so the cut cannot click
+
+def frame_starts(offsets, lengths, frame_lengths):
+    """Start (in the ragged buffer) of every envelope frame of every clip, and each clip's first frame index"""
+    counts = -(-lengths // frame_lengths)
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    clip = np.repeat(np.arange(len(lengths)), counts)
+    local = np.arange(counts.sum()) - first[clip]
+    return offsets[clip] + local * frame_lengths[clip], first, clip, local
+
+@instrumentation.hot
+def speech_bounds(buffer, offsets, lengths, frame_lengths, full_scales):
+    """(first, last) speech frame of every clip from one strided envelope over the whole batch; -1 if silent.
+
+    Every frame's mean square comes from a single add.reduceat over the squared
+    buffer, and the per-clip thresholds and first/last active frames from
+    reduceat over the frame array, so no Python loop runs per clip or per frame.
+    """
+    starts, first, clip, local = frame_starts(offsets, lengths, frame_lengths)
+    ends = np.append(starts[1:], len(buffer))
+    energy = np.add.reduceat(np.square(buffer), starts).astype(np.float64) / (ends - starts)
+    with np.errstate(divide='ignore'):
+        db = 10 * np.log10(energy / full_scales[clip] ** 2)
+
+    loudest = np.maximum.reduceat(db, first)
+    threshold = np.maximum(loudest + RELATIVE_DB, ABSOLUTE_DB)
+    active = db > threshold[clip]
+    onset = np.minimum.reduceat(np.where(active, local, np.iinfo(np.int64).max), first)
+    offset = np.maximum.reduceat(np.where(active, local, -1), first)
+    silent = offset < 0
+    onset[silent] = -1
+    return onset, offset
+
+def trim_bounds(onset, offset, frames, frame_length, sample_rate):
+    """(start, end) frames to keep for one clip, or None if there is nothing worth trimming"""
+    if offset < 0:
+        return None
+    start = max(0, onset * frame_length - int(round(PAD_BEFORE * sample_rate)))
+    end = min(frames, (offset + 1) * frame_length + int(round(PAD_AFTER * sample_rate)))
+    min_trim = int(round(MIN_TRIM_SECONDS * sample_rate))
+    if start < min_trim:
+        start = 0
+    if frames - end < min_trim:
+        end = frames
+    if start == 0 and end == frames:
+        return None
+    return start, end
+
+def faded(work, start, end, frames, sample_rate):
+    """Copy of work[start:end] (float samples) with a short fade at each edge that was cut"""
+    out = np.array(work[start:end])
+    n = min(int(round(FADE_SECONDS * sample_rate)), len(out) // 2)
+    if n == 0:
+        return out
+    ramp = (0.5 - 0.5 * np.cos(np.pi * (np.arange(n) + 0.5) / n)).astype(out.dtype)
+    ramp = ramp.reshape(-1, *([1] * (out.ndim - 1)))
+    if start > 0:
+        out[:n] *= ramp
+    if end < frames:
+        out[-n:] *= ramp[::-1]
+    return out
+
+class OnsetTable:
+    """onsets.json: per WAV the bounds it was trimmed to and where speech starts and ends in it.
+
+    An entry also holds the size and mtime of the file it describes, so a
+    rerun only opens WAVs that were regenerated or rewritten since.
+    """
+
+    def __init__(self, base=BASE_PATH):
+        self.base = base
+        self.path = os.path.join(base, ONSET_FILE)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+
+    def key(self, path):
+        return os.path.relpath(path, self.base)
+
+    def is_current(self, path):
+        entry = self.entries.get(self.key(path))
+        if entry is None:
+            return False
+        st = os.stat(path)
+        return entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+
+    def record(self, path, entry):
+        st = os.stat(path)
+        entry.update({"size": st.st_size, "mtime_ns": st.st_mtime_ns})
+        self.entries[self.key(path)] = entry
+
+    def forget_missing(self):
+        for key in [k for k in self.entries if not os.path.exists(os.path.join(self.base, k))]:
+            del self.entries[key]
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+def trim_paths(paths, table, wav_io=audio_io):
+    """Trim the given WAVs in place and record them in the table; returns the paths rewritten"""
+    trimmed = []
+    instrumentation.set_total(len(paths), "trim")
+    for batch in audio_io.batches(paths):
+        buffer, offsets, lengths, clips = audio_io.load_ragged(batch, wav_io)
+        instrumentation.advance(len(batch) - len(clips))
+        if not clips:
+            continue
+        channels = np.array([shape[1] if len(shape) > 1 else 1 for _, _, _, shape in clips], dtype=np.int64)
+        frame_lengths = np.array([max(1, int(round(FRAME_SECONDS * sr))) for _, sr, _, _ in clips], dtype=np.int64)
+        full_scales = np.array([audio_io.full_scale(dtype) for _, _, dtype, _ in clips])
+        first_frames, last_frames = speech_bounds(buffer, offsets, lengths, frame_lengths * channels, full_scales)
+        del buffer
+
+        for i, (path, sr, dtype, shape) in enumerate(clips):
+            instrumentation.advance()
+            frames, frame = shape[0], int(frame_lengths[i])
+            start, end = 0, frames
+            bounds = trim_bounds(int(first_frames[i]), int(last_frames[i]), frames, frame, sr)
+            if bounds is not None:
+                start, end = bounds
+                try:
+                    # Quantized once on disk; a build's AudioStore keeps the float samples for normalize
+                    wav_io.write_work(path, sr, faded(wav_io.read_work(path)[1], start, end, frames, sr), dtype,
+                                      sample_format.dither_rng(os.path.basename(path)))
+                except Exception as e:
+                    print(f"Error on {path}: {e}")
+                    continue
+                trimmed.append(path)
+
+            # Same length as when it was trimmed: only rewritten since (e.g. normalized), so the
+            # original length and cut position carry over
+            previous = table.entries.get(table.key(path))
+            original, cut = frames, 0
+            if previous is not None and previous["length"] == frames:
+                original, cut = previous["original_length"], previous["trim_start"]
+            entry = {"sample_rate": int(sr), "original_length": int(original), "trim_start": int(cut + start),
+                     "length": int(end - start)}
+
+            # Speech onset/offset in seconds within the file as it is now
+            if last_frames[i] >= 0:
+                entry["onset"] = round(max(0, int(first_frames[i]) * frame - start) / sr, 4)
+                entry["offset"] = round((min(end, (int(last_frames[i]) + 1) * frame) - start) / sr, 4)
+            table.record(path, entry)
+    return trimmed
+
+def trim_silence(base=BASE_PATH, forms=FORMS, wav_io=audio_io, force=False):
+    print("--- Silence Trimming ---")
+    paths = []
+    for form in forms:
+        paths.extend(sorted(glob.glob(os.path.join(base, f"Form {form}", "wav", "swir_*.wav"))))
+
+    table = OnsetTable(base)
+    table.forget_missing()
+    pending = paths if force else [path for path in paths if not table.is_current(path)]
+    trimmed = trim_paths(pending, table, wav_io) if pending else []
+    table.save()
+
+    removed = sum((table.entries[table.key(p)]["original_length"] - table.entries[table.key(p)]["length"])
+                  / table.entries[table.key(p)]["sample_rate"] for p in trimmed)
+    print(f"Checked {len(pending)} of {len(paths)} files ({len(paths) - len(pending)} unchanged since last run).")
+    if trimmed:
+        print(f"Trimmed {len(trimmed)} files ({removed:.1f}s of silence removed in total).")
+    print(f"Onset table written to {table.path}")
+    return table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trim leading/trailing silence from the sentence WAVs in place.")
+    parser.add_argument("--base", default=BASE_PATH)
+    parser.add_argument("--forms", nargs="+", default=FORMS)
+    parser.add_argument("--force", action="store_true", help="re-check every file, not just changed ones")
+    args = parser.parse_args()
+    trim_silence(args.base, args.forms, force=args.force)
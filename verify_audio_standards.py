@@ -1,7 +1,11 @@
 import os
 import glob
 import numpy as np
-from scipy.io import wavfile
+import audio_io
+import instrumentation
+import noise_index
+import loudness
+from build_manifest import BuildManifest
 import math
 
 # --- CONFIGURATION ---
@@ -12,6 +16,10 @@ CALIBRATION_FILE = os.path.join(BASE_PATH, "calibration_1khz_neg20db.wav")
 BABBLE_FILE = os.path.join(BASE_PATH, "babble_noise.wav")
 SPEECH_NOISE_FILE = os.path.join(BASE_PATH, "speech_shaped_noise.wav")
 
+# Level measure compared against the tone: "rms", "lufs" or "speech" (see loudness.py),
+# the same mode the files were normalized with
+LEVEL_MODE = "rms"
+
 # Sentences
 TARGET_FOLDERS = [
     os.path.join(BASE_PATH, "Form A/wav"),
@@ -22,10 +30,8 @@ TARGET_FOLDERS = [
 
 def measure_rms(audio_data):
     """Calculate Root Mean Square (average energy) of a signal"""
-    data = audio_data.astype(np.float64)
-    # Avoid divide by zero if empty
-    if len(data) == 0: return 0
-    return np.sqrt(np.mean(data**2))
+    # Chunked float32 accumulation over a memory-mapped file (0 if empty)
+    return audio_io.measure_rms(audio_data)
 
 def to_db(rms):
     if rms == 0: return -float('inf')
@@ -33,32 +39,46 @@ def to_db(rms):
     # We'll report dB relative to full scale (dBFS) roughly.
     return 20 * math.log10(rms / 32768.0)
 
-def verify_levels():
+def verify_levels(calibration_file=CALIBRATION_FILE, babble_file=BABBLE_FILE,
+                  speech_noise_file=SPEECH_NOISE_FILE, target_folders=TARGET_FOLDERS, wav_io=audio_io,
+                  manifest=None, mode=LEVEL_MODE):
+    """Compare every asset with the calibration tone; returns True if all levels pass"""
     print("--- Audio Intensity Verification ---")
+    if mode != "rms":
+        print(f"Level mode: {mode}")
     
     # 1. Reference (Calibration Tone)
-    if not os.path.exists(CALIBRATION_FILE):
-        print(f"CRITICAL: Calibration file missing: {CALIBRATION_FILE}")
-        return
+    if not os.path.exists(calibration_file):
+        print(f"CRITICAL: Calibration file missing: {calibration_file}")
+        return False
         
-    sr, cal_audio = wavfile.read(CALIBRATION_FILE)
-    ref_rms = measure_rms(cal_audio)
+    # Levels come from the build manifest when the file hash is unchanged,
+    # so only new or edited files are decoded
+    if manifest is None:
+        manifest = BuildManifest(os.path.dirname(calibration_file))
+
+    ref_rms = loudness.entry_level(manifest.measure(calibration_file, wav_io, mode), mode)
     ref_db = to_db(ref_rms)
     
     print(f"\nREFERENCE (Calibration Tone):")
-    print(f"  RMS: {ref_rms:.4f}")
+    print(f"  {'RMS' if mode == 'rms' else 'Level'}: {ref_rms:.4f}")
     print(f"  dB:  {ref_db:.2f}")
     
     # 2. Noise Files
     print(f"\nNOISE FILES:")
-    for name, path in [("Babble Noise", BABBLE_FILE), ("Speech Noise", SPEECH_NOISE_FILE)]:
+    for name, path in [("Babble Noise", babble_file), ("Speech Noise", speech_noise_file)]:
         if os.path.exists(path):
-            sr, audio = wavfile.read(path)
-            rms = measure_rms(audio)
+            rms = loudness.entry_level(manifest.measure(path, wav_io, mode), mode)
             db = to_db(rms)
             diff = db - ref_db
             status = "MATCH" if abs(diff) < 0.1 else "MISMATCH"
             print(f"  {name}: {db:.2f} dB (Diff: {diff:+.2f} dB) -> {status}")
+
+            # Short-term level spread from the cached sliding-window index (no rescan)
+            index = noise_index.load_index(path, os.path.dirname(calibration_file))
+            short_db = 20 * np.log10(np.maximum(index.short_term_rms, 1e-9) / 32768.0)
+            print(f"    {noise_index.SHORT_TERM_SECONDS}s windows: {np.percentile(short_db, 5):.2f} to "
+                  f"{np.percentile(short_db, 95):.2f} dB (5-95%)")
         else:
             print(f"  {name}: FILE NOT FOUND")
 
@@ -67,21 +87,29 @@ def verify_levels():
     all_sentence_rms = []
     
     sentence_files = []
-    for folder in TARGET_FOLDERS:
+    for folder in target_folders:
         if os.path.exists(folder):
             sentence_files.extend(glob.glob(os.path.join(folder, "swir_*.wav")))
             
     if not sentence_files:
         print("  No sentence files found.")
-        return
+        return False
 
     print(f"  Analyzing {len(sentence_files)} files...")
     
+    # Unchanged files come straight from the manifest, the rest are
+    # measured in parallel by measure_levels.py (or from wav_io's arrays when it is a build's store)
+    levels = manifest.measure_many(sentence_files, mode=mode, wav_io=None if wav_io is audio_io else wav_io)
+
     mismatches = 0
+    instrumentation.set_total(len(sentence_files), "verify")
     for f in sentence_files:
+        instrumentation.advance()
         try:
-            sr, audio = wavfile.read(f)
-            rms = measure_rms(audio)
+            entry = levels[f]
+            if entry.get("error"):
+                raise ValueError(entry["error"])
+            rms = loudness.entry_level(entry, mode)
             db = to_db(rms)
             diff = db - ref_db
             
@@ -94,6 +122,9 @@ def verify_levels():
         except Exception as e:
             print(f"    Error reading {f}: {e}")
 
+    # Keep the freshly measured levels for the next run
+    manifest.save()
+
     avg_rms = np.mean(all_sentence_rms)
     avg_db = to_db(avg_rms)
     avg_diff = avg_db - ref_db
@@ -104,8 +135,10 @@ def verify_levels():
     
     if abs(avg_diff) < 0.1 and mismatches == 0:
         print("\nOVERALL STATUS: PASS (All levels match calibration within 0.1 dB)")
-    else:
-        print("\nOVERALL STATUS: FAIL (Normalization Required)")
+        return True
+    print("\nOVERALL STATUS: FAIL (Normalization Required)")
+    return False
 
 if __name__ == "__main__":
-    verify_levels()
+    if not verify_levels():
+        raise SystemExit(1)
@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import argparse
+import audio_io
+import generate
+import loudness
+import noise_index
+import normalize_safe
+import calibrate_snr
+import trim_silence
+import create_calibration
+import measure_levels
+from build_manifest import BuildManifest
+
+# --- CONFIGURATION ---
+# Relative paths, same convention as swir_build.py
+BASE_PATH = "audio_output"
+SENTENCE_FILES = ["sentences.json", "babble_sentences.json", "practice_sentences.json"]
+NORMALIZE_FORMS = ["A", "B", "P"]   # Same folders as swir_build's normalize stage
+BABBLE_FORMS = ["C"]            # Sources of the babble bed (rebuilt by swir_build, not here)
+POLL_SECONDS = 0.2              # How often the JSON files and WAV folders are checked
+SETTLE_SECONDS = 0.2            # A file must stay unchanged this long before it is read (editors save in steps)
+TOLERANCE_DB = 0.1              # Same pass mark as verify_audio_standards.py
+
+def file_stamps(paths):
+    """{path: (size, mtime_ns)} for the paths that exist"""
+    stamps = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stamps[path] = (st.st_size, st.st_mtime_ns)
+    return stamps
+
+def wav_stamps(base):
+    """{path: (size, mtime_ns)} of every sentence WAV (one scandir per form folder)"""
+    stamps = {}
+    if not os.path.isdir(base):
+        return stamps
+    for form in os.scandir(base):
+        folder = os.path.join(form.path, "wav")
+        if not form.name.startswith("Form ") or not os.path.isdir(folder):
+            continue
+        for wav in os.scandir(folder):
+            if wav.name.startswith("swir_") and wav.name.endswith(".wav"):
+                st = wav.stat()
+                stamps[wav.path] = (st.st_size, st.st_mtime_ns)
+    return stamps
+
+def changed_paths(before, after):
+    return sorted(path for path in set(before) | set(after) if before.get(path) != after.get(path))
+
+def load_sentences(data_files):
+    """{id: item} over all sentence lists; raises ValueError while a file is half-written"""
+    items = {}
+    for path in data_files:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r') as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path} is not valid JSON yet ({e})")
+        for item in data:
+            items[item['id']] = item
+    return items
+
+def diff_sentences(old, new):
+    """(added or edited items, removed ids): compared by id, text and list"""
+    changed = [item for s_id, item in new.items()
+               if s_id not in old or (old[s_id]['text'], old[s_id]['list']) != (item['text'], item['list'])]
+    removed = sorted(s_id for s_id in old if s_id not in new)
+    return changed, removed
+
+class WatchSession:
+    """Everything one edit needs that does not change between edits.
+
+    The manifest, the calibration level and the babble bed's energy index are
+    loaded once and kept in memory; they are only reloaded when their own
+    files change on disk (e.g. a full swir_build ran in between).
+    """
+
+    def __init__(self, base=BASE_PATH, synthesize=generate.gtts_synthesize, mode=normalize_safe.LEVEL_MODE,
+                 workers=generate.WORKERS):
+        self.base = base
+        self.synthesize = synthesize
+        self.mode = mode
+        self.workers = workers
+        self.calibration = os.path.join(base, create_calibration.OUTPUT_FILE)
+        self.babble = os.path.join(base, calibrate_snr.BABBLE_FILE)
+        self._stamps = {}
+        self.manifest = None
+        self.target = None
+        self.index = None
+        self.onsets = None
+        self.refresh()
+
+    def refresh(self):
+        """Reload the reference data whose files changed since they were loaded"""
+        watched = self._watched()
+        stamps = file_stamps(watched)
+        if stamps == self._stamps:
+            return
+        self.manifest = BuildManifest(self.base)
+        self.onsets = trim_silence.OnsetTable(self.base)
+        self.target = None
+        if os.path.exists(self.calibration):
+            entry = self.manifest.measure(self.calibration, audio_io, self.mode)
+            self.target = loudness.entry_level(entry, self.mode)
+        self.index = None
+        if os.path.exists(self.babble):
+            self.index = noise_index.load_index(self.babble, self.base)
+        self.manifest.save()
+        self._stamps = file_stamps(watched)
+
+    def process(self, items=(), wavs=()):
+        """Synthesize `items`, then normalize, verify and re-solve the SNR offsets of their WAVs
+        and of any other changed `wavs`. Returns the WAV paths handled."""
+        started = time.perf_counter()
+        self.refresh()
+
+        # 1. Synthesis (edited text is regenerated, see generate.TEXT_INDEX)
+        if items:
+            failures = generate.generate_items(list(items), output_base=self.base, synthesize=self.synthesize,
+                                               workers=self.workers)
+            failed = {s_id for s_id, _ in failures}
+            items = [item for item in items if item['id'] not in failed]
+        synthesized = time.perf_counter()
+        paths = sorted({os.path.join(self.base, generate.wav_key(item)) for item in items} | set(wavs))
+        existing = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return paths
+
+        # 2. Leading/trailing silence off, before anything measures the level
+        pending = [path for path in existing if self._form(path) in trim_silence.FORMS
+                   and not self.onsets.is_current(path)]
+        if pending:
+            trim_silence.trim_paths(pending, self.onsets)
+            self.onsets.save()
+
+        # 3. Normalization, only for the forms the build normalizes
+        if self.target is None:
+            print("Calibration tone missing: run swir_build.py first (normalize/verify skipped)")
+        else:
+            pending = [path for path in existing if self._form(path) in NORMALIZE_FORMS
+                       and not self.manifest.is_normalized(path, self.target, self.mode)]
+            if pending:
+                normalize_safe.normalize_batch(pending, self.target, audio_io, self.manifest, threads=1,
+                                               mode=self.mode)
+
+            # 4. Verification against the warm calibration level
+            levels = self.manifest.measure_many(existing, workers=1, mode=self.mode)
+            for path in existing:
+                entry = levels[path]
+                name = os.path.relpath(path, self.base)
+                if entry.get("error"):
+                    print(f"  ERROR {name}: {entry['error']}")
+                    continue
+                diff = measure_levels.to_db(loudness.entry_level(entry, self.mode), self.target)
+                print(f"  {'OK      ' if abs(diff) <= TOLERANCE_DB else 'MISMATCH'} {name} ({diff:+.2f} dB)")
+
+        # 5. Per-sentence SNR offsets from the warm babble index
+        if self.index is not None:
+            snr_paths = [path for path in paths if self._form(path) in calibrate_snr.FORMS]
+            if snr_paths and calibrate_snr.update_offsets(self.base, snr_paths, self.manifest, self.index) is None:
+                print(f"  No {calibrate_snr.OUTPUT_FILE} yet: run swir_build.py to solve the SNR offsets")
+
+        if any(self._form(path) in BABBLE_FORMS for path in paths):
+            print("  Babble source sentences changed: run swir_build.py to rebuild the babble bed")
+
+        self.manifest.save()
+        self._stamps = file_stamps(self._watched())
+        done = time.perf_counter()
+        print(f"{len(paths)} file(s) ready in {done - started:.2f}s "
+              f"(synthesis {synthesized - started:.2f}s, processing {done - synthesized:.2f}s)")
+        return paths
+
+    def _watched(self):
+        return [self.calibration, self.babble, os.path.join(self.base, "manifest.json"),
+                os.path.join(self.base, trim_silence.ONSET_FILE)]
+
+    @staticmethod
+    def _form(path):
+        return os.path.basename(os.path.dirname(os.path.dirname(path)))[len("Form "):]
+
+def out_of_date(items, base):
+    """Items whose WAV is missing or was synthesized from different text.
+
+    WAVs made before generate.py kept a text index are taken to match their
+    current text, which becomes their recorded text from now on.
+    """
+    texts = generate.load_text_index(base)
+    adopted = False
+    stale = []
+    for item in items.values():
+        key = generate.wav_key(item)
+        if not os.path.exists(os.path.join(base, key)):
+            stale.append(item)
+        elif key not in texts:
+            texts[key] = item['text']
+            adopted = True
+        elif texts[key] != item['text']:
+            stale.append(item)
+    if adopted:
+        generate.save_text_index(base, texts)
+    return stale
+
+def watch(session, data_files=SENTENCE_FILES, poll_seconds=POLL_SECONDS, once=False):
+    print(f"--- Watching {', '.join(data_files)} and {session.base}/Form */wav ---")
+    items = load_sentences(data_files)
+
+    # Catch up with edits made while nobody was watching
+    stale = out_of_date(items, session.base)
+    if stale:
+        print(f"{len(stale)} sentence(s) out of date")
+        session.process(stale)
+    if once:
+        return
+
+    json_seen = file_stamps(data_files)
+    wav_seen = wav_stamps(session.base)
+    print("Ready (Ctrl+C to stop).")
+    while True:
+        time.sleep(poll_seconds)
+        json_now = file_stamps(data_files)
+        wav_now = wav_stamps(session.base)
+        if json_now == json_seen and wav_now == wav_seen:
+            continue
+
+        # Let the editor (or whoever is writing) finish
+        time.sleep(SETTLE_SECONDS)
+        if file_stamps(data_files) != json_now or wav_stamps(session.base) != wav_now:
+            continue
+
+        edited = []
+        if json_now != json_seen:
+            try:
+                new_items = load_sentences(data_files)
+            except ValueError as e:
+                print(e)
+                continue
+            edited, removed = diff_sentences(items, new_items)
+            for s_id in removed:
+                print(f"Removed {s_id} from the sentence lists (its WAV is left in place)")
+            items = new_items
+            json_seen = json_now
+
+        # WAVs replaced or added by hand (ours are excluded by re-reading the folders afterwards)
+        touched = [path for path in changed_paths(wav_seen, wav_now) if path in wav_now]
+        if edited or touched:
+            print(f"\n{time.strftime('%H:%M:%S')} {len(edited)} edited sentence(s), {len(touched)} changed WAV(s)")
+            session.process(edited, touched)
+        wav_seen = wav_stamps(session.base)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate, normalize and verify sentences as they are edited.")
+    parser.add_argument("data_files", nargs="*", default=SENTENCE_FILES, help="sentence JSON files")
+    parser.add_argument("--base", default=BASE_PATH)
+    parser.add_argument("--tts", choices=sorted(generate.SYNTHESIZERS), default="gtts")
+    parser.add_argument("--level-mode", choices=loudness.MODES, default=normalize_safe.LEVEL_MODE)
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between checks")
+    parser.add_argument("--once", action="store_true", help="catch up with pending edits and exit")
+    args = parser.parse_args()
+
+    session = WatchSession(args.base, synthesize=generate.SYNTHESIZERS[args.tts], mode=args.level_mode)
+    try:
+        watch(session, args.data_files, poll_seconds=args.poll, once=args.once)
+    except KeyboardInterrupt:
+        print("\nStopped.")
+        sys.exit(0)